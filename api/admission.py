@@ -0,0 +1,105 @@
+"""
+Admission control for the prediction routes
+Caps the requests a worker runs at once and fails fast with 503 + Retry-After
+when a request has already queued longer than its budget, so a burst drains
+quickly instead of every caller waiting behind a growing backlog.
+
+Behind a load balancer that sets X-Request-Start (t=<seconds|ms|us since the
+epoch>, as Heroku, nginx or HAProxy can), queue time can count from that
+header, so time spent in gunicorn's socket backlog is included. Only enable
+that when the proxy overwrites the header: clients could otherwise send their
+own.
+"""
+
+import threading
+import time
+
+from api.microbatch import Histogram
+
+# Queue wait histogram bounds (ms)
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+
+def parse_request_start(value, now=None):
+    """
+    Seconds a request has waited since the X-Request-Start value, or None
+    if it can't be parsed. The unit is inferred from the magnitude; clock
+    skew never makes the wait negative.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, (time.time() if now is None else now) - started)
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a queue-time budget for one worker process
+
+    admit(queued_seconds) waits for one of max_concurrent slots for at most
+    what is left of the budget and returns the total queue time in seconds,
+    or None when the request should be shed; every admitted request must
+    call release(). max_concurrent only matters with threaded workers.
+    """
+
+    def __init__(self, max_concurrent=4, queue_budget_ms=500, retry_after=1):
+        self.max_concurrent = max_concurrent
+        self.queue_budget = queue_budget_ms / 1000
+        self.retry_after = retry_after
+        self.admitted = 0
+        self.shed_budget = 0
+        self.shed_concurrency = 0
+        self.in_flight = 0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def admit(self, queued_seconds=0.0):
+        clock = time.perf_counter
+        remaining = self.queue_budget - queued_seconds
+        if remaining <= 0:
+            with self._lock:
+                self.shed_budget += 1
+            return None
+        started = clock()
+        if not self._slots.acquire(timeout=remaining):
+            with self._lock:
+                self.shed_concurrency += 1
+            return None
+        waited = queued_seconds + clock() - started
+        with self._lock:
+            self.admitted += 1
+            self.in_flight += 1
+        self.wait_ms.observe(waited * 1000)
+        return waited
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            shed = self.shed_budget + self.shed_concurrency
+            counters = {
+                'max_concurrent': self.max_concurrent,
+                'queue_budget_ms': round(self.queue_budget * 1000, 3),
+                'retry_after_seconds': self.retry_after,
+                'in_flight': self.in_flight,
+                'admitted': self.admitted,
+                'shed': shed,
+                'shed_queue_budget': self.shed_budget,
+                'shed_concurrency': self.shed_concurrency,
+                'shed_rate': round(shed / (shed + self.admitted), 4) if shed + self.admitted else 0.0
+            }
+        return {**counters, 'queue_wait_ms': self.wait_ms.snapshot()}
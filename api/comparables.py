@@ -0,0 +1,271 @@
+"""
+Nearest-neighbour lookup of comparable Njord deals
+Deals are partitioned by (sector, geography) and sorted by log revenue inside
+each partition, so a query only scans a small revenue window of the closest
+partitions. The index is rebuilt when the deal store or JSON changes.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from ml.deal_store import DealStore, funding_range
+
+# Distance is in log-revenue units: a sector mismatch counts like a ~7x
+# revenue gap, a geography mismatch like a ~2.7x one
+SECTOR_PENALTY = 2.0
+GEOGRAPHY_PENALTY = 1.0
+FUNDING_WEIGHT = 0.5
+# Charged when the query has a value the deal is missing
+MISSING_PENALTY = 1.0
+
+# Revenue window scanned first on each side of the query position
+INITIAL_WINDOW = 32
+
+
+def _log(values):
+    return np.log1p(np.maximum(np.asarray(values, dtype=np.float64), 0))
+
+
+def funding_midpoint(funding):
+    """Funding need in millions from a number or a '5-18' style range, else None"""
+    if funding is None or funding == '':
+        return None
+    if isinstance(funding, (int, float)) and not isinstance(funding, bool):
+        return float(funding) if funding >= 0 else None
+    low, high = funding_range(str(funding))
+    return None if math.isnan(low) else (low + high) / 2
+
+
+class _Partition:
+    """Deals of one (sector, geography) pair"""
+
+    def __init__(self, rows, revenue, funding):
+        known = ~np.isnan(revenue)
+        order = np.argsort(revenue[known], kind='stable')
+        self.rows = rows[known][order]
+        self.revenue = revenue[known][order]
+        self.funding = funding[known][order]
+        # Deals without revenue can't be placed in revenue order; scanned whole
+        self.unplaced_rows = rows[~known]
+        self.unplaced_funding = funding[~known]
+
+    def candidates(self, revenue, funding, penalty, bound, k):
+        """(distances, rows) of deals that could beat `bound`"""
+        distances, rows = [], []
+        missing = MISSING_PENALTY if revenue is not None else 0.0
+        n = len(self.rows)
+        if n:
+            position = int(np.searchsorted(self.revenue, revenue)) if revenue is not None else 0
+            window = max(INITIAL_WINDOW, k)
+            while True:
+                if revenue is None:
+                    lo, hi = 0, n
+                else:
+                    lo, hi = max(0, position - window), min(n, position + window)
+                distance = np.full(hi - lo, penalty)
+                if revenue is not None:
+                    distance += np.abs(self.revenue[lo:hi] - revenue)
+                distance = self._add_funding(distance, self.funding[lo:hi], funding)
+                if lo == 0 and hi == n:
+                    break
+                # Every deal outside the window is at least this far away; one
+                # exactly tied with the k-th could still win on row id
+                outside = min(revenue - self.revenue[lo] if lo > 0 else math.inf,
+                              self.revenue[hi - 1] - revenue if hi < n else math.inf)
+                kth = np.partition(distance, k - 1)[k - 1] if len(distance) >= k else math.inf
+                if penalty + outside > min(bound, kth):
+                    break
+                window *= 4
+            distances.append(distance)
+            rows.append(self.rows[lo:hi])
+        if len(self.unplaced_rows) and penalty + missing <= bound:
+            distance = np.full(len(self.unplaced_rows), penalty + missing)
+            distances.append(self._add_funding(distance, self.unplaced_funding, funding))
+            rows.append(self.unplaced_rows)
+        return distances, rows
+
+    @staticmethod
+    def _add_funding(distance, deal_funding, funding):
+        if funding is not None:
+            gap = np.abs(deal_funding - funding)
+            distance += FUNDING_WEIGHT * np.where(np.isnan(gap), MISSING_PENALTY, gap)
+        return distance
+
+
+class ComparablesIndex:
+    """Partitioned, revenue-sorted index over a deal set"""
+
+    def __init__(self, sectors, geographies, revenues, fundings, record, version=None):
+        """
+        sectors/geographies: per-deal labels; revenues/fundings: per-deal
+        millions (NaN when missing); record(row) returns the deal dict.
+        """
+        started = time.perf_counter()
+        self.record = record
+        self.version = version
+        self.size = len(sectors)
+        revenue = _log(revenues)
+        revenue[np.isnan(np.asarray(revenues, dtype=np.float64))] = np.nan
+        funding = _log(fundings)
+        funding[np.isnan(np.asarray(fundings, dtype=np.float64))] = np.nan
+
+        keys = {}
+        codes = np.empty(self.size, dtype=np.int64)
+        for i, key in enumerate(zip(sectors, geographies)):
+            codes[i] = keys.setdefault(key, len(keys))
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+        self.partitions = {}
+        for key, code in keys.items():
+            rows = order[bounds[code]:bounds[code + 1]]
+            self.partitions[key] = _Partition(rows, revenue[rows], funding[rows])
+        self._orders = {}
+        self.build_seconds = time.perf_counter() - started
+
+    @classmethod
+    def from_records(cls, deals, version=None):
+        fundings = (funding_midpoint(d.get('funding_need_m')) for d in deals)
+        return cls(
+            [d.get('sector') for d in deals],
+            [d.get('geography') for d in deals],
+            [np.nan if d.get('revenue_m') is None else d['revenue_m'] for d in deals],
+            [np.nan if funding is None else funding for funding in fundings],
+            deals.__getitem__,
+            version
+        )
+
+    @classmethod
+    def from_store(cls, store, version=None):
+        return cls(
+            store.labels('sector').tolist(),
+            store.labels('geography').tolist(),
+            np.asarray(store.column('revenue_m')),
+            (np.asarray(store.column('funding_low_m')) + np.asarray(store.column('funding_high_m'))) / 2,
+            store.record,
+            version
+        )
+
+    def _ordered_partitions(self, sector, geography):
+        """(penalty, partition) in increasing category penalty"""
+        ordered = self._orders.get((sector, geography))
+        if ordered is None:
+            ordered = sorted(
+                (((s != sector) * SECTOR_PENALTY + (g != geography) * GEOGRAPHY_PENALTY, partition)
+                 for (s, g), partition in self.partitions.items()),
+                key=lambda item: item[0]
+            )
+            if len(self._orders) < 1024:
+                self._orders[sector, geography] = ordered
+        return ordered
+
+    def query(self, sector, geography, revenue=None, funding=None, k=5):
+        """
+        [(distance, row)] of the k nearest deals, closest first; ties at
+        equal distance go to the lower row, as in a brute-force sort
+        """
+        revenue = None if revenue is None else float(np.log1p(max(revenue, 0)))
+        funding = None if funding is None else float(np.log1p(max(funding, 0)))
+        best_distances = np.empty(0)
+        best_rows = np.empty(0, dtype=np.int64)
+        bound = math.inf
+        for penalty, partition in self._ordered_partitions(sector, geography):
+            if penalty > bound:
+                break
+            distances, rows = partition.candidates(revenue, funding, penalty, bound, k)
+            if not distances:
+                continue
+            best_distances = np.concatenate([best_distances, *distances])
+            best_rows = np.concatenate([best_rows, *rows])
+            keep = np.lexsort((best_rows, best_distances))[:k]
+            best_distances, best_rows = best_distances[keep], best_rows[keep]
+            if len(best_distances) == k:
+                bound = best_distances[-1]
+        return [(float(d), int(r)) for d, r in zip(best_distances, best_rows)]
+
+    def stats(self):
+        sizes = [len(p.rows) + len(p.unplaced_rows) for p in self.partitions.values()]
+        return {
+            'deals': self.size,
+            'partitions': len(self.partitions),
+            'largest_partition': max(sizes, default=0),
+            'build_seconds': round(self.build_seconds, 4),
+            'version': self.version
+        }
+
+
+class ComparablesSource:
+    """
+    Builds the index from the deal store (or extracted_deals.json when there
+    is no store) and rebuilds it when the source changes, checking at most
+    every `check_seconds`
+    """
+
+    def __init__(self, store_path, json_path, check_seconds=5.0):
+        self.store_path = store_path
+        self.json_path = json_path
+        self.check_seconds = check_seconds
+        self.index = None
+        self.error = None
+        self.refreshes = 0
+        self._signature = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        meta = os.path.join(self.store_path, 'meta.json')
+        for kind, path in (('store', meta), ('json', self.json_path)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            return kind, path, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def _build(self, signature):
+        kind, path, mtime_ns = signature[:3]
+        if kind == 'store':
+            store = DealStore(self.store_path)
+            return ComparablesIndex.from_store(store, f"store:{store.generation}")
+        with open(path, encoding='utf-8') as f:
+            return ComparablesIndex.from_records(json.load(f), f"json:{mtime_ns}")
+
+    def refresh(self, force=False):
+        """Rebuild if the source changed; returns the current index (or None)"""
+        now = time.monotonic()
+        if not force and self.index is not None and now - self._checked < self.check_seconds:
+            return self.index
+        with self._lock:
+            self._checked = now
+            signature = self._current_signature()
+            # Keep serving the previous index if the source is missing or unreadable
+            if signature is None:
+                self.error = 'No deal store or extracted_deals.json found'
+            elif signature != self._signature or force:
+                try:
+                    index = self._build(signature)
+                except Exception as e:
+                    self.error = str(e)
+                else:
+                    self.index = index
+                    self._signature = signature
+                    self.error = None
+                    self.refreshes += 1
+            else:
+                # The source the index was built from is back
+                self.error = None
+        return self.index
+
+    def stats(self):
+        index = self.index
+        return {
+            'loaded': index is not None,
+            'source': self._signature[1] if self._signature else None,
+            'refreshes': self.refreshes,
+            'error': self.error,
+            **(index.stats() if index is not None else {})
+        }
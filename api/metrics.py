@@ -0,0 +1,221 @@
+"""
+Low-overhead request metrics with Prometheus text exposition
+Each worker keeps its counters and fixed-bucket histograms in a flat array of
+doubles. With METRICS_DIR set the array is a memory-mapped file per worker, so
+any worker can serve /metrics aggregated across all of them.
+"""
+
+import bisect
+import glob
+import mmap
+import os
+import threading
+import time
+from array import array
+
+# Per-stage latency buckets (seconds)
+LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+STAGES = ('queue', 'parse', 'cache', 'resolve', 'compute', 'build', 'microbatch', 'serialize', 'total')
+ENDPOINTS = ('predict', 'predict_batch', 'predict_stream', 'predict_grid', 'comparables', 'other')
+STATUS_CODES = ('200', '304', '400', '404', '413', '500', '503', 'other')
+FIELDS = ('sector', 'geography')
+
+
+class _Layout:
+    """Slot offsets for every series in the flat array"""
+
+    def __init__(self):
+        offset = 0
+        self.requests = {}
+        for endpoint in ENDPOINTS:
+            for code in STATUS_CODES:
+                self.requests[endpoint, code] = offset
+                offset += 1
+        self.fallbacks = {field: offset + i for i, field in enumerate(FIELDS)}
+        offset += len(FIELDS)
+        self.in_flight = offset
+        offset += 1
+        # Histogram: one slot per bucket plus +Inf, then the sum; the count
+        # is the total of the buckets, which saves a write per observation
+        self.stages = {}
+        for stage in STAGES:
+            self.stages[stage] = offset
+            offset += len(LATENCY_BUCKETS) + 2
+        self.size = offset
+
+
+LAYOUT = _Layout()
+
+
+class Metrics:
+    """
+    Per-worker metric storage; the backing array is recreated in forked children
+
+    Updates are read-modify-writes on shared memory, so they take a lock:
+    gthread workers serve requests on several threads at once.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._map = None
+        self._values = None
+        self._request_slots = {}
+        self._open()
+        os.register_at_fork(after_in_child=self._open)
+
+    def _open(self):
+        size = LAYOUT.size * 8
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'worker-{os.getpid()}.bin')
+            with open(path, 'wb') as f:
+                f.write(b'\0' * size)
+            with open(path, 'r+b') as f:
+                self._map = mmap.mmap(f.fileno(), size)
+        else:
+            self._map = mmap.mmap(-1, size)
+        self._values = memoryview(self._map).cast('d')
+        self._lock = threading.Lock()
+
+    def count_request(self, endpoint, status_code):
+        slot = self._request_slots.get((endpoint, status_code))
+        if slot is None:
+            code = str(status_code)
+            key = (endpoint if endpoint in ENDPOINTS else 'other', code if code in STATUS_CODES else 'other')
+            slot = self._request_slots[endpoint, status_code] = LAYOUT.requests[key]
+        with self._lock:
+            self._values[slot] += 1
+
+    def count_fallback(self, field):
+        """A sector/geography lookup that resolved to the default value"""
+        with self._lock:
+            self._values[LAYOUT.fallbacks[field]] += 1
+
+    def add_in_flight(self, delta):
+        with self._lock:
+            self._values[LAYOUT.in_flight] += delta
+
+    def observe(self, stage, seconds):
+        base = LAYOUT.stages[stage]
+        bucket = base + bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        values = self._values
+        with self._lock:
+            values[bucket] += 1
+            values[base + len(LATENCY_BUCKETS) + 1] += seconds
+
+    def _snapshots(self):
+        """(pid, values) for every worker, this one included"""
+        if not self.directory:
+            return [(os.getpid(), self._values.tolist())]
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.bin')):
+            try:
+                pid = int(os.path.basename(path)[len('worker-'):-len('.bin')])
+                values = array('d')
+                with open(path, 'rb') as f:
+                    values.frombytes(f.read(LAYOUT.size * 8))
+            except (ValueError, OSError):
+                continue
+            if len(values) == LAYOUT.size:
+                snapshots.append((pid, values))
+        return snapshots
+
+    def render(self, extra_gauges=None):
+        """Prometheus text exposition, summed across workers"""
+        snapshots = self._snapshots()
+        totals = [0.0] * LAYOUT.size
+        in_flight = 0.0
+        for pid, values in snapshots:
+            for i, value in enumerate(values):
+                totals[i] += value
+            if _alive(pid):
+                in_flight += values[LAYOUT.in_flight]
+
+        lines = [
+            '# HELP aria_requests_total Requests by endpoint and status code',
+            '# TYPE aria_requests_total counter'
+        ]
+        for (endpoint, code), slot in LAYOUT.requests.items():
+            if totals[slot]:
+                lines.append(f'aria_requests_total{{endpoint="{endpoint}",code="{code}"}} {totals[slot]:g}')
+
+        # Every resolve observation is one sector and one geography lookup
+        base = LAYOUT.stages['resolve']
+        lookups = sum(totals[base:base + len(LATENCY_BUCKETS) + 1])
+        lines += [
+            '# HELP aria_resolver_lookups_total /predict sector and geography resolutions',
+            '# TYPE aria_resolver_lookups_total counter'
+        ]
+        for field in FIELDS:
+            lines.append(f'aria_resolver_lookups_total{{field="{field}"}} {lookups:g}')
+        lines += [
+            '# HELP aria_resolver_fallbacks_total Resolutions that fell through to the default value',
+            '# TYPE aria_resolver_fallbacks_total counter'
+        ]
+        for field, slot in LAYOUT.fallbacks.items():
+            lines.append(f'aria_resolver_fallbacks_total{{field="{field}"}} {totals[slot]:g}')
+
+        lines += [
+            '# HELP aria_in_flight_requests Requests currently being handled',
+            '# TYPE aria_in_flight_requests gauge',
+            f'aria_in_flight_requests {in_flight:g}',
+            '# HELP aria_workers Worker processes reporting metrics',
+            '# TYPE aria_workers gauge',
+            f'aria_workers {sum(1 for pid, _ in snapshots if _alive(pid))}'
+        ]
+
+        lines += [
+            '# HELP aria_predict_stage_seconds Time spent in each /predict stage',
+            '# TYPE aria_predict_stage_seconds histogram'
+        ]
+        for stage, base in LAYOUT.stages.items():
+            count = sum(totals[base:base + len(LATENCY_BUCKETS) + 1])
+            if not count:
+                continue
+            cumulative = 0.0
+            for i, bound in enumerate(LATENCY_BUCKETS + ('+Inf',)):
+                cumulative += totals[base + i]
+                lines.append(f'aria_predict_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative:g}')
+            lines.append(f'aria_predict_stage_seconds_sum{{stage="{stage}"}} {totals[base + len(LATENCY_BUCKETS) + 1]:.9g}')
+            lines.append(f'aria_predict_stage_seconds_count{{stage="{stage}"}} {count:g}')
+
+        for name, (help_text, value) in (extra_gauges or {}).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value:.9g}']
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def measure_overhead(iterations=20000):
+    """Seconds of instrumentation per /predict request (timers plus metric writes)"""
+    scratch = Metrics()
+    clock = time.perf_counter
+    stages = ('parse', 'cache', 'resolve', 'compute', 'build', 'serialize', 'total')
+    start = clock()
+    for _ in range(iterations):
+        scratch.add_in_flight(1)
+        t0 = clock()
+        for stage in stages:
+            scratch.observe(stage, clock() - t0)
+        scratch.count_request('predict', 200)
+        scratch.add_in_flight(-1)
+    loop = clock()
+    # Subtract the bare loop so only the instrumentation is counted
+    for _ in range(iterations):
+        for stage in stages:
+            pass
+    return max(0.0, (loop - start) - (clock() - loop)) / iterations
@@ -0,0 +1,125 @@
+"""
+Dynamic micro-batching for concurrent single predictions
+Collects requests for up to max_wait_ms or max_batch items, scores them in one
+vectorized call and hands each result back to its waiting request thread
+"""
+
+import bisect
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative counts, Prometheus-style upper bounds)"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.n += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, n = list(self.counts), self.total, self.n
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + ['+Inf'], counts):
+            running += count
+            cumulative.append([bound, running])
+        return {'buckets': cumulative, 'count': n, 'sum': round(total, 6)}
+
+
+class MicroBatcher:
+    """
+    Bounded queue in front of a batch scoring function
+
+    score_batch(items) must return one result per item, in order. The
+    worker thread starts lazily in each process, so a batcher created
+    before gunicorn forks still works in every worker.
+    """
+
+    def __init__(self, score_batch, max_wait_ms=2.0, max_batch=64, max_queue=1024):
+        self.score_batch = score_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_wait_ms = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100])
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            threading.Thread(target=self._run, args=(self._queue,), name='microbatch', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, item, timeout=None):
+        """Score one item through the batcher and wait for its result"""
+        self._ensure_worker()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            # Saturated: score inline rather than queueing without bound
+            with self._lock:
+                self.rejected += 1
+            return self.score_batch([item])[0]
+        return future.result(timeout)
+
+    def _run(self, pending):
+        while True:
+            first = pending.get()
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000)
+
+            try:
+                results = self.score_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Configuration, batch-size and queue-wait histograms"""
+        with self._lock:
+            rejected = self.rejected
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_batch': self.max_batch,
+            'max_queue': self.max_queue,
+            'queue_depth': self._queue.qsize() if self._pid == os.getpid() else 0,
+            'rejected': rejected,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot()
+        }
@@ -0,0 +1,419 @@
+"""
+ML-backed valuation engine
+Loads the model bundle (ml/model_bundle.py), or the separate pickles in
+ml/models when there is none, once per process and scores with the flat
+array engine from ml/flat_forest.py.
+Under gunicorn with preload_app the load happens in the master, so forked
+workers share the model pages instead of each holding a copy. Each worker
+then watches the bundle file and swaps in new versions from a background
+thread (see BundleWatcher).
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from ml.category_encoder import UNKNOWN, CategoryEncoder
+from ml.flat_forest import FlatForest
+from ml.model_bundle import BUNDLE_FILE, ModelBundle
+from api.valuation import (
+    RESOLVER,
+    build_batch_results,
+    make_resolver,
+    parse_revenue,
+    score_batch,
+    with_final_multiple,
+)
+
+MODEL_DIR = os.environ.get(
+    'MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml', 'models')
+)
+MODEL_FILE = 'revenue_multiple_model.pkl'
+FOREST_FILE = 'revenue_multiple_forest.npz'
+SECTOR_ENCODER_FILE = 'sector_encoder.pkl'
+GEOGRAPHY_ENCODER_FILE = 'geography_encoder.pkl'
+SECTOR_CATEGORY_FILE = 'sector_category_encoder.json'
+GEOGRAPHY_CATEGORY_FILE = 'geography_category_encoder.json'
+
+# Single-file bundle, preferred over the pickles and polled for new versions
+MODEL_BUNDLE = os.environ.get('MODEL_BUNDLE', os.path.join(MODEL_DIR, BUNDLE_FILE))
+# Seconds between bundle checks in each worker; 0 disables hot-swapping
+BUNDLE_CHECK_SECONDS = float(os.environ.get('MODEL_BUNDLE_CHECK_SECONDS', 2))
+
+# Revenue used for training rows without one (see train_valuation_model.py)
+DEFAULT_REVENUE = 50
+
+# Per-tree quantiles reported as the multiple range in forest interval mode
+INTERVAL_QUANTILES = tuple(
+    float(q) for q in os.environ.get('FOREST_INTERVAL_QUANTILES', '0.1,0.9').split(',')
+)
+
+
+def dispersion_confidence(mean, std):
+    """Confidence from tree agreement: 1 when all trees agree, 0.5 when the std equals the mean"""
+    return 1 / (1 + std / np.maximum(np.abs(mean), 1e-9))
+
+
+class MLEngine:
+    """
+    Compiled RandomForest revenue-multiple model plus its label encoders and
+    the rule resolver they were built against
+    """
+
+    def __init__(self, forest, sector_classes, geography_classes, version, resolver=None, metadata=None):
+        self.forest = forest
+        self.resolver = resolver or RESOLVER
+        self.sector_encoder = CategoryEncoder('sector', sector_classes, self.resolver)
+        self.geography_encoder = CategoryEncoder('geography', geography_classes, self.resolver)
+        self.sector_codes = self.sector_encoder.codes
+        self.geography_codes = self.geography_encoder.codes
+        self.version = version
+        self.metadata = metadata or {}
+        self.n_estimators = forest.n_trees
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        """Engine over a ModelBundle, with a resolver built from its rule tables"""
+        resolver = make_resolver(bundle.rules)
+        if resolver.version == RESOLVER.version:
+            # Same tables as the code: keep the warm, shared resolver and its counters
+            resolver = RESOLVER
+        return cls(bundle.forest, bundle.sector_classes, bundle.geography_classes, bundle.version,
+                   resolver, bundle.metadata)
+
+    @classmethod
+    def load(cls, model_dir=MODEL_DIR):
+        """
+        Load the artifacts written by train_valuation_model.py
+
+        Uses the compiled forest from compile_forest.py when it is at least
+        as new as the pickle, otherwise compiles the pickle in memory.
+        """
+        paths = [os.path.join(model_dir, name)
+                 for name in (MODEL_FILE, SECTOR_ENCODER_FILE, GEOGRAPHY_ENCODER_FILE)]
+        digest = hashlib.sha1()
+        for path in paths:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+
+        forest_path = os.path.join(model_dir, FOREST_FILE)
+        if os.path.exists(forest_path) and os.path.getmtime(forest_path) >= os.path.getmtime(paths[0]):
+            forest = FlatForest.load(forest_path)
+        else:
+            forest = FlatForest.from_sklearn(joblib.load(paths[0]))
+        # The JSON encoders carry the same classes; older model dirs only have the pickles
+        classes = []
+        for json_name, pkl_path in ((SECTOR_CATEGORY_FILE, paths[1]), (GEOGRAPHY_CATEGORY_FILE, paths[2])):
+            json_path = os.path.join(model_dir, json_name)
+            if os.path.exists(json_path):
+                classes.append(CategoryEncoder.load(json_path).classes)
+            else:
+                classes.append(list(joblib.load(pkl_path).classes_))
+        return cls(forest, *classes, digest.hexdigest()[:12])
+
+    def encode(self, sector, geography):
+        """
+        Encode inputs as the model's feature codes
+
+        Returns (sector_code, geography_code, None) or (None, None, reason)
+        when the sector or geography was not seen in training.
+        """
+        sector_code = self.sector_encoder.encode_one(sector)
+        if sector_code == UNKNOWN:
+            return None, None, self._unknown_reason('sector', sector)
+        geography_code = self.geography_encoder.encode_one(geography)
+        if geography_code == UNKNOWN:
+            return None, None, self._unknown_reason('geography', geography)
+        return sector_code, geography_code, None
+
+    def _unknown_reason(self, field, value):
+        encoder = self.sector_encoder if field == 'sector' else self.geography_encoder
+        return f"{field} '{encoder.family(value)}' not in training data"
+
+    @staticmethod
+    def _features(sector_codes, geography_codes, revenues):
+        revenues = np.asarray(revenues, dtype=float)
+        return np.column_stack([
+            np.asarray(sector_codes, dtype=float),
+            np.asarray(geography_codes, dtype=float),
+            np.where(revenues > 0, revenues, DEFAULT_REVENUE)
+        ])
+
+    def predict_multiples(self, sector_codes, geography_codes, revenues):
+        """Predict revenue multiples for encoded rows"""
+        return self.forest.predict(self._features(sector_codes, geography_codes, revenues))
+
+    def predict_intervals(self, sector_codes, geography_codes, revenues):
+        """
+        Multiples with forest-derived ranges for encoded rows
+
+        Returns arrays (multiple, low, high, confidence, std): low/high are
+        INTERVAL_QUANTILES of the per-tree outputs, widened to contain the
+        mean, and confidence comes from the spread of the trees.
+        """
+        mean, (low, high), std = self.forest.predict_interval(
+            self._features(sector_codes, geography_codes, revenues), INTERVAL_QUANTILES
+        )
+        return mean, np.minimum(low, mean), np.maximum(high, mean), dispersion_confidence(mean, std), std
+
+    def interval_info(self, std):
+        """The 'interval' block of a forest interval prediction"""
+        return {
+            'method': 'forest_quantiles',
+            'quantiles': list(INTERVAL_QUANTILES),
+            'tree_std': round(std, 4),
+            'trees': self.n_estimators
+        }
+
+    def predict_interval_one(self, sector, geography, revenue):
+        """Return ((multiple, low, high, confidence, std), None), or (None, reason)"""
+        sector_code, geography_code, reason = self.encode(sector, geography)
+        if reason:
+            return None, reason
+        columns = self.predict_intervals([sector_code], [geography_code], [revenue])
+        return tuple(float(column[0]) for column in columns), None
+
+    def predict_one(self, sector, geography, revenue):
+        """Return (multiple, None), or (None, reason) to fall back to the rules"""
+        sector_code, geography_code, reason = self.encode(sector, geography)
+        if reason:
+            return None, reason
+        revenue = revenue if revenue > 0 else DEFAULT_REVENUE
+        return self.forest.predict_one((sector_code, geography_code, revenue)), None
+
+    def key_drivers(self, sector, geography, final_multiple):
+        """Key drivers for an ML prediction"""
+        return [
+            f"ML model: RandomForest ({self.n_estimators} trees) on "
+            f"{self.sector_encoder.family(sector)}, {self.geography_encoder.family(geography)}",
+            f"Final multiple: {round(final_multiple, 2)}x"
+        ]
+
+    def predict_batch(self, sectors, geographies, revenues, interval=False):
+        """
+        Batch prediction with the model, falling back to the rules per row
+
+        Sectors and geographies are encoded as whole arrays and the
+        known rows scored in a single model call. With interval=True ranges and
+        confidence come from the per-tree outputs (see predict_intervals).
+        """
+        revenues = [parse_revenue(r) for r in revenues]
+        scores = score_batch(sectors, geographies, revenues, self.resolver)
+        errors = scores['errors']
+        n = len(errors)
+        engines, drivers, fallbacks, intervals = ['rules'] * n, [None] * n, [None] * n, [None] * n
+
+        all_sector_codes = self.sector_encoder.encode(sectors)
+        all_geography_codes = self.geography_encoder.encode(geographies)
+        valid = np.fromiter((error is None for error in errors), bool, n)
+        known = valid & (all_sector_codes != UNKNOWN) & (all_geography_codes != UNKNOWN)
+        for i in np.flatnonzero(valid & ~known).tolist():
+            field = 'sector' if all_sector_codes[i] == UNKNOWN else 'geography'
+            fallbacks[i] = self._unknown_reason(field, sectors[i] if field == 'sector' else geographies[i])
+        rows = np.flatnonzero(known)
+        sector_codes, geography_codes = all_sector_codes[rows], all_geography_codes[rows]
+        rows = rows.tolist()
+
+        if rows:
+            final_multiple = scores['final_multiple'].copy()
+            if interval:
+                low_multiple, high_multiple = scores['low_multiple'].copy(), scores['high_multiple'].copy()
+                (final_multiple[rows], low_multiple[rows], high_multiple[rows],
+                 scores['confidence'][rows], std) = self.predict_intervals(
+                    sector_codes, geography_codes, scores['revenue'][rows]
+                )
+                with_final_multiple(scores, final_multiple, low_multiple, high_multiple)
+                for i, row_std in zip(rows, std.tolist()):
+                    intervals[i] = self.interval_info(row_std)
+            else:
+                final_multiple[rows] = self.predict_multiples(
+                    sector_codes, geography_codes, scores['revenue'][rows]
+                )
+                with_final_multiple(scores, final_multiple)
+            for i in rows:
+                engines[i] = 'ml'
+                drivers[i] = self.key_drivers(sectors[i], geographies[i], float(final_multiple[i]))
+
+        scores.update({'engine': engines, 'key_drivers': drivers, 'fallback': fallbacks, 'interval': intervals})
+        return build_batch_results(sectors, geographies, revenues, scores)
+
+
+def _rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+ENGINE = None
+BOOT_STATS = {'loaded': False}
+
+
+def current():
+    """
+    (engine, resolver) to serve one request with
+
+    Read once per request: a swap replaces ENGINE in a single assignment,
+    so a request never mixes two model versions or rule tables.
+    """
+    engine = ENGINE
+    return engine, engine.resolver if engine is not None else RESOLVER
+
+
+def _warm_up(engine):
+    """First prediction pays for lazy imports and allocator warm-up; returns its ms"""
+    start = time.perf_counter()
+    engine.predict_multiples([0], [0], [DEFAULT_REVENUE])
+    return (time.perf_counter() - start) * 1000
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class BundleWatcher:
+    """
+    Polls the bundle file and hot-swaps ENGINE when it changes
+
+    Loading, checksum verification, resolver building and warm-up all
+    happen on a daemon thread; requests only ever see a finished engine.
+    The thread is started lazily per process (ensure_running), so each
+    gunicorn worker forked from the preloaded master gets its own. A bundle
+    that fails to load is reported and skipped until the file changes again.
+    """
+
+    def __init__(self, path, check_seconds):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.signature = None
+        self.swaps = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_swap = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        if self._pid == os.getpid() or self.check_seconds <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='model-bundle-watcher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_seconds)
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = str(e)
+
+    def check(self):
+        """Load and swap in the bundle if the file changed; returns True on a swap"""
+        global ENGINE
+        signature = _file_signature(self.path)
+        if signature is None or signature == self.signature:
+            return False
+        started = time.perf_counter()
+        try:
+            engine = MLEngine.from_bundle(ModelBundle.read(self.path))
+            _warm_up(engine)
+        except Exception as e:
+            self.signature = signature
+            self.failures += 1
+            self.last_error = f"{self.path}: {e}"
+            return False
+        previous = ENGINE
+        ENGINE = engine
+        self.signature = signature
+        self.swaps += 1
+        self.last_error = None
+        self.last_swap = {
+            'from': previous.version if previous is not None else None,
+            'to': engine.version,
+            'at': time.time(),
+            'load_seconds': round(time.perf_counter() - started, 4)
+        }
+        return True
+
+    def stats(self):
+        engine = ENGINE
+        return {
+            'path': self.path,
+            'active_version': engine.version if engine is not None else None,
+            'metadata': engine.metadata if engine is not None else {},
+            'watching': self._pid == os.getpid(),
+            'check_seconds': self.check_seconds,
+            'swaps': self.swaps,
+            'failures': self.failures,
+            'last_swap': self.last_swap,
+            'last_error': self.last_error
+        }
+
+
+WATCHER = BundleWatcher(MODEL_BUNDLE, BUNDLE_CHECK_SECONDS)
+
+
+def load_engine(model_dir=MODEL_DIR):
+    """
+    Load the model once (bundle first, else the pickles) and record cold-start timings
+
+    A bundle that fails to load is recorded in BOOT_STATS['bundle_error']
+    and the pickles are used instead.
+    """
+    global ENGINE
+    bundle_path = WATCHER.path if model_dir == MODEL_DIR else os.path.join(model_dir, BUNDLE_FILE)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    engine, source, bundle_error = None, 'pickles', None
+    signature = _file_signature(bundle_path)
+    if signature is not None:
+        try:
+            engine, source = MLEngine.from_bundle(ModelBundle.read(bundle_path)), 'bundle'
+        except Exception as e:
+            bundle_error = f"{bundle_path}: {e}"
+        if bundle_path == WATCHER.path:
+            # A bad bundle is skipped by the watcher until the file changes
+            WATCHER.signature = signature
+            if bundle_error:
+                WATCHER.failures += 1
+                WATCHER.last_error = bundle_error
+    try:
+        if engine is None:
+            engine = MLEngine.load(model_dir)
+    except Exception as e:
+        BOOT_STATS.update({'loaded': False, 'error': str(e), 'bundle_error': bundle_error})
+        return None
+    load_seconds = time.perf_counter() - start
+
+    first_prediction_ms = _warm_up(engine)
+
+    ENGINE = engine
+    BOOT_STATS.update({
+        'loaded': True,
+        'version': engine.version,
+        'source': source,
+        'bundle_error': bundle_error,
+        'load_seconds': round(load_seconds, 4),
+        'first_prediction_ms': round(first_prediction_ms, 3),
+        'model_rss_mb': round(_rss_mb() - rss_before, 1),
+        'pid': os.getpid()
+    })
+    return engine
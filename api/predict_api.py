@@ -3,153 +3,207 @@ Flask API with Rule-Based ML Predictions
 Production-ready version for Railway/Render deployment
 """
 
+import itertools
+import json
+import math
 import os
-from flask import Flask, request, jsonify
+import sys
+import time
+from flask import Flask, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import numpy as np
+
+# Allow `python api/predict_api.py` as well as `gunicorn api.predict_api:app`
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import ml_engine
+from api.admission import AdmissionController, parse_request_start
+from api.comparables import ComparablesSource, funding_midpoint
+from api.metrics import Metrics, measure_overhead
+from api.profiler import RequestProfiler
+from api.microbatch import MicroBatcher
+from api.response_cache import ResponseCache, make_etag
+from api.shadow import ShadowScorer
+from api.valuation import (
+    get_size_adjustment,
+    parse_revenue,
+    build_key_drivers,
+    build_prediction,
+    predict_batch,
+    get_sector_family,
+    get_geography_region,
+    revenue_sweep,
+    score_grid,
+)
 
 app = Flask(__name__)
 CORS(app)
 
-# Sector base multiples (from Njord deal patterns)
-SECTOR_MULTIPLES = {
-    'Technology': 4.5,
-    'Software': 4.5,
-    'SaaS': 4.5,
-    'AI': 4.5,
-    'Gaming': 5.0,
-    'Gaming/Entertainment': 5.0,
-    'ESports': 5.0,
-    'Cannabis': 3.0,
-    'Cannabis/Healthcare': 3.0,
-    'Healthcare': 3.0,
-    'Mining': 1.2,
-    'Mining/Resources': 1.2,
-    'Gold': 1.2,
-    'Energy': 1.5,
-    'Oil': 1.5,
-    'Gas': 1.5,
-    'Construction': 0.7,
-    'Construction/Real Estate': 0.7,
-    'Real Estate': 0.7,
-    'Trading': 0.3,
-    'Trading/Commodities': 0.3,
-    'Commodities': 0.3,
-    'Manufacturing': 1.0
-}
+# Upper bound on rows accepted by /predict/batch
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 10000))
+
+# Lines scored per chunk by /predict/stream
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 500))
+
+# Upper bound on geography x revenue cells in one /predict/grid response
+MAX_GRID_CELLS = int(os.environ.get('MAX_GRID_CELLS', 100000))
+
+# Prediction engines; 'ml' falls back to the rules when the model can't score
+ENGINES = ('rules', 'ml')
+VALUATION_ENGINE = os.environ.get('VALUATION_ENGINE', 'rules')
+
+# Multiple ranges: the fixed ±25% band, or quantiles of the forest's per-tree
+# outputs ('forest' only changes ML-scored rows)
+INTERVALS = ('fixed', 'forest')
+VALUATION_INTERVAL = os.environ.get('VALUATION_INTERVAL', 'fixed')
+
+# Load the model at import so gunicorn's preloaded master shares it with workers;
+# each worker then hot-swaps new bundle versions (see ml_engine.BundleWatcher)
+ml_engine.load_engine()
+
+# Comparable-deals index over the deal store (extracted_deals.json if there is
+# none), rebuilt when the data changes
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPARABLES = ComparablesSource(
+    os.environ.get('DEAL_STORE', os.path.join(_ROOT, 'deal_store')),
+    os.environ.get('DEALS_JSON', os.path.join(_ROOT, 'extracted_deals.json')),
+    check_seconds=float(os.environ.get('COMPARABLES_REFRESH_SECONDS', 5))
+)
+COMPARABLES.refresh()
+COMPARABLES_DEFAULT_K = int(os.environ.get('COMPARABLES_DEFAULT_K', 5))
+COMPARABLES_MAX_K = int(os.environ.get('COMPARABLES_MAX_K', 100))
+
+
+def _score_items(items):
+    """
+    Score (sector, geography, revenue, engine, interval) tuples, one
+    vectorized call per engine and interval mode, all with the same model
+    version
+    """
+    model, resolver = ml_engine.current()
+    model_version = model.version if model is not None else None
+    results = [None] * len(items)
+    for engine, interval in itertools.product(ENGINES, INTERVALS):
+        rows = [i for i, item in enumerate(items) if item[3] == engine and item[4] == interval]
+        if not rows:
+            continue
+        sectors = [items[i][0] for i in rows]
+        geographies = [items[i][1] for i in rows]
+        revenues = [items[i][2] for i in rows]
+        if engine == 'ml' and model is not None:
+            scored = model.predict_batch(sectors, geographies, revenues, interval=interval == 'forest')
+        else:
+            scored = predict_batch(sectors, geographies, revenues, resolver)
+            if engine == 'ml':
+                for result in scored:
+                    if result['success']:
+                        result['fallback'] = 'ML model not loaded'
+        for i, result in zip(rows, scored):
+            if result['success']:
+                result['model_version'] = model_version
+            results[i] = result
+    return results
 
-# Geography adjustments
-GEOGRAPHY_ADJUSTMENTS = {
-    'United States': 1.2,
-    'USA': 1.2,
-    'US': 1.2,
-    'North America': 1.2,
-    'Canada': 1.2,
-    'Sweden': 1.1,
-    'Norway': 1.1,
-    'Denmark': 1.1,
-    'Europe': 1.0,
-    'UK': 1.0,
-    'Germany': 1.0,
-    'France': 1.0,
-    'Global': 1.0,
-    'Peru': 0.7,
-    'Brazil': 0.7,
-    'South America': 0.7,
-    'Ghana': 0.7,
-    'Africa': 0.7
-}
 
-# Sector confidence levels
-SECTOR_CONFIDENCE = {
-    'Technology': 0.85,
-    'Software': 0.85,
-    'SaaS': 0.85,
-    'Gaming': 0.80,
-    'Gaming/Entertainment': 0.80,
-    'Cannabis': 0.75,
-    'Healthcare': 0.75,
-    'Mining': 0.70,
-    'Mining/Resources': 0.70,
-    'Energy': 0.75,
-    'Construction': 0.65,
-    'Construction/Real Estate': 0.65,
-    'Real Estate': 0.65,
-    'Trading': 0.60,
-    'Trading/Commodities': 0.60,
-    'Manufacturing': 0.70
+# Coalesce concurrent /predict calls into batches (useful with threaded workers)
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '0') == '1'
+BATCHER = MicroBatcher(
+    _score_items,
+    max_wait_ms=float(os.environ.get('MICROBATCH_MAX_WAIT_MS', 2)),
+    max_batch=int(os.environ.get('MICROBATCH_MAX_BATCH', 64)),
+    max_queue=int(os.environ.get('MICROBATCH_MAX_QUEUE', 1024))
+)
+
+# Cache serialized /predict responses; RESPONSE_CACHE_SIZE=0 disables it
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('RESPONSE_CACHE_TTL', 300)),
+    revenue_quantum=float(os.environ.get('RESPONSE_CACHE_REVENUE_QUANTUM', 0))
+)
+
+# Compare both engines on live traffic in the background; requests still get
+# their primary engine's answer and shadow work is dropped when the queue is full
+SHADOW_ENABLED = os.environ.get('SHADOW_ENABLED', '0') == '1'
+SHADOW = ShadowScorer(
+    _score_items,
+    workers=int(os.environ.get('SHADOW_WORKERS', 1)),
+    max_rows=int(os.environ.get('SHADOW_QUEUE_ROWS', 1024)),
+    batch_rows=int(os.environ.get('SHADOW_BATCH_ROWS', 256)),
+    threshold=float(os.environ.get('SHADOW_DISAGREE_THRESHOLD', 0.1))
+)
+
+# Per-worker counters and stage histograms; METRICS_DIR shares them across workers
+METRICS = Metrics(os.environ.get('METRICS_DIR'))
+METRIC_ENDPOINTS = {
+    'predict': 'predict',
+    'predict_batch_route': 'predict_batch',
+    'predict_stream': 'predict_stream',
+    'predict_grid': 'predict_grid',
+    'comparables': 'comparables'
 }
+_overhead_seconds = None
 
+# Shed prediction requests with 503 + Retry-After once they have queued longer
+# than ADMISSION_QUEUE_BUDGET_MS; /health and the stats routes are never shed
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '0') == '1'
+ADMISSION = AdmissionController(
+    max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 4)),
+    queue_budget_ms=float(os.environ.get('ADMISSION_QUEUE_BUDGET_MS', 500)),
+    retry_after=int(os.environ.get('ADMISSION_RETRY_AFTER', 1))
+)
+ADMISSION_ENDPOINTS = frozenset(METRIC_ENDPOINTS)
+# Count time since X-Request-Start as queue time; only behind a proxy that
+# overwrites the header, since clients can send any value
+ADMISSION_TRUST_REQUEST_START = os.environ.get('ADMISSION_TRUST_REQUEST_START', '0') == '1'
 
-def get_base_multiple(sector):
-    """Get base multiple for a sector"""
-    if not sector:
-        return 1.5
-    
-    # Exact match first
-    if sector in SECTOR_MULTIPLES:
-        return SECTOR_MULTIPLES[sector]
-    
-    # Partial match
-    sector_lower = sector.lower()
-    for key, value in SECTOR_MULTIPLES.items():
-        if key.lower() in sector_lower or sector_lower in key.lower():
-            return value
-    
-    # Default
-    return 1.5
 
+@app.before_request
+def _watch_model_bundle():
+    ml_engine.WATCHER.ensure_running()
 
-def get_geography_adjustment(geography):
-    """Get geography adjustment multiplier"""
-    if not geography:
-        return 1.0
-    
-    # Exact match first
-    if geography in GEOGRAPHY_ADJUSTMENTS:
-        return GEOGRAPHY_ADJUSTMENTS[geography]
-    
-    # Partial match
-    geo_lower = geography.lower()
-    for key, value in GEOGRAPHY_ADJUSTMENTS.items():
-        if key.lower() in geo_lower or geo_lower in key.lower():
-            return value
-    
-    # Default
-    return 1.0
 
+@app.before_request
+def _track_start():
+    METRICS.add_in_flight(1)
 
-def get_confidence(sector):
-    """Get confidence score for a sector"""
-    if not sector:
-        return 0.70
-    
-    # Exact match first
-    if sector in SECTOR_CONFIDENCE:
-        return SECTOR_CONFIDENCE[sector]
-    
-    # Partial match
-    sector_lower = sector.lower()
-    for key, value in SECTOR_CONFIDENCE.items():
-        if key.lower() in sector_lower or sector_lower in key.lower():
-            return value
-    
-    # Default
-    return 0.70
 
+@app.after_request
+def _track_status(response):
+    METRICS.count_request(METRIC_ENDPOINTS.get(request.endpoint, 'other'), response.status_code)
+    return response
 
-def get_size_adjustment(revenue):
-    """Adjust multiple based on company size"""
-    if not revenue or revenue <= 0:
-        return 1.0
-    
-    if revenue < 10:
-        return 1.2  # Small company premium
-    elif revenue < 50:
-        return 1.0  # Mid-market baseline
-    elif revenue < 250:
-        return 0.9  # Large company discount
-    else:
-        return 0.7  # Very large discount
+
+@app.teardown_request
+def _track_end(exc):
+    METRICS.add_in_flight(-1)
+
+
+@app.before_request
+def _admit():
+    if not ADMISSION_ENABLED or request.endpoint not in ADMISSION_ENDPOINTS:
+        return None
+    queued = None
+    if ADMISSION_TRUST_REQUEST_START:
+        queued = parse_request_start(request.headers.get('X-Request-Start'))
+    waited = ADMISSION.admit(queued or 0.0)
+    if waited is None:
+        response = jsonify({
+            'success': False,
+            'error': 'Server is overloaded, retry shortly'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(ADMISSION.retry_after)
+        return response
+    g.admitted = True
+    METRICS.observe('queue', waited)
+    return None
+
+
+@app.teardown_request
+def _release_admission(exc):
+    if g.pop('admitted', False):
+        ADMISSION.release()
 
 
 @app.route('/', methods=['GET'])
@@ -162,7 +216,18 @@ def home():
         'endpoints': {
             'health': '/health',
             'test': '/test',
-            'predict': '/predict (POST)'
+            'predict': '/predict (POST)',
+            'predict_batch': '/predict/batch (POST)',
+            'predict_stream': '/predict/stream (POST, NDJSON)',
+            'predict_grid': '/predict/grid (POST)',
+            'comparables': '/comparables (POST)',
+            'resolver_stats': '/stats/resolver',
+            'batching_stats': '/stats/batching',
+            'cache_stats': '/stats/cache',
+            'comparables_stats': '/stats/comparables',
+            'shadow_stats': '/stats/shadow',
+            'admission_stats': '/stats/admission',
+            'metrics': '/metrics'
         }
     })
 
@@ -172,8 +237,63 @@ def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'message': 'Valuation API is running'
+        'message': 'Valuation API is running',
+        'default_engine': VALUATION_ENGINE,
+        'default_interval': VALUATION_INTERVAL,
+        'model_version': ml_engine.WATCHER.stats()['active_version'],
+        'ml_model': ml_engine.BOOT_STATS,
+        'model_bundle': ml_engine.WATCHER.stats()
+    })
+
+
+@app.route('/stats/resolver', methods=['GET'])
+def resolver_stats():
+    """Sector/geography match counters, including default fallbacks"""
+    return jsonify(ml_engine.current()[1].stats())
+
+
+@app.route('/stats/batching', methods=['GET'])
+def batching_stats():
+    """Micro-batching batch-size and queue-wait histograms for this worker"""
+    return jsonify({'enabled': MICROBATCH_ENABLED, **BATCHER.stats()})
+
+
+@app.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    """Response cache size, hit ratio and eviction counts for this worker"""
+    return jsonify(RESPONSE_CACHE.stats())
+
+
+@app.route('/stats/comparables', methods=['GET'])
+def comparables_stats():
+    """Comparable-deals index size, source and refresh count"""
+    COMPARABLES.refresh()
+    return jsonify(COMPARABLES.stats())
+
+
+@app.route('/stats/shadow', methods=['GET'])
+def shadow_stats():
+    """Rules-vs-ML disagreement per sector family from shadow scoring in this worker"""
+    return jsonify({'enabled': SHADOW_ENABLED, **SHADOW.stats()})
+
+
+@app.route('/stats/admission', methods=['GET'])
+def admission_stats():
+    """Admission control limits, shed counts and queue-wait histogram for this worker"""
+    return jsonify({'enabled': ADMISSION_ENABLED, **ADMISSION.stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition, aggregated across workers sharing METRICS_DIR"""
+    global _overhead_seconds
+    if _overhead_seconds is None:
+        _overhead_seconds = measure_overhead(5000)
+    text = METRICS.render({
+        'aria_metrics_overhead_seconds': ('Measured instrumentation cost per /predict request',
+                                          _overhead_seconds)
     })
+    return app.response_class(text, mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/test', methods=['GET'])
@@ -187,6 +307,115 @@ def test():
     })
 
 
+def _resolve_and_record(resolver, sector, geography, record=True):
+    """
+    Resolve both fields, counting default fallbacks and the resolve stage
+
+    record=False leaves the resolver's own match counters alone, for
+    paths that resolved (or will resolve) the same inputs elsewhere.
+    """
+    started = time.perf_counter()
+    sector_match = resolver.resolve_sector(sector, record)
+    geo_match = resolver.resolve_geography(geography, record)
+    if sector_match.match == 'default':
+        METRICS.count_fallback('sector')
+    if geo_match.match == 'default':
+        METRICS.count_fallback('geography')
+    METRICS.observe('resolve', time.perf_counter() - started)
+    return sector_match, geo_match
+
+
+def _predict_one(sector, geography, revenue, engine, interval='fixed', snapshot=None):
+    """
+    Score a single set of inputs and build the /predict response body
+    
+    snapshot is the (model, resolver) pair from ml_engine.current().
+    """
+    clock = time.perf_counter
+    model, resolver = snapshot or ml_engine.current()
+    
+    # Resolve sector (multiple + confidence) and geography in one pass each
+    sector_match, geo_match = _resolve_and_record(resolver, sector, geography)
+    resolved = clock()
+    
+    # Get base multiple from sector
+    base_multiple = sector_match.base_multiple
+    
+    # Get geography adjustment
+    geo_adjustment = geo_match.adjustment
+    
+    # Get size adjustment
+    size_adjustment = get_size_adjustment(revenue)
+    
+    # Calculate final multiple
+    final_multiple = base_multiple * geo_adjustment * size_adjustment
+    used_engine, fallback, key_drivers = 'rules', None, None
+    forest_interval = None
+    if engine == 'ml':
+        if model is None:
+            fallback = 'ML model not loaded'
+        elif interval == 'forest':
+            scored, fallback = model.predict_interval_one(sector, geography, revenue)
+            if scored is not None:
+                final_multiple, low_multiple, high_multiple, confidence, tree_std = scored
+                forest_interval = model.interval_info(tree_std)
+        else:
+            ml_multiple, fallback = model.predict_one(sector, geography, revenue)
+            if ml_multiple is not None:
+                final_multiple = ml_multiple
+        if fallback is None:
+            used_engine = 'ml'
+            key_drivers = model.key_drivers(sector, geography, final_multiple)
+    
+    if forest_interval is None:
+        # Calculate range (±25%)
+        low_multiple = final_multiple * 0.75
+        high_multiple = final_multiple * 1.25
+        
+        # Get confidence
+        confidence = sector_match.confidence
+    
+    # Calculate enterprise values
+    enterprise_value = final_multiple * revenue
+    ev_low = low_multiple * revenue
+    ev_high = high_multiple * revenue
+    computed = clock()
+    METRICS.observe('compute', computed - resolved)
+    
+    # Generate key drivers
+    if key_drivers is None:
+        key_drivers = build_key_drivers(sector, geography, base_multiple, geo_adjustment,
+                                        size_adjustment, final_multiple)
+    
+    # Build response
+    response = build_prediction(
+        sector, geography, revenue, final_multiple, low_multiple, high_multiple,
+        enterprise_value, ev_low, ev_high, confidence, key_drivers, engine=used_engine,
+        interval=forest_interval
+    )
+    if fallback:
+        response['fallback'] = fallback
+    response['model_version'] = model.version if model is not None else None
+    METRICS.observe('build', clock() - computed)
+    return response
+
+
+def _cache_version(snapshot):
+    """Rule-table and model versions that cached responses depend on"""
+    model, resolver = snapshot
+    return resolver.version, model.version if model is not None else None
+
+
+def _etag_response(body, etag):
+    """JSON response with an ETag, or 304 if the client already has it"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """
@@ -196,9 +425,19 @@ def predict():
     {
         "sector": "Technology",
         "geography": "North America",
-        "revenue": 50
+        "revenue": 50,
+        "engine": "rules",           (optional: "rules" or "ml")
+        "interval": "fixed"          (optional: "fixed" or "forest")
     }
+    
+    interval "forest" takes the ML multiple range from per-tree quantiles
+    and the confidence from how much the trees disagree.
+    
+    Responses carry an ETag; send it back as If-None-Match to get a 304
+    when the valuation hasn't changed.
     """
+    clock = time.perf_counter
+    started = clock()
     try:
         data = request.json
         
@@ -208,85 +447,383 @@ def predict():
                 'error': 'No JSON data provided'
             }), 400
         
+        engine = _requested_engine(data)
+        interval = _requested_interval(data)
+        
         # Extract inputs
         sector = data.get('sector', 'Other')
         geography = data.get('geography', 'Global')
         
         # Handle revenue - could be string or number
-        revenue_raw = data.get('revenue', 0)
-        try:
-            revenue = float(revenue_raw) if revenue_raw else 0
-        except (ValueError, TypeError):
-            revenue = 0
+        revenue = RESPONSE_CACHE.quantize(parse_revenue(data.get('revenue', 0)))
+        parsed = clock()
+        METRICS.observe('parse', parsed - started)
         
-        # Get base multiple from sector
-        base_multiple = get_base_multiple(sector)
+        # One model version for the whole request, even across a hot-swap
+        snapshot = ml_engine.current()
         
-        # Get geography adjustment
-        geo_adjustment = get_geography_adjustment(geography)
+        # Repeated inputs are served from the response cache
+        cache_key = None
+        if RESPONSE_CACHE.enabled:
+            cache_key = RESPONSE_CACHE.make_key(sector, geography, revenue, engine, interval)
+        if cache_key is not None:
+            version = _cache_version(snapshot)
+            cached = RESPONSE_CACHE.get(cache_key, version)
+            METRICS.observe('cache', clock() - parsed)
+            if cached is not None:
+                # Fallback rates and the resolve stage count served requests
+                _resolve_and_record(snapshot[1], sector, geography, record=False)
+                if SHADOW_ENABLED:
+                    SHADOW.submit([(sector, geography, revenue, None, None)])
+                METRICS.observe('total', clock() - started)
+                return _etag_response(*cached)
         
-        # Get size adjustment
-        size_adjustment = get_size_adjustment(revenue)
+        if MICROBATCH_ENABLED:
+            # The batch resolves these again (and records them with the resolver)
+            _resolve_and_record(snapshot[1], sector, geography, record=False)
+            queued = clock()
+            response = BATCHER.submit((sector, geography, revenue, engine, interval))
+            METRICS.observe('microbatch', clock() - queued)
+            if not response['success']:
+                return jsonify(response), 400
+        else:
+            response = _predict_one(sector, geography, revenue, engine, interval, snapshot)
         
-        # Calculate final multiple
-        final_multiple = base_multiple * geo_adjustment * size_adjustment
+        serializing = clock()
+        body = jsonify(response).get_data()
+        etag = make_etag(body)
+        METRICS.observe('serialize', clock() - serializing)
+        if cache_key is not None:
+            RESPONSE_CACHE.put(cache_key, version, body, etag)
+        if SHADOW_ENABLED and response['success']:
+            SHADOW.submit([(sector, geography, revenue, response['engine'],
+                            response['predictions']['revenue_multiple'])])
+        METRICS.observe('total', clock() - started)
+        return _etag_response(body, etag)
         
-        # Calculate range (±25%)
-        low_multiple = final_multiple * 0.75
-        high_multiple = final_multiple * 1.25
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+def _requested_engine(data):
+    """Engine from ?engine=, the JSON body, or VALUATION_ENGINE"""
+    engine = request.args.get('engine')
+    if not engine and isinstance(data, dict):
+        engine = data.get('engine')
+    engine = engine or VALUATION_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}' (expected one of {', '.join(ENGINES)})")
+    return engine
+
+
+def _requested_interval(data):
+    """Interval mode from ?interval=, the JSON body, or VALUATION_INTERVAL"""
+    interval = request.args.get('interval')
+    if not interval and isinstance(data, dict):
+        interval = data.get('interval')
+    interval = interval or VALUATION_INTERVAL
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval '{interval}' (expected one of {', '.join(INTERVALS)})")
+    return interval
+
+
+def _batch_columns(data):
+    """
+    Normalize a batch payload into sector/geography/revenue lists
+    
+    Accepts a list of /predict objects, {"items": [...]}, or columnar
+    {"sector": [...], "geography": [...], "revenue": [...]}.
+    Returns (sectors, geographies, revenues, item_errors).
+    """
+    if isinstance(data, dict) and 'items' not in data:
+        columns = {name: data.get(name) for name in ('sector', 'geography', 'revenue')}
+        lengths = {len(col) for col in columns.values() if isinstance(col, list)}
+        if len(lengths) != 1 or any(col is not None and not isinstance(col, list)
+                                    for col in columns.values()):
+            raise ValueError('Columnar input needs equal-length sector/geography/revenue arrays')
+        n = lengths.pop()
+        return (
+            columns['sector'] if columns['sector'] is not None else ['Other'] * n,
+            columns['geography'] if columns['geography'] is not None else ['Global'] * n,
+            columns['revenue'] if columns['revenue'] is not None else [0] * n,
+            [None] * n
+        )
+    
+    items = data['items'] if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('Expected a list of items')
+    
+    sectors, geographies, revenues, item_errors = [], [], [], []
+    for item in items:
+        if not item:
+            error, item = 'No JSON data provided', {}
+        elif not isinstance(item, dict):
+            error, item = 'Each item must be a JSON object', {}
+        else:
+            error = None
+        sectors.append(item.get('sector', 'Other'))
+        geographies.append(item.get('geography', 'Global'))
+        revenues.append(item.get('revenue', 0))
+        item_errors.append(error)
+    return sectors, geographies, revenues, item_errors
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_route():
+    """
+    Predict valuations for many entities in one request
+    
+    Expected input (rows or columns):
+    {"items": [{"sector": "Technology", "geography": "USA", "revenue": 50}, ...]}
+    {"sector": ["Technology", ...], "geography": ["USA", ...], "revenue": [50, ...]}
+    
+    Each result matches the /predict response for the same inputs; a
+    failing item gets {"success": false, "error": ...} in its slot.
+    """
+    try:
+        data = request.json
         
-        # Calculate enterprise values
-        enterprise_value = final_multiple * revenue
-        ev_low = low_multiple * revenue
-        ev_high = high_multiple * revenue
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No JSON data provided'
+            }), 400
         
-        # Get confidence
-        confidence = get_confidence(sector)
+        sectors, geographies, revenues, item_errors = _batch_columns(data)
         
-        # Generate key drivers
-        key_drivers = []
-        key_drivers.append(f"{sector} sector baseline: {base_multiple}x")
+        if len(sectors) > MAX_BATCH_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large: {len(sectors)} items (max {MAX_BATCH_ITEMS})'
+            }), 413
         
-        if geo_adjustment > 1.0:
-            premium_pct = int((geo_adjustment - 1.0) * 100)
-            key_drivers.append(f"{geography} market premium: +{premium_pct}%")
-        elif geo_adjustment < 1.0:
-            discount_pct = int((1.0 - geo_adjustment) * 100)
-            key_drivers.append(f"{geography} market discount: -{discount_pct}%")
+        engine = _requested_engine(data)
+        interval = _requested_interval(data)
+        results = _score_items([(s, g, r, engine, interval) for s, g, r in zip(sectors, geographies, revenues)])
+        for i, error in enumerate(item_errors):
+            if error is not None:
+                results[i] = {'success': False, 'error': error}
+        if SHADOW_ENABLED:
+            SHADOW.submit([(s, g, r, result['engine'], result['predictions']['revenue_multiple'])
+                           for s, g, r, result in zip(sectors, geographies, revenues, results)
+                           if result['success']])
         
-        if size_adjustment != 1.0:
-            if size_adjustment > 1.0:
-                key_drivers.append(f"Small company premium: +{int((size_adjustment-1)*100)}%")
-            else:
-                key_drivers.append(f"Size adjustment: -{int((1-size_adjustment)*100)}%")
+        failed = sum(1 for result in results if not result['success'])
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'failed': failed,
+            'results': results
+        })
         
-        key_drivers.append(f"Final multiple: {round(final_multiple, 2)}x")
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+# /predict/grid matrices: (response field, score_grid key, decimals as in /predict)
+GRID_OUTPUTS = (
+    ('revenue_multiple', 'final_multiple', 2),
+    ('multiple_low', 'low_multiple', 2),
+    ('multiple_high', 'high_multiple', 2),
+    ('enterprise_value_m', 'enterprise_value', 1),
+    ('ev_low', 'ev_low', 1),
+    ('ev_high', 'ev_high', 1)
+)
+
+
+def _json_matrix(distinct_rows, decimals, row_of):
+    """
+    JSON for a matrix given its distinct rows and each row's index into them
+    
+    '%.Nf' rounds exactly like round(value, N), so cells match /predict.
+    """
+    row_format = '[' + ','.join([f'%.{decimals}f'] * distinct_rows.shape[1]) + ']'
+    formatted = [row_format % tuple(row) for row in distinct_rows.tolist()]
+    return '[' + ','.join([formatted[i] for i in row_of.tolist()]) + ']'
+
+
+@app.route('/predict/grid', methods=['POST'])
+def predict_grid():
+    """
+    Sensitivity grid: one sector across geographies x revenues
+    
+    Expected input:
+    {
+        "sector": "Technology",
+        "geography": ["USA", "Europe", "Brazil"],       (or "all")
+        "revenue": [10, 50, 100]                         (or {"start": 1, "stop": 500, "num": 50, "scale": "log"})
+    }
+    
+    Rule-based only. Returns a columnar body: the two axes plus one
+    [geography][revenue] matrix per output (revenue_multiple,
+    multiple_low/high, enterprise_value_m, ev_low/high), each cell
+    matching /predict for the same inputs.
+    """
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'error': 'No JSON data provided'
+            }), 400
+        
+        model, resolver = ml_engine.current()
+        sector = data.get('sector', 'Other')
+        geographies = data.get('geography', 'all')
+        if geographies == 'all':
+            geographies = list(resolver.geography_adjustments)
+        elif isinstance(geographies, str):
+            geographies = [geographies]
+        if not isinstance(geographies, list) or not geographies:
+            raise ValueError('geography must be a non-empty list, a string or "all"')
+        revenues = revenue_sweep(data.get('revenue', [0]))
+        
+        cells = len(geographies) * len(revenues)
+        if cells > MAX_GRID_CELLS:
+            return jsonify({
+                'success': False,
+                'error': f'Grid too large: {cells} cells (max {MAX_GRID_CELLS})'
+            }), 413
         
-        # Build response
-        response = {
+        grid = score_grid(sector, geographies, revenues, resolver)
+        header = json.dumps({
             'success': True,
-            'inputs': {
-                'sector': sector,
-                'geography': geography,
-                'revenue_m': revenue
-            },
-            'predictions': {
-                'revenue_multiple': round(final_multiple, 2),
-                'multiple_range': {
-                    'low': round(low_multiple, 2),
-                    'high': round(high_multiple, 2)
-                },
-                'enterprise_value_m': round(enterprise_value, 1),
-                'ev_range': {
-                    'low': round(ev_low, 1),
-                    'high': round(ev_high, 1)
-                },
-                'confidence': round(confidence, 2)
-            },
-            'key_drivers': key_drivers
-        }
+            'engine': 'rules',
+            'model_version': model.version if model is not None else None,
+            'sector': sector,
+            'base_multiple': grid['base_multiple'],
+            'confidence': round(grid['confidence'], 2),
+            'geographies': geographies,
+            'geography_adjustments': grid['geo_adjustment'].tolist(),
+            'revenues_m': grid['revenue'].tolist(),
+            'size_adjustments': grid['size_adjustment'].tolist(),
+            'shape': [len(geographies), len(revenues)]
+        })
+        
+        # Geographies with the same adjustment have identical rows, so each
+        # distinct row is formatted once
+        _, first_rows, row_of = np.unique(grid['geo_adjustment'], return_index=True, return_inverse=True)
+        matrices = ''.join(
+            f',"{name}":{_json_matrix(grid[key][first_rows], decimals, row_of)}'
+            for name, key, decimals in GRID_OUTPUTS
+        )
+        body = (header[:-1] + matrices + '}\n').encode('utf-8')
+        return _etag_response(body, make_etag(body))
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+def _comparables_for(index, item, k):
+    """Comparable deals for one /comparables query object"""
+    k = int(item.get('k', k))
+    if not 1 <= k <= COMPARABLES_MAX_K:
+        raise ValueError(f'k must be between 1 and {COMPARABLES_MAX_K}')
+    sector = get_sector_family(item.get('sector', 'Other'))
+    geography = get_geography_region(item.get('geography', 'Global'))
+    revenue = item.get('revenue')
+    revenue = parse_revenue(revenue) if revenue not in (None, '') else None
+    funding = funding_midpoint(item.get('funding_need', item.get('funding_need_m')))
+    
+    comparables = []
+    for distance, row in index.query(sector, geography, revenue, funding, k):
+        deal = index.record(row)
+        comparables.append({
+            'page': deal['page'],
+            'company_name': deal['company_name'],
+            'sector': deal['sector'],
+            'geography': deal['geography'],
+            'revenue_m': deal['revenue_m'],
+            'funding_need_m': deal['funding_need_m'],
+            'distance': round(distance, 4),
+            'similarity': round(math.exp(-distance), 4)
+        })
+    return {
+        'success': True,
+        'query': {'sector': sector, 'geography': geography, 'revenue_m': revenue, 'funding_need_m': funding},
+        'comparables': comparables
+    }
+
+
+@app.route('/comparables', methods=['POST'])
+def comparables():
+    """
+    Most similar historical Njord deals by sector, geography, revenue and funding need
+    
+    Expected input:
+    {
+        "sector": "Technology",
+        "geography": "North America",
+        "revenue": 50,               (optional)
+        "funding_need": "10-20",     (optional: number or range)
+        "k": 5                       (optional)
+    }
+    
+    Batch mode: {"items": [{...}, ...], "k": 5}, one result per item.
+    Sector and geography are resolved like /predict onto the extractor's
+    labels; a mismatch costs distance rather than excluding the deal.
+    """
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'error': 'No JSON data provided'
+            }), 400
+        
+        index = COMPARABLES.refresh()
+        if index is None:
+            return jsonify({
+                'success': False,
+                'error': f'Comparable deals not available: {COMPARABLES.error}'
+            }), 503
         
-        return jsonify(response)
+        k = request.args.get('k') or data.get('k', COMPARABLES_DEFAULT_K)
+        
+        if 'items' not in data:
+            return jsonify({**_comparables_for(index, data, k), 'index_version': index.version})
+        
+        items = data['items']
+        if not isinstance(items, list):
+            raise ValueError('Expected a list of items')
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large: {len(items)} items (max {MAX_BATCH_ITEMS})'
+            }), 413
+        
+        results = []
+        for item in items:
+            if not item:
+                results.append({'success': False, 'error': 'No JSON data provided'})
+                continue
+            if not isinstance(item, dict):
+                results.append({'success': False, 'error': 'Each item must be a JSON object'})
+                continue
+            try:
+                results.append(_comparables_for(index, item, k))
+            except (ValueError, TypeError) as e:
+                results.append({'success': False, 'error': str(e)})
+        
+        failed = sum(1 for result in results if not result['success'])
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'failed': failed,
+            'index_version': index.version,
+            'results': results
+        })
         
     except Exception as e:
         return jsonify({
@@ -295,6 +832,91 @@ def predict():
         }), 400
 
 
+def _stream_records(lines, default_engine, default_interval):
+    """Parse a chunk of NDJSON lines into scored or error records, in order"""
+    records, items, slots = [], [], []
+    for line_no, line in lines:
+        try:
+            data = json.loads(line)
+            if not data:
+                raise ValueError('No JSON data provided')
+            if not isinstance(data, dict):
+                raise ValueError('Each line must be a JSON object')
+            engine = data.get('engine') or default_engine
+            if engine not in ENGINES:
+                raise ValueError(f"Unknown engine '{engine}' (expected one of {', '.join(ENGINES)})")
+            interval = data.get('interval') or default_interval
+            if interval not in INTERVALS:
+                raise ValueError(f"Unknown interval '{interval}' (expected one of {', '.join(INTERVALS)})")
+        except ValueError as e:
+            records.append({'line': line_no, 'success': False, 'error': str(e)})
+            continue
+        slots.append((len(records), line_no))
+        records.append(None)
+        items.append((data.get('sector', 'Other'), data.get('geography', 'Global'),
+                      data.get('revenue', 0), engine, interval))
+    
+    for (slot, line_no), result in zip(slots, _score_items(items)):
+        records[slot] = {'line': line_no, **result}
+    return records
+
+
+def _ndjson(records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    """
+    Score an NDJSON request body and stream NDJSON results back
+    
+    Each non-blank input line is a /predict object; each output line is
+    the /predict result plus its input "line" number. Input is read and
+    scored STREAM_CHUNK_SIZE lines at a time, so memory stays flat and
+    results start flowing before the upload finishes. Malformed lines
+    produce {"line": n, "success": false, "error": ...} records.
+    """
+    try:
+        default_engine = request.args.get('engine') or VALUATION_ENGINE
+        if default_engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{default_engine}' (expected one of {', '.join(ENGINES)})")
+        default_interval = request.args.get('interval') or VALUATION_INTERVAL
+        if default_interval not in INTERVALS:
+            raise ValueError(f"Unknown interval '{default_interval}' (expected one of {', '.join(INTERVALS)})")
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    stream = request.stream
+    
+    def generate():
+        chunk = []
+        for line_no, raw in enumerate(stream, start=1):
+            line = raw.strip()
+            if not line:
+                continue
+            chunk.append((line_no, line))
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield _ndjson(_stream_records(chunk, default_engine, default_interval))
+                chunk = []
+        if chunk:
+            yield _ndjson(_stream_records(chunk, default_engine, default_interval))
+    
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# Opt-in request profiling: send X-Profile: <PROFILE_SECRET>, or profile one in
+# every PROFILE_SAMPLE_EVERY requests. Unset, the app is left unwrapped.
+PROFILER = RequestProfiler(
+    os.environ.get('PROFILE_DIR', os.path.join(_ROOT, 'profiles')),
+    secret=os.environ.get('PROFILE_SECRET'),
+    sample_every=int(os.environ.get('PROFILE_SAMPLE_EVERY', 0)),
+    interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', 1)),
+    keep=int(os.environ.get('PROFILE_KEEP', 100))
+)
+if PROFILER.enabled:
+    app.wsgi_app = PROFILER.wrap(app.wsgi_app)
+
+
 # Production entry point
 if __name__ == '__main__':
     # Get port from environment variable (Railway/Render set this)
@@ -308,10 +930,30 @@ if __name__ == '__main__':
     print("="*50)
     print(f"\nEnvironment: {'Production' if is_production else 'Development'}")
     print(f"Port: {port}")
+    print(f"Default engine: {VALUATION_ENGINE}, interval: {VALUATION_INTERVAL}")
+    if ml_engine.BOOT_STATS['loaded']:
+        print(f"ML model {ml_engine.BOOT_STATS['version']} ({ml_engine.BOOT_STATS['source']}) loaded in "
+              f"{ml_engine.BOOT_STATS['load_seconds']}s "
+              f"(first prediction {ml_engine.BOOT_STATS['first_prediction_ms']}ms)")
+    else:
+        print(f"ML model not loaded: {ml_engine.BOOT_STATS.get('error')}")
+    if PROFILER.enabled:
+        print(f"Request profiling on, writing to {PROFILER.directory}")
     print("\nAPI Endpoints:")
     print("  GET  /health")
     print("  GET  /test")
+    print("  GET  /stats/resolver")
+    print("  GET  /stats/batching")
+    print("  GET  /stats/cache")
+    print("  GET  /stats/comparables")
+    print("  GET  /stats/shadow")
+    print("  GET  /stats/admission")
+    print("  GET  /metrics")
     print("  POST /predict")
+    print("  POST /predict/batch")
+    print("  POST /predict/stream")
+    print("  POST /predict/grid")
+    print("  POST /comparables")
     print("="*50)
     
     # Run the app
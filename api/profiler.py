@@ -0,0 +1,169 @@
+"""
+On-demand sampling profiler for single requests
+Samples the stack of the thread serving a request every few milliseconds and
+writes the samples as collapsed stacks ("frame;frame;frame count" lines),
+which flamegraph.pl and speedscope open directly. A request is profiled when
+it carries the X-Profile header with the shared secret, or as one in every N
+requests. The API only wraps its WSGI app when one of those is configured, so
+with profiling off requests run no profiler code at all.
+"""
+
+import hmac
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_SUFFIX = '.collapsed'
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+
+class _Sampler(threading.Thread):
+    """Counts the stacks of one thread until stop()"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+        self._labels = {}
+
+    def run(self):
+        labels = self._labels
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+class RequestProfiler:
+    """
+    WSGI middleware that profiles selected requests into `directory`
+
+    The newest `keep` profiles are kept; older ones are deleted after each
+    write. The response of a profiled request names its file in an
+    X-Profile-File header. While any request is being profiled the
+    interpreter's thread switch interval is lowered to `interval_ms`, so
+    the sampler isn't starved by a CPU-bound request.
+    """
+
+    def __init__(self, directory, secret=None, sample_every=0, interval_ms=1.0, keep=100):
+        self.directory = directory
+        self.secret = secret.encode('utf-8') if secret else None
+        self.sample_every = sample_every
+        self.interval = interval_ms / 1000
+        self.keep = keep
+        self.profiled = 0
+        self._counter = itertools.count(1)
+        self._sequence = itertools.count(1)
+        self._active = 0
+        self._switch_interval = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.secret or self.sample_every > 0)
+
+    def wrap(self, wsgi_app):
+        """wsgi_app wrapped to profile selected requests"""
+        def profiled_app(environ, start_response):
+            if not self._selected(environ):
+                return wsgi_app(environ, start_response)
+            return self._profile(wsgi_app, environ, start_response)
+        return profiled_app
+
+    def _selected(self, environ):
+        token = environ.get(PROFILE_HEADER)
+        if token and self.secret and hmac.compare_digest(token.encode('utf-8'), self.secret):
+            return True
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+
+    def _start(self):
+        with self._lock:
+            if self._active == 0:
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.interval, self._switch_interval))
+            self._active += 1
+        sampler = _Sampler(threading.get_ident(), self.interval)
+        sampler.start()
+        return sampler
+
+    def _finish(self, sampler):
+        stacks = sampler.stop()
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                sys.setswitchinterval(self._switch_interval)
+        return stacks
+
+    def _profile(self, wsgi_app, environ, start_response):
+        started = time.time()
+        name = self._file_name(environ, started)
+
+        def start_profiled(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Profile-File', name)], exc_info)
+
+        sampler = self._start()
+        try:
+            body = wsgi_app(environ, start_profiled)
+        except BaseException:
+            self._finish(sampler)
+            raise
+
+        # Streamed bodies are produced while the server iterates, so keep
+        # sampling until the iterable is exhausted or closed
+        def iterate():
+            try:
+                yield from body
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+                self._write(name, self._finish(sampler))
+        return iterate()
+
+    def _file_name(self, environ, started):
+        path = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))
+        return (f"{stamp}.{int(started * 1000) % 1000:03d}-{os.getpid()}-{next(self._sequence)}-{path}"
+                f"{PROFILE_SUFFIX}")
+
+    def _write(self, name, stacks):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.profiled += 1
+            self._rotate()
+        except OSError as e:
+            print(f"⚠️  Could not write profile {name}: {e}", file=sys.stderr)
+
+    def _rotate(self):
+        profiles = sorted(entry.name for entry in os.scandir(self.directory)
+                          if entry.name.endswith(PROFILE_SUFFIX))
+        for old in profiles[:-self.keep] if self.keep > 0 else []:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass  # another worker rotated it first
@@ -0,0 +1,252 @@
+"""
+Precompiled sector/geography resolver
+Builds one normalized index over the rule tables and resolves free-text
+sector and geography strings in a single pass over the input
+"""
+
+import hashlib
+import json
+import threading
+from collections import Counter, deque, namedtuple
+from functools import lru_cache
+
+SectorMatch = namedtuple('SectorMatch', 'base_multiple confidence sector_key match')
+GeographyMatch = namedtuple('GeographyMatch', 'adjustment geography_key match')
+
+# Match kinds, strongest first
+MATCH_KINDS = ('exact', 'normalized', 'alias', 'token', 'substring', 'default')
+_KIND_RANK = {kind: rank for rank, kind in enumerate(reversed(MATCH_KINDS))}
+
+
+def normalize(text):
+    """Lowercase and collapse whitespace"""
+    return ' '.join(text.lower().split())
+
+
+class _KeywordAutomaton:
+    """Aho-Corasick automaton over normalized keys, reporting (end, pattern) hits"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(pattern)
+
+        # Breadth-first fail links; outputs inherit along the fail chain
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def scan(self, text):
+        """Yield (start, pattern) for every pattern occurrence in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in output[state]:
+                yield end - len(pattern) + 1, pattern
+
+
+class _TableIndex:
+    """Normalized view of one rule table"""
+
+    def __init__(self, table, aliases):
+        self.table = table
+        self.order = {key: i for i, key in enumerate(table)}
+        self.normalized = {}
+        for key in table:
+            self.normalized.setdefault(normalize(key), key)
+        self.aliases = {normalize(alias): key for alias, key in aliases.items() if key in table}
+
+        # Every substring of every key, for inputs shorter than a key
+        self.containing = {}
+        for norm, key in self.normalized.items():
+            for i in range(len(norm)):
+                for j in range(i + 1, len(norm) + 1):
+                    self.containing.setdefault(norm[i:j], []).append(key)
+
+    def best(self, normalized_input, hits):
+        """Pick the strongest (kind, length, table order) candidate, or None"""
+        candidate = self.normalized.get(normalized_input)
+        if candidate is not None:
+            return candidate, 'normalized'
+        candidate = self.aliases.get(normalized_input)
+        if candidate is not None:
+            return candidate, 'alias'
+
+        best_rank, best_key, best_kind = None, None, None
+        for pattern, is_token in hits:
+            key = self.normalized.get(pattern)
+            kind = 'token' if is_token else 'substring'
+            if key is None:
+                # Aliases only count as whole tokens
+                key = self.aliases.get(pattern)
+                if key is None or not is_token:
+                    continue
+            rank = (_KIND_RANK[kind], len(pattern), -self.order[key])
+            if best_rank is None or rank > best_rank:
+                best_rank, best_key, best_kind = rank, key, kind
+
+        for key in self.containing.get(normalized_input, ()):
+            rank = (_KIND_RANK['substring'], len(normalized_input), -self.order[key])
+            if best_rank is None or rank > best_rank:
+                best_rank, best_key, best_kind = rank, key, 'substring'
+
+        if best_key is None:
+            return None, 'default'
+        return best_key, best_kind
+
+
+class RuleResolver:
+    """
+    Resolve sectors and geographies against the rule tables
+
+    Precedence: exact key, normalized key, alias, longest whole-token
+    match, longest substring match; ties go to the earlier table entry.
+    Free-text inputs are memoized in a bounded LRU cache.
+    """
+
+    def __init__(self, sector_multiples, sector_confidence, geography_adjustments,
+                 sector_aliases=None, geography_aliases=None, cache_size=4096,
+                 default_multiple=1.5, default_confidence=0.70, default_adjustment=1.0):
+        self.sector_multiples = sector_multiples
+        self.sector_confidence = sector_confidence
+        self.geography_adjustments = geography_adjustments
+        self.default_multiple = default_multiple
+        self.default_confidence = default_confidence
+        self.default_adjustment = default_adjustment
+        # Identifies the tables this index was built from
+        self.version = hashlib.sha1(json.dumps(
+            [sector_multiples, sector_confidence, geography_adjustments, sector_aliases,
+             geography_aliases, default_multiple, default_confidence, default_adjustment],
+            sort_keys=True
+        ).encode()).hexdigest()[:12]
+
+        self._multiples = _TableIndex(sector_multiples, sector_aliases or {})
+        self._confidence = _TableIndex(sector_confidence, sector_aliases or {})
+        self._geography = _TableIndex(geography_adjustments, geography_aliases or {})
+        self._sector_automaton = _KeywordAutomaton(
+            set(self._multiples.normalized) | set(self._multiples.aliases)
+            | set(self._confidence.normalized) | set(self._confidence.aliases)
+        )
+        self._geography_automaton = _KeywordAutomaton(
+            set(self._geography.normalized) | set(self._geography.aliases)
+        )
+
+        self._resolve_sector_text = lru_cache(maxsize=cache_size)(self._match_sector)
+        self._resolve_geography_text = lru_cache(maxsize=cache_size)(self._match_geography)
+        self._counts = {'sector': Counter(), 'geography': Counter()}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hits(automaton, text):
+        """All key occurrences in text, flagged when they sit on token boundaries"""
+        hits = []
+        for start, pattern in automaton.scan(text):
+            end = start + len(pattern)
+            is_token = ((start == 0 or not text[start - 1].isalnum())
+                        and (end == len(text) or not text[end].isalnum()))
+            hits.append((pattern, is_token))
+        return hits
+
+    def _match_sector(self, sector):
+        normalized = normalize(sector)
+        if not normalized:
+            return SectorMatch(self.default_multiple, self.default_confidence, None, 'default')
+        hits = self._hits(self._sector_automaton, normalized)
+        key, kind = self._multiples.best(normalized, hits)
+        confidence_key, _ = self._confidence.best(normalized, hits)
+        return SectorMatch(
+            self.sector_multiples[key] if key else self.default_multiple,
+            self.sector_confidence[confidence_key] if confidence_key else self.default_confidence,
+            key,
+            kind
+        )
+
+    def _match_geography(self, geography):
+        normalized = normalize(geography)
+        if not normalized:
+            return GeographyMatch(self.default_adjustment, None, 'default')
+        key, kind = self._geography.best(normalized, self._hits(self._geography_automaton, normalized))
+        return GeographyMatch(
+            self.geography_adjustments[key] if key else self.default_adjustment,
+            key,
+            kind
+        )
+
+    def resolve_sector(self, sector, record=True):
+        """Resolve base multiple and confidence for a sector in one pass"""
+        if not sector:
+            result = SectorMatch(self.default_multiple, self.default_confidence, None, 'default')
+        elif sector in self.sector_multiples:
+            confidence = self.sector_confidence.get(sector)
+            if confidence is None:
+                confidence = self._resolve_sector_text(sector).confidence
+            result = SectorMatch(self.sector_multiples[sector], confidence, sector, 'exact')
+        else:
+            result = self._resolve_sector_text(sector)
+        if record:
+            with self._lock:
+                self._counts['sector'][result.match] += 1
+        return result
+
+    def resolve_geography(self, geography, record=True):
+        """Resolve the geography adjustment"""
+        if not geography:
+            result = GeographyMatch(self.default_adjustment, None, 'default')
+        elif geography in self.geography_adjustments:
+            result = GeographyMatch(self.geography_adjustments[geography], geography, 'exact')
+        else:
+            result = self._resolve_geography_text(geography)
+        if record:
+            with self._lock:
+                self._counts['geography'][result.match] += 1
+        return result
+
+    def record(self, field, kinds):
+        """Count match kinds for a field ('sector' or 'geography')"""
+        with self._lock:
+            self._counts[field].update(kinds)
+
+    def stats(self):
+        """Match-kind counters and cache statistics"""
+        with self._lock:
+            counts = {field: dict(counter) for field, counter in self._counts.items()}
+        stats = {}
+        for field, cache in (('sector', self._resolve_sector_text),
+                             ('geography', self._resolve_geography_text)):
+            total = sum(counts[field].values())
+            info = cache.cache_info()
+            stats[field] = {
+                'lookups': total,
+                'matches': {kind: counts[field].get(kind, 0) for kind in MATCH_KINDS},
+                'default_rate': round(counts[field].get('default', 0) / total, 4) if total else 0.0,
+                'cache': {
+                    'hits': info.hits,
+                    'misses': info.misses,
+                    'size': info.currsize,
+                    'maxsize': info.maxsize
+                }
+            }
+        return stats
@@ -0,0 +1,114 @@
+"""
+In-process LRU + TTL cache for serialized /predict responses
+Entries are keyed on the raw sector and geography strings rather than their
+canonical forms, because the cached body's key_drivers echo back what the
+caller sent. Revenue can be snapped to a quantum. Entries are tagged with the
+version of the rule tables and model, so a table or model change empties the
+cache.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_etag(body):
+    """Strong ETag for a response body"""
+    return hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """Bounded LRU of (body, etag) with per-entry expiry"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=300.0, revenue_quantum=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.revenue_quantum = revenue_quantum
+        self.enabled = max_entries > 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def quantize(self, revenue):
+        """Snap revenue to the configured quantum (no-op when the quantum is 0)"""
+        if not self.revenue_quantum or not revenue:
+            return revenue
+        return round(revenue / self.revenue_quantum) * self.revenue_quantum
+
+    @staticmethod
+    def make_key(sector, geography, revenue, engine, interval='fixed'):
+        """
+        Cache key for one prediction, or None if the inputs can't be keyed
+
+        key_drivers echo the caller's strings, so sector and geography are
+        keyed verbatim (with their types, so 1 and True stay distinct).
+        """
+        key = (type(sector), sector, type(geography), geography, revenue, engine, interval)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """Return (body, etag) or None"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            body, etag, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body, etag
+
+    def put(self, key, version, body, etag):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (body, etag, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'version': self._version,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'revenue_quantum': self.revenue_quantum,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,199 @@
+"""
+Shadow scoring: compare the rule-based and ML engines on live traffic
+Requests are answered by their primary engine as usual; the inputs (and the
+multiple that was served) are queued to background threads that score the
+other engine and accumulate per-sector disagreement statistics. The queue is
+bounded in rows and drops work instead of blocking when it is full.
+"""
+
+import os
+import queue
+import threading
+
+from api.microbatch import Histogram
+from api.valuation import get_sector_family
+
+# Upper bounds of the |ml - rules| / rules histogram
+RELATIVE_DIFF_BUCKETS = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+ENGINES = ('rules', 'ml')
+
+
+class _SectorStats:
+    """Running disagreement totals for one sector family"""
+
+    def __init__(self):
+        self.compared = 0
+        self.ml_fallbacks = 0
+        self.disagreements = 0
+        self.sum_diff = 0.0
+        self.sum_abs_diff = 0.0
+        self.sum_sq_diff = 0.0
+        self.max_abs_diff = 0.0
+        self.relative_diff = Histogram(RELATIVE_DIFF_BUCKETS)
+
+    def add(self, ml, rules, threshold):
+        diff = ml - rules
+        relative = abs(diff) / rules if rules else float('inf') if diff else 0.0
+        self.compared += 1
+        self.sum_diff += diff
+        self.sum_abs_diff += abs(diff)
+        self.sum_sq_diff += diff * diff
+        self.max_abs_diff = max(self.max_abs_diff, abs(diff))
+        self.disagreements += relative > threshold
+        self.relative_diff.observe(relative)
+
+    def summary(self):
+        n = self.compared
+        return {
+            'compared': n,
+            'ml_fallbacks': self.ml_fallbacks,
+            'mean_diff': round(self.sum_diff / n, 4) if n else None,
+            'mean_abs_diff': round(self.sum_abs_diff / n, 4) if n else None,
+            'rmse': round((self.sum_sq_diff / n) ** 0.5, 4) if n else None,
+            'max_abs_diff': round(self.max_abs_diff, 4),
+            'disagreement_rate': round(self.disagreements / n, 4) if n else None,
+            'relative_diff': self.relative_diff.snapshot()
+        }
+
+
+class ShadowScorer:
+    """
+    Background comparison of the two engines
+
+    score_items(items) scores (sector, geography, revenue, engine, interval)
+    tuples like predict_api._score_items. Worker threads start lazily in
+    each process, so a scorer created before gunicorn forks works in every
+    worker. Memory is bounded: at most max_rows queued rows, and at most
+    max_sectors sector families (the rest are counted under 'Other').
+    """
+
+    def __init__(self, score_items, workers=1, max_rows=1024, batch_rows=256, threshold=0.1, max_sectors=64):
+        self.score_items = score_items
+        self.workers = workers
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.threshold = threshold
+        self.max_sectors = max_sectors
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.errors = 0
+        self.last_error = None
+        self._pending = 0
+        self._sectors = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _ensure_workers(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Rows queued in the parent before a fork are gone in the child
+            self._pending = 0
+            self._queue = queue.Queue()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, args=(self._queue,), name=f'shadow-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, rows):
+        """
+        Queue (sector, geography, revenue, served_engine, served_multiple)
+        rows for comparison; served_* may be None when unknown (e.g. a
+        cached response). Never blocks: rows beyond max_rows waiting are
+        counted as dropped. Returns the number of rows queued.
+        """
+        self._ensure_workers()
+        with self._lock:
+            accepted = max(0, min(len(rows), self.max_rows - self._pending))
+            self.dropped += len(rows) - accepted
+            self._pending += accepted
+            self.submitted += accepted
+        if accepted:
+            self._queue.put(rows[:accepted])
+        return accepted
+
+    def _run(self, pending):
+        while True:
+            batch = pending.get()
+            while len(batch) < self.batch_rows:
+                try:
+                    batch = batch + pending.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self._compare(batch)
+            except Exception as e:
+                with self._lock:
+                    self.errors += len(batch)
+                    self.last_error = str(e)
+            finally:
+                with self._lock:
+                    self._pending -= len(batch)
+
+    def _compare(self, rows):
+        # Score whichever engine's multiple isn't known yet for each row
+        multiples = [{engine: multiple} if engine in ENGINES and multiple is not None else {}
+                     for _, _, _, engine, multiple in rows]
+        items, slots = [], []
+        for i, (sector, geography, revenue, _, _) in enumerate(rows):
+            for engine in ENGINES:
+                if engine not in multiples[i]:
+                    items.append((sector, geography, revenue, engine, 'fixed'))
+                    slots.append(i)
+        fallbacks = set()
+        for (_, _, _, engine, _), i, result in zip(items, slots, self.score_items(items)):
+            if not result['success']:
+                continue
+            multiples[i][result['engine']] = result['predictions']['revenue_multiple']
+            if engine == 'ml' and result['engine'] != 'ml':
+                fallbacks.add(i)
+
+        families = {}
+        with self._lock:
+            for i, (sector, *_) in enumerate(rows):
+                try:
+                    family = families[sector]
+                except KeyError:
+                    family = families[sector] = get_sector_family(sector)
+                except TypeError:
+                    family = 'Other'
+                stats = self._sectors.get(family)
+                if stats is None:
+                    if len(self._sectors) >= self.max_sectors:
+                        family = 'Other'
+                    stats = self._sectors.setdefault(family, _SectorStats())
+                if i in fallbacks:
+                    stats.ml_fallbacks += 1
+                elif 'ml' in multiples[i] and 'rules' in multiples[i]:
+                    stats.add(multiples[i]['ml'], multiples[i]['rules'], self.threshold)
+            self.scored += len(rows)
+
+    def stats(self):
+        """Queue counters plus overall and per-sector-family disagreement (ml minus rules)"""
+        with self._lock:
+            sectors = {family: stats.summary() for family, stats in sorted(self._sectors.items())}
+            counters = {
+                'workers': self.workers,
+                'queued_rows': self._pending if self._pid == os.getpid() else 0,
+                'max_rows': self.max_rows,
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'drop_rate': round(self.dropped / (self.submitted + self.dropped), 4)
+                if self.submitted + self.dropped else 0.0,
+                'scored': self.scored,
+                'errors': self.errors,
+                'last_error': self.last_error
+            }
+        compared = sum(s['compared'] for s in sectors.values())
+        disagreements = sum(s['compared'] * (s['disagreement_rate'] or 0) for s in sectors.values())
+        return {
+            **counters,
+            'disagreement_threshold': self.threshold,
+            'compared': compared,
+            'ml_fallbacks': sum(s['ml_fallbacks'] for s in sectors.values()),
+            'disagreement_rate': round(disagreements / compared, 4) if compared else None,
+            'sectors': sectors
+        }
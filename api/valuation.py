@@ -0,0 +1,512 @@
+"""
+Rule-based valuation logic from Njord deal patterns
+Shared by the Flask API and the batch scoring paths
+"""
+
+import os
+
+import numpy as np
+
+from api.resolver import RuleResolver
+
+# Sector base multiples (from Njord deal patterns)
+SECTOR_MULTIPLES = {
+    'Technology': 4.5,
+    'Software': 4.5,
+    'SaaS': 4.5,
+    'AI': 4.5,
+    'Gaming': 5.0,
+    'Gaming/Entertainment': 5.0,
+    'ESports': 5.0,
+    'Cannabis': 3.0,
+    'Cannabis/Healthcare': 3.0,
+    'Healthcare': 3.0,
+    'Mining': 1.2,
+    'Mining/Resources': 1.2,
+    'Gold': 1.2,
+    'Energy': 1.5,
+    'Oil': 1.5,
+    'Gas': 1.5,
+    'Construction': 0.7,
+    'Construction/Real Estate': 0.7,
+    'Real Estate': 0.7,
+    'Trading': 0.3,
+    'Trading/Commodities': 0.3,
+    'Commodities': 0.3,
+    'Manufacturing': 1.0
+}
+
+# Geography adjustments
+GEOGRAPHY_ADJUSTMENTS = {
+    'United States': 1.2,
+    'USA': 1.2,
+    'US': 1.2,
+    'North America': 1.2,
+    'Canada': 1.2,
+    'Sweden': 1.1,
+    'Norway': 1.1,
+    'Denmark': 1.1,
+    'Europe': 1.0,
+    'UK': 1.0,
+    'Germany': 1.0,
+    'France': 1.0,
+    'Global': 1.0,
+    'Peru': 0.7,
+    'Brazil': 0.7,
+    'South America': 0.7,
+    'Ghana': 0.7,
+    'Africa': 0.7
+}
+
+# Sector confidence levels
+SECTOR_CONFIDENCE = {
+    'Technology': 0.85,
+    'Software': 0.85,
+    'SaaS': 0.85,
+    'Gaming': 0.80,
+    'Gaming/Entertainment': 0.80,
+    'Cannabis': 0.75,
+    'Healthcare': 0.75,
+    'Mining': 0.70,
+    'Mining/Resources': 0.70,
+    'Energy': 0.75,
+    'Construction': 0.65,
+    'Construction/Real Estate': 0.65,
+    'Real Estate': 0.65,
+    'Trading': 0.60,
+    'Trading/Commodities': 0.60,
+    'Manufacturing': 0.70
+}
+
+
+# Rule-table keys grouped into the sector labels the extractor and model use
+SECTOR_FAMILIES = {
+    'Technology': 'Technology',
+    'Software': 'Technology',
+    'SaaS': 'Technology',
+    'AI': 'Technology',
+    'Gaming': 'Gaming/Entertainment',
+    'Gaming/Entertainment': 'Gaming/Entertainment',
+    'ESports': 'Gaming/Entertainment',
+    'Cannabis': 'Cannabis/Healthcare',
+    'Cannabis/Healthcare': 'Cannabis/Healthcare',
+    'Healthcare': 'Cannabis/Healthcare',
+    'Mining': 'Mining/Resources',
+    'Mining/Resources': 'Mining/Resources',
+    'Gold': 'Mining/Resources',
+    'Energy': 'Energy',
+    'Oil': 'Energy',
+    'Gas': 'Energy',
+    'Construction': 'Construction/Real Estate',
+    'Construction/Real Estate': 'Construction/Real Estate',
+    'Real Estate': 'Construction/Real Estate',
+    'Trading': 'Trading/Commodities',
+    'Trading/Commodities': 'Trading/Commodities',
+    'Commodities': 'Trading/Commodities',
+    'Manufacturing': 'Manufacturing'
+}
+
+# Geography keys grouped into the extractor's regions
+GEOGRAPHY_REGIONS = {
+    'United States': 'North America',
+    'USA': 'North America',
+    'US': 'North America',
+    'North America': 'North America',
+    'Canada': 'North America',
+    'Sweden': 'Europe',
+    'Norway': 'Europe',
+    'Denmark': 'Europe',
+    'Europe': 'Europe',
+    'UK': 'Europe',
+    'Germany': 'Europe',
+    'France': 'Europe',
+    'Global': 'Global',
+    'Peru': 'South America',
+    'Brazil': 'South America',
+    'South America': 'South America',
+    'Ghana': 'Africa',
+    'Africa': 'Africa'
+}
+
+# Common spellings that should resolve to a table key
+SECTOR_ALIASES = {
+    'Tech': 'Technology',
+    'Artificial Intelligence': 'AI',
+    'Machine Learning': 'AI',
+    'E-Sports': 'ESports',
+    'Video Games': 'Gaming',
+    'Oil and Gas': 'Oil',
+    'Oil & Gas': 'Oil',
+    'Real-Estate': 'Real Estate',
+    'Property': 'Real Estate',
+    'Metals': 'Mining',
+    'Pharma': 'Healthcare',
+    'Medical': 'Healthcare',
+    'CBD': 'Cannabis',
+}
+
+GEOGRAPHY_ALIASES = {
+    'U.S.': 'US',
+    'U.S.A.': 'USA',
+    'United States of America': 'United States',
+    'America': 'United States',
+    'United Kingdom': 'UK',
+    'Great Britain': 'UK',
+    'England': 'UK',
+    'LatAm': 'South America',
+    'Latin America': 'South America',
+    'EU': 'Europe',
+}
+
+# The tables a resolver is built from; model bundles ship a copy
+RULE_TABLES = {
+    'SECTOR_MULTIPLES': SECTOR_MULTIPLES,
+    'SECTOR_CONFIDENCE': SECTOR_CONFIDENCE,
+    'GEOGRAPHY_ADJUSTMENTS': GEOGRAPHY_ADJUSTMENTS,
+    'SECTOR_ALIASES': SECTOR_ALIASES,
+    'GEOGRAPHY_ALIASES': GEOGRAPHY_ALIASES
+}
+
+
+def make_resolver(tables):
+    """RuleResolver over a RULE_TABLES-shaped dict"""
+    return RuleResolver(
+        tables['SECTOR_MULTIPLES'],
+        tables['SECTOR_CONFIDENCE'],
+        tables['GEOGRAPHY_ADJUSTMENTS'],
+        sector_aliases=tables.get('SECTOR_ALIASES'),
+        geography_aliases=tables.get('GEOGRAPHY_ALIASES'),
+        cache_size=int(os.environ.get('RESOLVER_CACHE_SIZE', 4096))
+    )
+
+
+# One index over all three tables, built at import time
+RESOLVER = make_resolver(RULE_TABLES)
+
+
+def get_base_multiple(sector):
+    """Get base multiple for a sector"""
+    return RESOLVER.resolve_sector(sector).base_multiple
+
+
+def get_geography_adjustment(geography):
+    """Get geography adjustment multiplier"""
+    return RESOLVER.resolve_geography(geography).adjustment
+
+
+def get_confidence(sector):
+    """Get confidence score for a sector"""
+    return RESOLVER.resolve_sector(sector).confidence
+
+
+def get_sector_family(sector, resolver=None):
+    """Map a free-text sector onto the extractor's sector labels"""
+    key = (resolver or RESOLVER).resolve_sector(sector, record=False).sector_key
+    return SECTOR_FAMILIES.get(key, 'Other')
+
+
+def get_geography_region(geography, resolver=None):
+    """Map a free-text geography onto the extractor's regions"""
+    key = (resolver or RESOLVER).resolve_geography(geography, record=False).geography_key
+    return GEOGRAPHY_REGIONS.get(key, 'Global')
+
+
+def get_size_adjustment(revenue):
+    """Adjust multiple based on company size"""
+    if not revenue or revenue <= 0:
+        return 1.0
+    
+    if revenue < 10:
+        return 1.2  # Small company premium
+    elif revenue < 50:
+        return 1.0  # Mid-market baseline
+    elif revenue < 250:
+        return 0.9  # Large company discount
+    else:
+        return 0.7  # Very large discount
+
+
+def get_size_adjustments(revenues):
+    """Vectorized get_size_adjustment over an array of revenues"""
+    revenues = np.asarray(revenues, dtype=float)
+    return np.select(
+        [revenues <= 0, revenues < 10, revenues < 50, revenues < 250],
+        [1.0, 1.2, 1.0, 0.9],
+        default=0.7
+    )
+
+
+def parse_revenue(revenue_raw):
+    """Handle revenue - could be string or number"""
+    try:
+        return float(revenue_raw) if revenue_raw else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def build_key_drivers(sector, geography, base_multiple, geo_adjustment, size_adjustment, final_multiple):
+    """Human-readable explanation of how the multiple was built"""
+    key_drivers = []
+    key_drivers.append(f"{sector} sector baseline: {base_multiple}x")
+    
+    if geo_adjustment > 1.0:
+        premium_pct = int((geo_adjustment - 1.0) * 100)
+        key_drivers.append(f"{geography} market premium: +{premium_pct}%")
+    elif geo_adjustment < 1.0:
+        discount_pct = int((1.0 - geo_adjustment) * 100)
+        key_drivers.append(f"{geography} market discount: -{discount_pct}%")
+    
+    if size_adjustment != 1.0:
+        if size_adjustment > 1.0:
+            key_drivers.append(f"Small company premium: +{int((size_adjustment-1)*100)}%")
+        else:
+            key_drivers.append(f"Size adjustment: -{int((1-size_adjustment)*100)}%")
+    
+    key_drivers.append(f"Final multiple: {round(final_multiple, 2)}x")
+    return key_drivers
+
+
+def build_prediction(sector, geography, revenue, final_multiple, low_multiple, high_multiple,
+                     enterprise_value, ev_low, ev_high, confidence, key_drivers, engine='rules',
+                     interval=None):
+    """Build the /predict response body"""
+    response = {
+        'success': True,
+        'engine': engine,
+        'inputs': {
+            'sector': sector,
+            'geography': geography,
+            'revenue_m': revenue
+        },
+        'predictions': {
+            'revenue_multiple': round(final_multiple, 2),
+            'multiple_range': {
+                'low': round(low_multiple, 2),
+                'high': round(high_multiple, 2)
+            },
+            'enterprise_value_m': round(enterprise_value, 1),
+            'ev_range': {
+                'low': round(ev_low, 1),
+                'high': round(ev_high, 1)
+            },
+            'confidence': round(confidence, 2)
+        },
+        'key_drivers': key_drivers
+    }
+    if interval is not None:
+        response['predictions']['interval'] = interval
+    return response
+
+
+def _resolve_unique(values, resolve, errors):
+    """Resolve once per distinct value, recording per-row errors"""
+    out = [None] * len(values)
+    seen = {}
+    for i, value in enumerate(values):
+        if errors[i] is not None:
+            continue
+        # Key on type too so 1, 1.0 and True keep their own error messages
+        key = (type(value), value)
+        try:
+            result = seen[key]
+        except KeyError:
+            try:
+                result = resolve(value, record=False)
+            except Exception as e:
+                result = e
+            seen[key] = result
+        except TypeError:
+            # Unhashable input (list, dict) - let the resolver raise its own error
+            try:
+                result = resolve(value, record=False)
+            except Exception as e:
+                result = e
+        if isinstance(result, Exception):
+            errors[i] = str(result)
+        else:
+            out[i] = result
+    return out
+
+
+def score_batch(sectors, geographies, revenues, resolver=None):
+    """
+    Score parallel sequences of sector/geography/revenue in one pass
+    
+    Lookups run once per distinct sector and geography; the multiple,
+    ranges and enterprise values are computed as array operations.
+    Returns a dict of arrays plus 'errors', a list holding None or an
+    error message for each row.
+    """
+    resolver = resolver or RESOLVER
+    n = len(sectors)
+    errors = [None] * n
+    revenue = np.array([parse_revenue(r) for r in revenues], dtype=float)
+    
+    sector_matches = _resolve_unique(sectors, resolver.resolve_sector, errors)
+    geo_matches = _resolve_unique(geographies, resolver.resolve_geography, errors)
+    
+    base_multiple = np.full(n, np.nan)
+    confidence = np.full(n, np.nan)
+    geo_adjustment = np.full(n, np.nan)
+    for i in range(n):
+        # A sector error leaves the geography unresolved, as in /predict
+        if errors[i] is None:
+            base_multiple[i], confidence[i] = sector_matches[i].base_multiple, sector_matches[i].confidence
+            geo_adjustment[i] = geo_matches[i].adjustment
+    resolver.record('sector', [m.match for m in sector_matches if m is not None])
+    resolver.record('geography', [m.match for m in geo_matches if m is not None])
+    size_adjustment = get_size_adjustments(revenue)
+    
+    scores = {
+        'revenue': revenue,
+        'base_multiple': base_multiple,
+        'geo_adjustment': geo_adjustment,
+        'size_adjustment': size_adjustment,
+        'confidence': confidence,
+        'errors': errors
+    }
+    return with_final_multiple(scores, base_multiple * geo_adjustment * size_adjustment)
+
+
+def with_final_multiple(scores, final_multiple, low_multiple=None, high_multiple=None):
+    """
+    Set the final multiple on a score_batch result and derive ranges and EVs
+    
+    The range defaults to the fixed ±25% band around the multiple.
+    """
+    revenue = scores['revenue']
+    if low_multiple is None:
+        low_multiple = final_multiple * 0.75
+    if high_multiple is None:
+        high_multiple = final_multiple * 1.25
+    scores.update({
+        'final_multiple': final_multiple,
+        'low_multiple': low_multiple,
+        'high_multiple': high_multiple,
+        'enterprise_value': final_multiple * revenue,
+        'ev_low': low_multiple * revenue,
+        'ev_high': high_multiple * revenue
+    })
+    return scores
+
+
+def build_batch_results(sectors, geographies, revenues, scores):
+    """
+    Build one /predict-shaped result per scored row
+    
+    Optional per-row lists in scores: 'engine', 'key_drivers' (None to
+    use the rule drivers), 'fallback' (reason an engine was skipped) and
+    'interval' (how a non-fixed range was derived).
+    """
+    errors = scores['errors']
+    engines = scores.get('engine') or ['rules'] * len(errors)
+    custom_drivers = scores.get('key_drivers') or [None] * len(errors)
+    fallbacks = scores.get('fallback') or [None] * len(errors)
+    intervals = scores.get('interval') or [None] * len(errors)
+    columns = [scores[name].tolist() for name in (
+        'base_multiple', 'geo_adjustment', 'size_adjustment', 'final_multiple',
+        'low_multiple', 'high_multiple', 'enterprise_value', 'ev_low', 'ev_high',
+        'confidence'
+    )]
+    
+    results = []
+    drivers_cache = {}
+    for i, row in enumerate(zip(*columns)):
+        if errors[i] is not None:
+            results.append({'success': False, 'error': errors[i]})
+            continue
+        
+        (base_multiple, geo_adjustment, size_adjustment, final_multiple, low_multiple,
+         high_multiple, enterprise_value, ev_low, ev_high, confidence) = row
+        sector, geography = sectors[i], geographies[i]
+        
+        key_drivers = custom_drivers[i]
+        if key_drivers is None:
+            # Drivers only depend on the labels and the three adjustments
+            drivers_key = (sector, geography, size_adjustment)
+            key_drivers = drivers_cache.get(drivers_key)
+            if key_drivers is None:
+                key_drivers = build_key_drivers(sector, geography, base_multiple, geo_adjustment,
+                                                size_adjustment, final_multiple)
+                drivers_cache[drivers_key] = key_drivers
+        
+        result = build_prediction(
+            sector, geography, revenues[i], final_multiple, low_multiple,
+            high_multiple, enterprise_value, ev_low, ev_high, confidence, list(key_drivers),
+            engine=engines[i], interval=intervals[i]
+        )
+        if fallbacks[i]:
+            result['fallback'] = fallbacks[i]
+        results.append(result)
+    return results
+
+
+def revenue_sweep(spec):
+    """
+    Revenues for a grid axis: a list of values, or a range
+    {"start": 1, "stop": 500, "num": 50, "scale": "linear" | "log"}
+    """
+    if isinstance(spec, dict):
+        start, stop = float(spec['start']), float(spec['stop'])
+        num = int(spec.get('num', 20))
+        if num < 1:
+            raise ValueError('Revenue range needs num >= 1')
+        if spec.get('scale', 'linear') == 'log':
+            if start <= 0 or stop <= 0:
+                raise ValueError('A log revenue range needs positive start and stop')
+            revenues = np.geomspace(start, stop, num)
+        else:
+            revenues = np.linspace(start, stop, num)
+    elif isinstance(spec, list):
+        revenues = np.array([parse_revenue(value) for value in spec], dtype=float)
+    else:
+        raise ValueError('revenue must be a list or a {"start", "stop", "num"} range')
+    if not np.isfinite(revenues).all():
+        raise ValueError('Revenues must be finite numbers')
+    return revenues
+
+
+def score_grid(sector, geographies, revenues, resolver=None):
+    """
+    Rule-based valuations for one sector over every geography x revenue pair
+    
+    Each geography is resolved once and the size buckets are computed
+    once per revenue; the (geography, revenue) grid is their broadcast
+    product. Returns a dict of arrays shaped (len(geographies), len(revenues)).
+    """
+    resolver = resolver or RESOLVER
+    revenue = np.asarray(revenues, dtype=float)
+    sector_match = resolver.resolve_sector(sector)
+    geo_matches = [resolver.resolve_geography(geography, record=False) for geography in geographies]
+    resolver.record('geography', [match.match for match in geo_matches])
+    
+    geo_adjustment = np.array([match.adjustment for match in geo_matches], dtype=float)
+    size_adjustment = get_size_adjustments(revenue)
+    final_multiple = sector_match.base_multiple * geo_adjustment[:, None] * size_adjustment[None, :]
+    low_multiple = final_multiple * 0.75
+    high_multiple = final_multiple * 1.25
+    return {
+        'base_multiple': sector_match.base_multiple,
+        'confidence': sector_match.confidence,
+        'revenue': revenue,
+        'geo_adjustment': geo_adjustment,
+        'size_adjustment': size_adjustment,
+        'final_multiple': final_multiple,
+        'low_multiple': low_multiple,
+        'high_multiple': high_multiple,
+        'enterprise_value': final_multiple * revenue,
+        'ev_low': low_multiple * revenue,
+        'ev_high': high_multiple * revenue
+    }
+
+
+def predict_batch(sectors, geographies, revenues, resolver=None):
+    """
+    Score a batch and build one /predict-shaped result per row
+    
+    Rows that fail are returned as {'success': False, 'error': ...}
+    without affecting the rest of the batch.
+    """
+    revenues = [parse_revenue(r) for r in revenues]
+    scores = score_batch(sectors, geographies, revenues, resolver)
+    return build_batch_results(sectors, geographies, revenues, scores)
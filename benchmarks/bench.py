@@ -0,0 +1,514 @@
+"""
+Benchmark harness for the API, training and extraction pipelines
+Writes machine-readable JSON and flags regressions against a stored baseline.
+
+    python benchmarks/bench.py run micro pipeline -o results.json
+    python benchmarks/bench.py run load --concurrency 1,8,32 --duration 10
+    python benchmarks/bench.py run overload --overload 2 --duration 10
+    python benchmarks/bench.py run --baseline benchmarks/baseline.json
+    python benchmarks/bench.py compare benchmarks/baseline.json results.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import http.client
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import synthetic
+
+SUITES = ('micro', 'load', 'overload', 'pipeline')
+
+# Metric name -> True when lower is better
+METRIC_DIRECTIONS = {
+    'ns_per_op': True,
+    'us_per_request': True,
+    'seconds': True,
+    'p50_ms': True,
+    'p95_ms': True,
+    'p99_ms': True,
+    'peak_rss_mb': True,
+    'rps': False,
+    'shed_rate': True,
+    'deals_per_s': False,
+    'pages_per_s': False,
+}
+
+SECTOR_INPUTS = ['Technology', 'tech startup', 'Gold mining', 'Oil & Gas', 'Real-Estate',
+                 'Fintech SaaS platform', 'Underwater basket weaving']
+GEOGRAPHY_INPUTS = ['USA', 'North America', 'U.K.', 'Nordics', 'LatAm', 'Mars']
+
+
+def time_op(fn, repeat=5):
+    """Best-of-`repeat` nanoseconds per call, with the loop count auto-ranged to ~0.2s"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+# ============================================
+# MICROBENCHMARKS
+# ============================================
+
+def bench_micro():
+    from api.valuation import get_base_multiple, get_geography_adjustment, get_confidence
+    from api.predict_api import app
+
+    results = {}
+    for fn, inputs in ((get_base_multiple, SECTOR_INPUTS), (get_geography_adjustment, GEOGRAPHY_INPUTS),
+                       (get_confidence, SECTOR_INPUTS)):
+        values = itertools.cycle(inputs)
+        results[f'micro.{fn.__name__}'] = {'ns_per_op': time_op(lambda: fn(next(values)))}
+
+    client = app.test_client()
+    rng = random.Random(0)
+    # Distinct revenues so every request misses the response cache
+    payloads = itertools.cycle([
+        {'sector': rng.choice(SECTOR_INPUTS), 'geography': rng.choice(GEOGRAPHY_INPUTS),
+         'revenue': rng.uniform(1, 1000)}
+        for _ in range(100000)
+    ])
+    results['micro.predict'] = {
+        'us_per_request': time_op(lambda: client.post('/predict', json=next(payloads)), repeat=3) / 1000
+    }
+    repeated = {'sector': 'Technology', 'geography': 'USA', 'revenue': 50}
+    results['micro.predict_cached'] = {
+        'us_per_request': time_op(lambda: client.post('/predict', json=repeated), repeat=3) / 1000
+    }
+    results.update(bench_intervals())
+    return results
+
+
+def bench_intervals(sizes=(1, 100, 10000)):
+    """Forest interval mode (per-tree quantiles) against the point-prediction path"""
+    from api import ml_engine
+
+    engine = ml_engine.ENGINE
+    if engine is None:
+        return {}
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in sizes:
+        sector_codes = rng.integers(0, len(engine.sector_codes), n)
+        geography_codes = rng.integers(0, len(engine.geography_codes), n)
+        revenues = rng.uniform(1, 1000, n)
+        results[f'micro.ml_point.{n}'] = {
+            'ns_per_op': time_op(lambda: engine.predict_multiples(sector_codes, geography_codes, revenues))
+        }
+        results[f'micro.ml_interval.{n}'] = {
+            'ns_per_op': time_op(lambda: engine.predict_intervals(sector_codes, geography_codes, revenues))
+        }
+    return results
+
+
+# ============================================
+# LOAD TEST
+# ============================================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_server(workers, threads, **extra_env):
+    """Run the API under gunicorn on a free local port"""
+    port = _free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads), **extra_env)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}', 'api.predict_api:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/health')
+                if connection.getresponse().status == 200:
+                    break
+            except OSError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError('gunicorn did not start')
+            time.sleep(0.2)
+        yield port
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def load_level(port, concurrency, duration, bodies, path='/predict'):
+    """Closed-loop load at a fixed concurrency; returns latency percentiles and RPS"""
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = time.perf_counter() + duration
+
+    def client(slot):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Content-Type': 'application/json'}
+        for body in itertools.cycle(bodies[slot::concurrency] or bodies):
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[slot] += 1
+            except (OSError, http.client.HTTPException):
+                errors[slot] += 1
+                connection.close()
+                continue
+            latencies[slot].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = np.array([value for slot in latencies for value in slot]) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+    return {
+        'requests': int(len(samples)),
+        'errors': sum(errors),
+        'rps': len(samples) / elapsed,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99)
+    }
+
+
+def _load_bodies():
+    rng = random.Random(1)
+    return [
+        json.dumps({'sector': rng.choice(SECTOR_INPUTS), 'geography': rng.choice(GEOGRAPHY_INPUTS),
+                    'revenue': rng.randint(1, 1000)})
+        for _ in range(5000)
+    ]
+
+
+def bench_load(concurrency_levels, duration, workers, threads):
+    bodies = _load_bodies()
+    results = {}
+    with gunicorn_server(workers, threads) as port:
+        load_level(port, 1, min(duration, 1.0), bodies)  # warm up
+        for concurrency in concurrency_levels:
+            results[f'load.c{concurrency}'] = load_level(port, concurrency, duration, bodies)
+    return results
+
+
+def open_loop_level(port, rate, duration, bodies, connections, path='/predict'):
+    """
+    Open-loop load: request i is due at start + i / rate whether or not
+    earlier ones have finished, so a slow server builds a backlog instead
+    of slowing the clients down. Latency counts from the due time, so
+    requests stuck behind busy connections are not hidden. Each request
+    carries its send time as X-Request-Start, as a load balancer would;
+    client_lag_p99_ms shows how far the clients fell behind schedule.
+    """
+    total = int(rate * duration)
+    counter = itertools.count()
+    ok, shed, lag, errors = [], [], [], [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    wall_offset = time.time() - started
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            i = next(counter)
+            if i >= total:
+                break
+            due = started + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            headers = {'Content-Type': 'application/json',
+                       'X-Request-Start': f't={int((sent + wall_offset) * 1e6)}'}
+            try:
+                connection.request('POST', path, bodies[i % len(bodies)], headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                with lock:
+                    errors[0] += 1
+                continue
+            latency = time.perf_counter() - due
+            with lock:
+                lag.append(sent - due)
+                if response.status == 200:
+                    ok.append(latency)
+                elif response.status == 503:
+                    shed.append(latency)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = np.array(ok) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+    return {
+        'offered_rps': rate,
+        'requests': len(ok),
+        'shed': len(shed),
+        'errors': errors[0],
+        'shed_rate': len(shed) / total if total else 0.0,
+        'shed_p99_ms': float(np.percentile(shed, 99) * 1000) if shed else 0.0,
+        'client_lag_p99_ms': float(np.percentile(lag, 99) * 1000) if lag else 0.0,
+        'rps': len(ok) / elapsed,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99)
+    }
+
+
+def bench_overload(factor, duration, workers, threads, connections, queue_budget_ms, items):
+    """
+    Offer `factor` times the measured capacity, without and with admission
+    control; p50/p95/p99 are over the requests that got a 200
+
+    With items > 1 each request is a /predict/batch of that many rows, so
+    the server does enough work per request that a Python client on the
+    same machine can still generate the overload.
+    """
+    bodies = _load_bodies()
+    path = '/predict'
+    if items > 1:
+        path = '/predict/batch'
+        rows = [json.loads(body) for body in bodies]
+        bodies = [json.dumps({'items': rows[i:i + items]}) for i in range(0, len(rows) - items + 1, items)]
+    results = {}
+    for admission in ('0', '1'):
+        # The clients stand in for a load balancer, so trust their X-Request-Start
+        with gunicorn_server(workers, threads, ADMISSION_ENABLED=admission,
+                             ADMISSION_QUEUE_BUDGET_MS=str(queue_budget_ms),
+                             ADMISSION_TRUST_REQUEST_START='1') as port:
+            load_level(port, 1, min(duration, 1.0), bodies, path)  # warm up
+            capacity = load_level(port, workers * threads * 2, duration, bodies, path)['rps']
+            name = f"overload.x{factor:g}.admission_{'on' if admission == '1' else 'off'}"
+            results[name] = {'capacity_rps': capacity,
+                             **open_loop_level(port, capacity * factor, duration, bodies, connections, path)}
+    return results
+
+
+# ============================================
+# PIPELINE BENCHMARKS
+# ============================================
+
+def _import_extractor():
+    # The extractor reports its Supabase status on import
+    with contextlib.redirect_stdout(io.StringIO()):
+        from scripts import extract_njord_deals
+    return extract_njord_deals
+
+
+# Runs in a fresh interpreter so peak RSS reflects extraction alone
+EXTRACT_SNIPPET = '''
+import contextlib, io, json, sys, time
+sys.path.insert(0, sys.argv[1])
+with contextlib.redirect_stdout(io.StringIO()):
+    from scripts import extract_njord_deals as extractor
+stats = {}
+started = time.perf_counter()
+deals = sum(1 for _ in extractor.extract_deals(sys.argv[2], int(sys.argv[3]), stats=stats))
+elapsed = time.perf_counter() - started
+main_rss, worker_rss = extractor.peak_rss_mb()
+print(json.dumps({'seconds': elapsed, 'pages_per_s': stats['pages'] / elapsed,
+                  'deals_per_s': deals / elapsed, 'peak_rss_mb': max(main_rss, worker_rss)}))
+'''
+
+
+def bench_extract(pages, workers):
+    """Streaming extraction of a synthetic PDF (needs PyPDF2)"""
+    try:
+        import PyPDF2  # noqa: F401
+    except ImportError:
+        print("⚠️ PyPDF2 not installed, skipping PDF extraction benchmark", file=sys.stderr)
+        return {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'notes.pdf')
+        synthetic.write_pdf(path, synthetic.SyntheticPages(pages))
+        completed = subprocess.run([sys.executable, '-c', EXTRACT_SNIPPET, ROOT, path, str(workers)],
+                                   capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Extraction failed on {pages} pages:\n{completed.stderr}")
+    return {f'pipeline.extract_pdf.{pages}.w{workers}': json.loads(completed.stdout)}
+
+
+def bench_pipeline(sizes):
+    extractor = _import_extractor()
+    results = {}
+    for n in sizes:
+        text = synthetic.notes_text(n)
+        started = time.perf_counter()
+        deals = extractor.parse_deals(text)
+        elapsed = time.perf_counter() - started
+        del text
+        results[f'pipeline.parse_deals.{n}'] = {'seconds': elapsed, 'deals_per_s': len(deals) / elapsed}
+
+    script = os.path.join(ROOT, 'ml', 'train_valuation_model.py')
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, 'extracted_deals.json'), 'w') as f:
+                json.dump(synthetic.deal_records(n), f)
+            # Run from the temp dir so the models land there, not in ml/models
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, script], cwd=workdir, capture_output=True, text=True)
+            elapsed = time.perf_counter() - started
+        if completed.returncode != 0:
+            raise RuntimeError(f"Training failed on {n} deals:\n{completed.stderr}")
+        results[f'pipeline.train.{n}'] = {'seconds': elapsed, 'deals_per_s': n / elapsed}
+    return results
+
+
+# ============================================
+# RESULTS AND COMPARISON
+# ============================================
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(baseline, current, threshold):
+    """Rows of (name, metric, baseline, current, change, regressed) for shared metrics"""
+    rows = []
+    for name, metrics in sorted(current['results'].items()):
+        before = baseline['results'].get(name, {})
+        for metric, value in metrics.items():
+            if metric not in METRIC_DIRECTIONS or not before.get(metric):
+                continue
+            change = (value - before[metric]) / before[metric]
+            worse = change if METRIC_DIRECTIONS[metric] else -change
+            rows.append((name, metric, before[metric], value, change, worse > threshold))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n{'benchmark':36} {'metric':14} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metric, before, value, change, regressed in rows:
+        flag = '⚠️ REGRESSION' if regressed else ''
+        print(f"{name:36} {metric:14} {before:12.4g} {value:12.4g} {change:+8.1%} {flag}".rstrip())
+    regressions = sum(1 for row in rows if row[5])
+    if regressions:
+        print(f"\n❌ {regressions} regression(s) beyond {threshold:.0%}")
+    else:
+        print(f"\n✓ No regressions beyond {threshold:.0%}")
+    return regressions
+
+
+def _int_list(text):
+    return [int(float(value)) for value in text.split(',') if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the valuation API and pipelines')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run benchmark suites')
+    run.add_argument('suites', nargs='*', choices=SUITES, help='default: all suites')
+    run.add_argument('-o', '--output', help='write results JSON here (default: stdout)')
+    run.add_argument('--baseline', help='compare against this results JSON afterwards')
+    run.add_argument('--threshold', type=float, default=0.10, help='relative change counted as a regression')
+    run.add_argument('--sizes', type=_int_list, default=[1000, 10000, 100000],
+                     help='pipeline corpus sizes in deals (e.g. 1000,1e6)')
+    run.add_argument('--concurrency', type=_int_list, default=[1, 4, 16], help='load test concurrency levels')
+    run.add_argument('--duration', type=float, default=5.0, help='seconds per load level')
+    run.add_argument('--workers', type=int, default=2, help='gunicorn workers for the load test')
+    run.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    run.add_argument('--overload', type=float, default=2.0, help='offered load as a multiple of capacity')
+    run.add_argument('--connections', type=int, default=128, help='client connections for the overload test')
+    run.add_argument('--queue-budget-ms', type=float, default=100,
+                     help='ADMISSION_QUEUE_BUDGET_MS for the overload test')
+    run.add_argument('--overload-items', type=int, default=200,
+                     help='rows per overload request (1 posts single /predict calls)')
+    run.add_argument('--pdf-pages', type=int, default=2000, help='pages in the synthetic PDF')
+    run.add_argument('--extract-workers', type=int, default=os.cpu_count() or 1)
+
+    cmp = commands.add_parser('compare', help='compare two results files')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        return 1 if print_comparison(compare(baseline, current, args.threshold), args.threshold) else 0
+
+    suites = args.suites or list(SUITES)
+    results = {}
+    for suite in suites:
+        print(f"⏱️  Running {suite} benchmarks...", file=sys.stderr)
+        if suite == 'micro':
+            results.update(bench_micro())
+        elif suite == 'load':
+            results.update(bench_load(args.concurrency, args.duration, args.workers, args.threads))
+        elif suite == 'overload':
+            results.update(bench_overload(args.overload, args.duration, args.workers, args.threads,
+                                          args.connections, args.queue_budget_ms, args.overload_items))
+        else:
+            results.update(bench_pipeline(args.sizes))
+            results.update(bench_extract(args.pdf_pages, args.extract_workers))
+    report = {'environment': environment(), 'suites': suites, 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Wrote {len(results)} results to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if print_comparison(compare(baseline, report, args.threshold), args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
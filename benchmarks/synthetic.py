@@ -0,0 +1,123 @@
+"""
+Synthetic Njord-style corpora for benchmarks
+Pages look like test_deals.txt and deal records like extracted_deals.json, so
+the extractor and the training script do representative work at any size.
+"""
+
+import random
+
+COMPANY_WORDS = ['Nordic', 'Atlas', 'Inca', 'Heritage', 'Polar', 'Cobalt', 'Summit', 'Harbor',
+                 'Vertex', 'Aurora', 'Granite', 'Meridian', 'Falcon', 'Zenith', 'Orion']
+COMPANY_SUFFIXES = ['AB', 'Corp', 'Ltd', 'Holdings', 'Group', 'Resources', 'Labs', 'SA']
+ACTIVITIES = [
+    'Trading company in steel/metals commodities',
+    'Cannabis producer and distributor',
+    'Modular construction technology',
+    'Manufacturing - paper products',
+    'Gold mining and ore processing in the Andes',
+    'SaaS data platform for fintech lenders',
+    'Esports and gaming entertainment studio',
+    'Solar and renewable power developer',
+    'Regional logistics and warehousing',
+]
+LOCATIONS = ['Portugal/Europe', 'Canada expanding to USA', 'Sweden', 'Peru and Chile',
+             'Ghana, West Africa', 'Dubai, UAE', 'Germany', 'Brazil', 'Singapore']
+SECTORS = ['Trading/Commodities', 'Cannabis/Healthcare', 'Construction/Real Estate', 'Energy',
+           'Mining/Resources', 'Technology', 'Gaming/Entertainment', 'Manufacturing', 'Other']
+GEOGRAPHIES = ['Europe', 'North America', 'South America', 'Africa', 'Middle East', 'Global']
+
+
+def deal_page(rng):
+    """Text of one notes page"""
+    name = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+    lines = [name if rng.random() < 0.7 else f"COMPANY: {name}", rng.choice(ACTIVITIES)]
+    if rng.random() < 0.8:
+        lines.append(f"Revenue: {rng.randint(1, 900)}M {rng.choice(['EUR', 'USD'])}")
+    if rng.random() < 0.8:
+        low = rng.randint(1, 60)
+        lines.append(f"Seeking: {low}-{low + rng.randint(1, 40)}M debt facility")
+    lines.append(f"Location: {rng.choice(LOCATIONS)}")
+    if rng.random() < 0.4:
+        lines.append(f"EBITDA: {rng.randint(2, 35)}% margins")
+    return '\n'.join(lines)
+
+
+def iter_pages(n, seed=0):
+    """Yield n page texts"""
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield deal_page(rng)
+
+
+def notes_text(n, seed=0):
+    """n pages joined with the extractor's --- PAGE N --- markers"""
+    return ''.join(f"\n--- PAGE {i} ---\n{page}" for i, page in enumerate(iter_pages(n, seed), start=1))
+
+
+def deal_records(n, seed=0):
+    """n extracted_deals.json-style records"""
+    rng = random.Random(seed)
+    records = []
+    for page in range(1, n + 1):
+        records.append({
+            'page': page,
+            'company_name': f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}",
+            'revenue_m': float(rng.randint(1, 900)) if rng.random() < 0.8 else None,
+            'funding_need_m': f"{rng.randint(1, 60)}-{rng.randint(61, 100)}" if rng.random() < 0.8 else None,
+            'sector': rng.choice(SECTORS),
+            'geography': rng.choice(GEOGRAPHIES),
+            'ebitda_info': None,
+            'notes_snippet': ''
+        })
+    return records
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, pages):
+    """
+    Write page texts as a minimal text-only PDF, streaming page by page
+
+    `pages` is a sized iterable, so the page tree can be written before the
+    pages themselves without holding them all in memory.
+    """
+    n = len(pages)
+    offsets = []
+    with open(path, 'wb') as f:
+        def write_object(number, body):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = ' '.join(f"{4 + 2 * i} 0 R" for i in range(n))
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode())
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for i, text in enumerate(pages):
+            lines = ' '.join(f"({_pdf_escape(line)}) Tj T*" for line in text.split('\n'))
+            stream = f"BT /F1 10 Tf 12 TL 50 750 Td {lines} ET".encode('latin-1', 'replace')
+            write_object(4 + 2 * i, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                                    f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+            write_object(5 + 2 * i, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+        xref = f.tell()
+        f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+class SyntheticPages:
+    """Sized, re-iterable view of iter_pages(n, seed) for write_pdf"""
+
+    def __init__(self, n, seed=0):
+        self.n = n
+        self.seed = seed
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return iter_pages(self.n, self.seed)
@@ -0,0 +1,79 @@
+"""
+Gunicorn settings for the valuation API
+Preloads the app in the master so the ML model is loaded once and its pages
+are shared copy-on-write by every forked worker.
+"""
+
+import gc
+import glob
+import os
+import shutil
+import tempfile
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# More than one thread switches to gthread workers, which micro-batching needs
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Workers write metrics here so /metrics can aggregate across all of them;
+# set before the app is preloaded so it picks the directory up. A default
+# (per-master temp) directory is removed again on exit.
+_OWN_METRICS_DIR = 'METRICS_DIR' not in os.environ
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f'valuation-metrics-{os.getpid()}'))
+
+
+def _memory_mb():
+    """RSS plus proportional/shared memory for this process, in MB"""
+    stats = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                    stats[name] = int(rest.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {
+        'rss': round(stats.get('Rss', 0), 1),
+        'pss': round(stats.get('Pss', 0), 1),
+        'shared': round(stats.get('Shared_Clean', 0) + stats.get('Shared_Dirty', 0), 1),
+        'private': round(stats.get('Private_Clean', 0) + stats.get('Private_Dirty', 0), 1)
+    }
+
+
+def on_starting(server):
+    # Counters from a previous run would otherwise be summed into this one
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], 'worker-*.bin')):
+        os.remove(path)
+
+
+def when_ready(server):
+    from api import ml_engine
+    stats = ml_engine.BOOT_STATS
+    if stats['loaded']:
+        server.log.info(
+            "ML model %s loaded in %.3fs (+%.1f MB), first prediction %.2f ms",
+            stats['version'], stats['load_seconds'], stats['model_rss_mb'], stats['first_prediction_ms']
+        )
+    else:
+        server.log.warning("ML model not loaded, serving rules only: %s", stats.get('error'))
+
+
+def pre_fork(server, worker):
+    # Keep the preloaded objects out of the collector so refcount/GC writes
+    # don't un-share their pages in the children
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    memory = _memory_mb()
+    if memory:
+        worker.log.info(
+            "Worker %s memory: rss %.1f MB, pss %.1f MB, shared %.1f MB, private %.1f MB",
+            worker.pid, memory['rss'], memory['pss'], memory['shared'], memory['private']
+        )
+
+
+def on_exit(server):
+    if _OWN_METRICS_DIR:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
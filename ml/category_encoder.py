@@ -0,0 +1,103 @@
+"""
+Categorical feature encoder for the valuation model
+Maps sector/geography values to the model's integer codes through a table
+keyed on normalized text, with an explicit UNKNOWN code for anything the
+model was not trained on. Free text goes through the API resolver first, so
+'Gold mining' and 'Mining/Resources' get the same code.
+"""
+
+import json
+
+import numpy as np
+
+from api.resolver import normalize
+from api.valuation import get_geography_region, get_sector_family
+
+UNKNOWN = -1
+CODE_DTYPE = np.int32
+
+# Alias/family mapping onto the extractor's labels, per field
+FAMILIES = {
+    'sector': get_sector_family,
+    'geography': get_geography_region
+}
+
+# Distinct raw values remembered per encoder
+MEMO_SIZE = 65536
+
+
+class CategoryEncoder:
+    """Precomputed label -> code table for one categorical field"""
+
+    def __init__(self, field, classes, resolver=None):
+        if field not in FAMILIES:
+            raise ValueError(f"Unknown field '{field}' (expected one of {', '.join(FAMILIES)})")
+        self.field = field
+        self.classes = list(classes)
+        self.codes = {label: code for code, label in enumerate(self.classes)}
+        self.table = {normalize(label): code for code, label in enumerate(self.classes)}
+        family = FAMILIES[field]
+        # resolver: the RuleResolver to map aliases with (default: api.valuation.RESOLVER)
+        self._family = family if resolver is None else (lambda value: family(value, resolver))
+        self._memo = {}
+
+    @classmethod
+    def fit(cls, field, values):
+        """Encoder over the distinct labels in values, sorted as LabelEncoder does"""
+        return cls(field, sorted({value for value in values if isinstance(value, str)}))
+
+    def __len__(self):
+        return len(self.classes)
+
+    def family(self, value):
+        """The label value maps onto before lookup (for error messages)"""
+        return self._family(value)
+
+    def _lookup(self, value):
+        if isinstance(value, str):
+            code = self.table.get(normalize(value))
+            if code is not None:
+                return code
+        try:
+            family = self._family(value)
+        except Exception:
+            return UNKNOWN
+        return self.table.get(normalize(family), UNKNOWN)
+
+    def encode_one(self, value):
+        """Code for a single value, UNKNOWN if it maps to no trained label"""
+        try:
+            code = self._memo.get(value)
+        except TypeError:
+            return self._lookup(value)
+        if code is None:
+            code = self._lookup(value)
+            if len(self._memo) < MEMO_SIZE:
+                self._memo[value] = code
+        return code
+
+    def encode(self, values):
+        """Codes for a whole sequence in one call, UNKNOWN where unseen"""
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        try:
+            # Fast path: every value already memoized
+            return np.fromiter(map(self._memo.__getitem__, values), CODE_DTYPE, len(values))
+        except (KeyError, TypeError):
+            return np.fromiter(map(self.encode_one, values), CODE_DTYPE, len(values))
+
+    def decode(self, codes):
+        """Labels for codes, None for UNKNOWN"""
+        lookup = np.array(self.classes + [None], dtype=object)
+        return lookup[np.asarray(codes, dtype=np.intp)]
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'field': self.field, 'classes': self.classes, 'unknown': UNKNOWN}, f,
+                      ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['field'], data['classes'])
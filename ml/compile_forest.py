@@ -0,0 +1,100 @@
+"""
+Compile the trained RandomForest into flat arrays for fast inference
+Run after train_valuation_model.py:  python ml/compile_forest.py [--benchmark]
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.flat_forest import FlatForest
+
+MODEL_PATH = 'ml/models/revenue_multiple_model.pkl'
+FOREST_PATH = 'ml/models/revenue_multiple_forest.npz'
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+def sample_inputs(model, n, seed=0):
+    """Random rows spanning every split threshold in the forest"""
+    rng = np.random.default_rng(seed)
+    columns = []
+    for f in range(model.n_features_in_):
+        thresholds = np.concatenate([
+            e.tree_.threshold[e.tree_.feature == f] for e in model.estimators_
+        ])
+        low, high = (thresholds.min(), thresholds.max()) if len(thresholds) else (0.0, 1.0)
+        span = max(high - low, 1.0)
+        column = rng.uniform(low - span, high + span, n)
+        # Hit thresholds exactly too, where <= vs < matters
+        if len(thresholds):
+            exact = rng.random(n) < 0.2
+            column[exact] = rng.choice(thresholds, exact.sum())
+        columns.append(column)
+    return np.column_stack(columns)
+
+
+def time_call(fn, repeat):
+    """Best-of-5 mean seconds per call"""
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def benchmark(model, forest):
+    row = sample_inputs(model, 1, seed=1)
+    batch = sample_inputs(model, 10000, seed=2)
+
+    print("\n⏱️  Single row:")
+    sk = time_call(lambda: model.predict(row), 50)
+    flat = time_call(lambda: forest.predict(row), 2000)
+    one = time_call(lambda: forest.predict_one(row[0]), 20000)
+    print(f"  sklearn predict:        {sk * 1e6:10.1f} µs")
+    print(f"  FlatForest.predict:     {flat * 1e6:10.1f} µs")
+    print(f"  FlatForest.predict_one: {one * 1e6:10.1f} µs")
+
+    print(f"\n⏱️  Batch of {len(batch):,} rows:")
+    sk = time_call(lambda: model.predict(batch), 5)
+    flat = time_call(lambda: forest.predict(batch), 20)
+    print(f"  sklearn predict:        {sk * 1e3:10.2f} ms")
+    print(f"  FlatForest.predict:     {flat * 1e3:10.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=FOREST_PATH)
+    parser.add_argument('--benchmark', action='store_true', help='time sklearn vs the flat engine')
+    args = parser.parse_args()
+
+    print(f"📦 Loading {args.model}...")
+    model = joblib.load(args.model)
+
+    forest = FlatForest.from_sklearn(model)
+    print(f"✓ Compiled {forest.n_trees} trees, {len(forest.value)} nodes, depth {forest.max_depth}")
+
+    # Parity check against sklearn before writing anything
+    X = sample_inputs(model, 50000)
+    diff = np.abs(forest.predict(X) - model.predict(X)).max()
+    one_diff = max(abs(forest.predict_one(x) - p) for x, p in zip(X[:2000], model.predict(X[:2000])))
+    if max(diff, one_diff) > 1e-9:
+        print(f"❌ Flat forest disagrees with sklearn (max abs diff {max(diff, one_diff):.3g})")
+        sys.exit(1)
+    print(f"✓ Matches sklearn on {len(X):,} rows (max abs diff {max(diff, one_diff):.2g})")
+
+    forest.save(args.output)
+    print(f"✓ Saved to {args.output}")
+
+    if args.benchmark:
+        benchmark(model, forest)
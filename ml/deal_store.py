@@ -0,0 +1,376 @@
+"""
+Columnar, memory-mapped store for extracted deals
+Numeric fields are raw NumPy columns, sector/geography are dictionary-encoded
+codes and text fields are an offsets array plus one UTF-8 blob each, so
+training and the API can open the corpus without parsing JSON.
+
+    python ml/deal_store.py convert extracted_deals.json deal_store
+    python ml/deal_store.py append more_deals.json deal_store
+    python ml/deal_store.py info deal_store
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+
+STORE_PATH = 'deal_store'
+FORMAT_VERSION = 1
+
+# Numeric columns; missing values are NaN (page is always set)
+NUMERIC_COLUMNS = {
+    'page': np.int32,
+    'revenue_m': np.float64,
+    'funding_low_m': np.float64,
+    'funding_high_m': np.float64
+}
+# Dictionary-encoded columns; code -1 is None
+CATEGORY_COLUMNS = ('sector', 'geography')
+CODE_DTYPE = np.int16
+# Variable-length text, with a null flag per row
+TEXT_COLUMNS = ('company_name', 'funding_need_m', 'ebitda_info', 'notes_snippet')
+OFFSET_DTYPE = np.int64
+
+# Field order of extracted_deals.json records
+RECORD_FIELDS = ('page', 'company_name', 'revenue_m', 'funding_need_m', 'sector', 'geography',
+                 'ebitda_info', 'notes_snippet')
+
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def funding_range(funding_need_m):
+    """(low, high) in millions from a funding_need_m string such as '5-18'"""
+    numbers = NUMBER.findall(funding_need_m or '')
+    if not numbers:
+        return np.nan, np.nan
+    return float(numbers[0]), float(numbers[-1])
+
+
+def _column_files(meta):
+    """(file name, dtype, committed item count) for every file in the store"""
+    rows = meta['rows']
+    files = [(f'{name}.bin', dtype, rows) for name, dtype in NUMERIC_COLUMNS.items()]
+    files += [(f'{name}.codes.bin', CODE_DTYPE, rows) for name in CATEGORY_COLUMNS]
+    for name in TEXT_COLUMNS:
+        files += [
+            (f'{name}.offsets.bin', OFFSET_DTYPE, rows + 1),
+            (f'{name}.nulls.bin', np.uint8, rows),
+            (f'{name}.text.bin', np.uint8, meta['text_bytes'][name])
+        ]
+    return files
+
+
+def _empty_meta():
+    return {
+        'format': FORMAT_VERSION,
+        'rows': 0,
+        'generation': 0,
+        'categories': {name: [] for name in CATEGORY_COLUMNS},
+        'text_bytes': {name: 0 for name in TEXT_COLUMNS}
+    }
+
+
+def _write_meta(path, meta):
+    """Atomically replace meta.json; this is the commit point of every write"""
+    meta['updated'] = time.time()
+    tmp = os.path.join(path, f'meta.json.tmp-{os.getpid()}')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+
+def _encode(deals, meta):
+    """Column arrays for a chunk of deal dicts; grows meta's category lists"""
+    n = len(deals)
+    columns = {
+        'page.bin': np.fromiter((d.get('page') or 0 for d in deals), np.int32, n),
+        'revenue_m.bin': np.fromiter((np.nan if d.get('revenue_m') is None else d['revenue_m'] for d in deals),
+                                     np.float64, n)
+    }
+    funding = np.array([funding_range(d.get('funding_need_m')) for d in deals], dtype=np.float64).reshape(n, 2)
+    columns['funding_low_m.bin'] = funding[:, 0].copy()
+    columns['funding_high_m.bin'] = funding[:, 1].copy()
+
+    for name in CATEGORY_COLUMNS:
+        labels = meta['categories'][name]
+        index = {label: code for code, label in enumerate(labels)}
+        codes = np.empty(n, dtype=CODE_DTYPE)
+        for i, deal in enumerate(deals):
+            label = deal.get(name)
+            if label is None:
+                codes[i] = -1
+                continue
+            code = index.get(label)
+            if code is None:
+                code = index[label] = len(labels)
+                labels.append(label)
+            codes[i] = code
+        columns[f'{name}.codes.bin'] = codes
+
+    for name in TEXT_COLUMNS:
+        values = [d.get(name) for d in deals]
+        encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+        lengths = np.fromiter(map(len, encoded), OFFSET_DTYPE, n)
+        base = meta['text_bytes'][name]
+        columns[f'{name}.offsets.bin'] = base + np.cumsum(lengths, dtype=OFFSET_DTYPE)
+        columns[f'{name}.nulls.bin'] = np.fromiter((value is None for value in values), np.uint8, n)
+        columns[f'{name}.text.bin'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        meta['text_bytes'][name] = base + int(lengths.sum())
+    return columns
+
+
+class DealStore:
+    """Read-only, memory-mapped view of a deal store directory"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        # Resolve the symlink once so a concurrent write() can't mix versions
+        self._directory = os.path.realpath(path)
+        with open(os.path.join(self._directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported deal store format {self.meta.get('format')} in {path}")
+        self.rows = self.meta['rows']
+        self.generation = self.meta['generation']
+        self.categories = self.meta['categories']
+        self._files = {name: (dtype, count) for name, dtype, count in _column_files(self.meta)}
+        self._maps = {}
+
+    def __len__(self):
+        return self.rows
+
+    def _map(self, file_name):
+        array = self._maps.get(file_name)
+        if array is None:
+            dtype, count = self._files[file_name]
+            if count == 0:
+                array = np.empty(0, dtype=dtype)
+            else:
+                array = np.memmap(os.path.join(self._directory, file_name), dtype=dtype, mode='r', shape=(count,))
+            self._maps[file_name] = array
+        return array
+
+    def column(self, name):
+        """Numeric column (page, revenue_m, funding_low_m, funding_high_m)"""
+        return self._map(f'{name}.bin')
+
+    def codes(self, name):
+        """Category codes for sector or geography; -1 is None"""
+        return self._map(f'{name}.codes.bin')
+
+    def labels(self, name):
+        """Category values as an object array, None where missing"""
+        lookup = np.array(self.categories[name] + [None], dtype=object)
+        return lookup[self.codes(name)]
+
+    def texts(self, name):
+        """Every value of a text column, decoded"""
+        offsets = self._map(f'{name}.offsets.bin')
+        nulls = self._map(f'{name}.nulls.bin')
+        blob = self._map(f'{name}.text.bin').tobytes()
+        return [None if null else blob[start:end].decode('utf-8')
+                for start, end, null in zip(offsets[:-1].tolist(), offsets[1:].tolist(), nulls.tolist())]
+
+    def text(self, name, row):
+        """One value of a text column"""
+        if self._map(f'{name}.nulls.bin')[row]:
+            return None
+        offsets = self._map(f'{name}.offsets.bin')
+        return self._map(f'{name}.text.bin')[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+
+    def record(self, row):
+        """One deal as an extracted_deals.json-style dict"""
+        revenue = float(self.column('revenue_m')[row])
+        deal = {
+            'page': int(self.column('page')[row]),
+            'revenue_m': None if np.isnan(revenue) else revenue
+        }
+        for name in CATEGORY_COLUMNS:
+            code = int(self.codes(name)[row])
+            deal[name] = self.categories[name][code] if code >= 0 else None
+        for name in TEXT_COLUMNS:
+            deal[name] = self.text(name, row)
+        return {field: deal[field] for field in RECORD_FIELDS}
+
+    def records(self):
+        """All deals as dicts, in store order"""
+        pages = self.column('page').tolist()
+        revenues = self.column('revenue_m').tolist()
+        labels = {name: self.labels(name).tolist() for name in CATEGORY_COLUMNS}
+        texts = {name: self.texts(name) for name in TEXT_COLUMNS}
+        for i in range(self.rows):
+            yield {
+                'page': pages[i],
+                'company_name': texts['company_name'][i],
+                'revenue_m': None if revenues[i] != revenues[i] else revenues[i],
+                'funding_need_m': texts['funding_need_m'][i],
+                'sector': labels['sector'][i],
+                'geography': labels['geography'][i],
+                'ebitda_info': texts['ebitda_info'][i],
+                'notes_snippet': texts['notes_snippet'][i]
+            }
+
+    def frame(self, columns=('page', 'revenue_m', 'funding_low_m', 'funding_high_m', 'sector', 'geography')):
+        """pandas DataFrame of the requested columns (text columns are decoded too)"""
+        import pandas as pd
+
+        data = {}
+        for name in columns:
+            if name in NUMERIC_COLUMNS:
+                data[name] = np.asarray(self.column(name))
+            elif name in CATEGORY_COLUMNS:
+                data[name] = self.labels(name)
+            elif name in TEXT_COLUMNS:
+                data[name] = self.texts(name)
+            else:
+                raise KeyError(f"Unknown deal store column: {name}")
+        return pd.DataFrame(data)
+
+    @classmethod
+    def append(cls, path, deals, chunk_size=10000):
+        """
+        Append deals (any iterable of dicts) and return the number written
+
+        Data files are truncated to their committed length first, so an
+        append that died halfway leaves nothing behind; meta.json is only
+        rewritten once every chunk is on disk.
+        """
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        else:
+            meta = _empty_meta()
+
+        for file_name, dtype, count in _column_files(meta):
+            with open(os.path.join(path, file_name), 'ab') as f:
+                committed = count * np.dtype(dtype).itemsize
+                size = f.seek(0, os.SEEK_END)
+                if size > committed:
+                    f.truncate(committed)
+                elif size < committed:
+                    if meta['rows']:
+                        raise ValueError(f"{file_name} in {path} is shorter than meta.json says")
+                    # New store: offsets start with a single 0
+                    np.zeros(count, dtype=dtype).tofile(f)
+
+        written = 0
+        deals = iter(deals)
+        while True:
+            chunk = list(itertools.islice(deals, chunk_size))
+            if not chunk:
+                break
+            for file_name, array in _encode(chunk, meta).items():
+                with open(os.path.join(path, file_name), 'ab') as f:
+                    array.tofile(f)
+            written += len(chunk)
+
+        meta['rows'] += written
+        meta['generation'] += 1
+        _write_meta(path, meta)
+        return written
+
+    @classmethod
+    def write(cls, path, deals):
+        """
+        Replace the store at path with deals and return the number written
+
+        The deals go into a new `<path>.v<generation>` directory and path
+        is a symlink that is flipped to it with os.replace, so readers see
+        either the old or the new store and never a missing one. The
+        previous version is kept for readers that opened it just before the
+        flip; older ones are deleted. A store that is still a plain
+        directory (from append) is moved aside once to become a symlink.
+        """
+        base = path.rstrip(os.sep)
+        tmp = f'{base}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        generation = 0
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            generation = cls(path).generation
+        written = cls.append(tmp, deals)
+        # Keep generations increasing so readers notice the new data
+        with open(os.path.join(tmp, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['generation'] = generation + 1
+        _write_meta(tmp, meta)
+
+        version = f'{base}.v{generation + 1}'
+        shutil.rmtree(version, ignore_errors=True)  # left by a crashed write
+        os.rename(tmp, version)
+        previous = os.path.realpath(path) if os.path.islink(path) else None
+        if os.path.isdir(path) and not os.path.islink(path):
+            legacy = f'{base}.old-{os.getpid()}'
+            os.rename(path, legacy)
+        link = f'{base}.link-{os.getpid()}'
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(version), link)
+        os.replace(link, path)
+
+        keep = {os.path.realpath(version), previous}
+        parent = os.path.dirname(base) or '.'
+        prefix = os.path.basename(base)
+        for entry in os.scandir(parent):
+            if (re.fullmatch(re.escape(prefix) + r'\.(v\d+|old-\d+)', entry.name)
+                    and entry.is_dir(follow_symlinks=False) and os.path.realpath(entry.path) not in keep):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return written
+
+
+def convert_json(json_path, path=STORE_PATH):
+    """Build a store from an extracted_deals.json file"""
+    with open(json_path, encoding='utf-8') as f:
+        deals = json.load(f)
+    return DealStore.write(path, deals)
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='build a store from extracted_deals.json')
+    convert.add_argument('input', nargs='?', default='extracted_deals.json')
+    convert.add_argument('store', nargs='?', default=STORE_PATH)
+    append = commands.add_parser('append', help='append the deals of a JSON file to a store')
+    append.add_argument('input')
+    append.add_argument('store', nargs='?', default=STORE_PATH)
+    info = commands.add_parser('info', help='summarise a store')
+    info.add_argument('store', nargs='?', default=STORE_PATH)
+    export = commands.add_parser('export', help='write a store back out as JSON')
+    export.add_argument('store')
+    export.add_argument('output')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        started = time.perf_counter()
+        written = convert_json(args.input, args.store)
+        print(f"✓ Wrote {written:,} deals to {args.store} in {time.perf_counter() - started:.2f}s "
+              f"({_directory_bytes(args.store) / 1e6:.1f} MB, JSON {os.path.getsize(args.input) / 1e6:.1f} MB)")
+    elif args.command == 'append':
+        with open(args.input, encoding='utf-8') as f:
+            written = DealStore.append(args.store, json.load(f))
+        print(f"✓ Appended {written:,} deals; {args.store} now has {len(DealStore(args.store)):,}")
+    elif args.command == 'info':
+        started = time.perf_counter()
+        store = DealStore(args.store)
+        opened = time.perf_counter() - started
+        print(f"📦 {args.store}: {len(store):,} deals, generation {store.generation}, "
+              f"{_directory_bytes(args.store) / 1e6:.1f} MB, opened in {opened * 1e3:.2f} ms")
+        for name in CATEGORY_COLUMNS:
+            counts = np.bincount(store.codes(name) + 1, minlength=len(store.categories[name]) + 1)
+            print(f"   {name}: " + ', '.join(f"{label} {count:,}" for label, count
+                                           in zip(['None'] + store.categories[name], counts) if count))
+    elif args.command == 'export':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(list(DealStore(args.store).records()), f, indent=2, ensure_ascii=False)
+        print(f"✓ Exported {len(DealStore(args.store)):,} deals to {args.output}")
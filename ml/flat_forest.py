@@ -0,0 +1,156 @@
+"""
+Array-based RandomForest inference
+Flattens a fitted RandomForestRegressor into contiguous NumPy arrays and
+scores rows by walking every tree level by level
+"""
+
+import numpy as np
+
+
+class FlatForest:
+    """All trees of a forest stored as one set of node arrays"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.n_trees = len(self.roots)
+
+        # children[2 * node + went_left] gives the next node in one gather
+        self.children = np.stack([self.right, self.left], axis=1).ravel()
+
+        # Plain lists for the single-row path, where NumPy call overhead dominates
+        self._feature_list = self.feature.tolist()
+        self._threshold_list = self.threshold.tolist()
+        self._left_list = self.left.tolist()
+        self._right_list = self.right.tolist()
+        self._value_list = self.value.tolist()
+        self._root_list = self.roots.tolist()
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted RandomForestRegressor (single output)"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point at themselves so extra levels are no-ops
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(values),
+            np.array(roots),
+            max_depth,
+            model.n_features_in_
+        )
+
+    def save(self, path):
+        """Write the node arrays to an .npz file"""
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            roots=self.roots,
+            max_depth=self.max_depth,
+            n_features=self.n_features
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read a forest written by save()"""
+        with np.load(path) as data:
+            return cls(
+                data['feature'],
+                data['threshold'],
+                data['left'],
+                data['right'],
+                data['value'],
+                data['roots'],
+                data['max_depth'],
+                data['n_features']
+            )
+
+    def _prepare(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        return X
+
+    def apply(self, X):
+        """Leaf node index for every (row, tree), shape (n_rows, n_trees)"""
+        X = self._prepare(X)
+        n = X.shape[0]
+        # Feature-major copy so a (feature, row) lookup is one flat index
+        columns = X.T.ravel()
+        rows = np.arange(n)[:, None]
+        nodes = np.broadcast_to(self.roots, (n, self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = columns[self.feature[nodes] * n + rows] <= self.threshold[nodes]
+            nodes = self.children[nodes * 2 + go_left]
+        return nodes
+
+    def predict_per_tree(self, X):
+        """Per-tree predictions, shape (n_rows, n_trees)"""
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        """Forest prediction (mean over trees) for each row"""
+        return self.predict_per_tree(X).mean(axis=1)
+
+    def predict_interval(self, X, quantiles=(0.1, 0.9)):
+        """
+        Mean, per-tree quantiles and standard deviation for each row
+
+        All tree outputs come from one apply() as an (n_rows, n_trees)
+        matrix, reduced along the tree axis. Returns (mean, quantiles of
+        shape (len(quantiles), n_rows), std).
+        """
+        per_tree = np.sort(self.predict_per_tree(X), axis=1)
+        # Linear interpolation between order statistics, as np.quantile does,
+        # without its per-call overhead on small batches
+        positions = np.asarray(quantiles, dtype=np.float64) * (self.n_trees - 1)
+        lower = np.floor(positions).astype(np.intp)
+        upper = np.minimum(lower + 1, self.n_trees - 1)
+        fraction = positions - lower
+        values = per_tree[:, lower] * (1 - fraction) + per_tree[:, upper] * fraction
+        return per_tree.mean(axis=1), values.T, per_tree.std(axis=1)
+
+    def predict_one(self, row):
+        """Score a single row without NumPy dispatch"""
+        row = np.asarray(row, dtype=np.float32).tolist()
+        feature, threshold = self._feature_list, self._threshold_list
+        left, right, value = self._left_list, self._right_list, self._value_list
+        total = 0.0
+        for node in self._root_list:
+            while left[node] != node:
+                node = left[node] if row[feature[node]] <= threshold[node] else right[node]
+            total += value[node]
+        return total / self.n_trees
@@ -0,0 +1,183 @@
+"""
+Single-file, versioned model bundle
+One .npz holding the flat forest arrays, the sector/geography encoder
+classes, the rule tables and training metadata, plus a SHA-256 checksum over
+all of it. The API loads and hot-swaps bundles (api/ml_engine.py), so a
+model and its encoders can never be mixed across versions.
+
+    python ml/model_bundle.py build [ml/models] [ml/models/revenue_multiple.bundle]
+    python ml/model_bundle.py info ml/models/revenue_multiple.bundle
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.flat_forest import FlatForest
+
+BUNDLE_FORMAT = 1
+BUNDLE_FILE = 'revenue_multiple.bundle'
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+# Training metrics copied into a bundle's metadata
+METADATA_KEYS = ('version', 'params', 'cv', 'samples', 'data_hash', 'trained_at')
+
+
+def _checksum(arrays):
+    """SHA-256 over every entry's name, dtype, shape and bytes, in name order"""
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f'{name}:{array.dtype.str}:{array.shape}'.encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def metadata_from_metrics(metrics):
+    return {key: metrics[key] for key in METADATA_KEYS if key in metrics}
+
+
+def default_rules():
+    """The rule tables currently in api/valuation.py"""
+    from api.valuation import RULE_TABLES
+    return json.loads(json.dumps(RULE_TABLES))
+
+
+class ModelBundle:
+    """A loaded bundle; version is the first 12 hex digits of its checksum"""
+
+    def __init__(self, forest, sector_classes, geography_classes, rules, metadata, checksum):
+        self.forest = forest
+        self.sector_classes = list(sector_classes)
+        self.geography_classes = list(geography_classes)
+        self.rules = rules
+        self.metadata = metadata
+        self.checksum = checksum
+        self.version = checksum[:12]
+
+    @classmethod
+    def read(cls, path):
+        """
+        Load and verify a bundle
+
+        Raises ValueError if it is truncated, corrupt or from a newer format,
+        and OSError if it can't be read at all.
+        """
+        try:
+            with open(path, 'rb') as f:
+                with np.load(f, allow_pickle=False) as data:
+                    arrays = {name: data[name] for name in data.files}
+            stored = bytes(arrays.pop('checksum')).decode('ascii')
+        except (zipfile.BadZipFile, EOFError, KeyError, UnicodeDecodeError, ValueError) as e:
+            raise ValueError(f"Model bundle {path} is unreadable: {e}") from e
+        if _checksum(arrays) != stored:
+            raise ValueError(f"Model bundle {path} failed its checksum")
+        try:
+            manifest = json.loads(bytes(arrays['manifest']).decode('utf-8'))
+            if manifest['format'] > BUNDLE_FORMAT:
+                raise ValueError(f"Model bundle format {manifest['format']} is newer than {BUNDLE_FORMAT}")
+            forest = FlatForest(*(arrays[f'forest.{name}'] for name in FOREST_ARRAYS),
+                                manifest['max_depth'], manifest['n_features'])
+            return cls(forest, manifest['sector_classes'], manifest['geography_classes'],
+                       manifest['rules'], manifest['metadata'], stored)
+        except (KeyError, TypeError, UnicodeDecodeError) as e:
+            raise ValueError(f"Model bundle {path} has an invalid manifest: {e!r}") from e
+
+    @staticmethod
+    def write(path, forest, sector_classes, geography_classes, rules=None, metadata=None):
+        """
+        Write a bundle atomically (temp file + rename) and return its version
+
+        Readers polling the path see either the old or the new file, never
+        a partial one.
+        """
+        manifest = {
+            'format': BUNDLE_FORMAT,
+            'max_depth': forest.max_depth,
+            'n_features': forest.n_features,
+            'sector_classes': list(sector_classes),
+            'geography_classes': list(geography_classes),
+            'rules': rules if rules is not None else default_rules(),
+            'metadata': metadata or {}
+        }
+        arrays = {f'forest.{name}': getattr(forest, name) for name in FOREST_ARRAYS}
+        arrays['manifest'] = np.frombuffer(json.dumps(manifest, sort_keys=True).encode('utf-8'), dtype=np.uint8)
+        checksum = _checksum(arrays)
+        arrays['checksum'] = np.frombuffer(checksum.encode('ascii'), dtype=np.uint8)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f'.{os.path.basename(path)}.tmp-{os.getpid()}')
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return checksum[:12]
+
+    def info(self):
+        return {
+            'version': self.version,
+            'trees': self.forest.n_trees,
+            'nodes': int(len(self.forest.feature)),
+            'sector_classes': self.sector_classes,
+            'geography_classes': self.geography_classes,
+            'rule_tables': {name: len(table) for name, table in self.rules.items()},
+            'metadata': self.metadata
+        }
+
+
+def build_from_model_dir(model_dir, path=None):
+    """
+    Bundle the separate artifacts in model_dir (model pickle or compiled
+    forest, encoders, metrics) with the current rule tables
+    """
+    import joblib
+
+    model_path = os.path.join(model_dir, 'revenue_multiple_model.pkl')
+    forest_path = os.path.join(model_dir, 'revenue_multiple_forest.npz')
+    if os.path.exists(forest_path) and os.path.getmtime(forest_path) >= os.path.getmtime(model_path):
+        forest = FlatForest.load(forest_path)
+    else:
+        forest = FlatForest.from_sklearn(joblib.load(model_path))
+
+    classes = []
+    for field in ('sector', 'geography'):
+        json_path = os.path.join(model_dir, f'{field}_category_encoder.json')
+        if os.path.exists(json_path):
+            with open(json_path, encoding='utf-8') as f:
+                classes.append(json.load(f)['classes'])
+        else:
+            classes.append([str(label) for label in joblib.load(os.path.join(model_dir, f'{field}_encoder.pkl')).classes_])
+
+    metadata = {}
+    metrics_path = os.path.join(model_dir, 'revenue_multiple_metrics.json')
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding='utf-8') as f:
+            metrics = json.load(f)
+        metadata = metadata_from_metrics(metrics)
+    return ModelBundle.write(path or os.path.join(model_dir, BUNDLE_FILE), forest, *classes, metadata=metadata)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='bundle the artifacts of a model directory')
+    build.add_argument('model_dir', nargs='?', default=os.path.join('ml', 'models'))
+    build.add_argument('output', nargs='?')
+    info = commands.add_parser('info', help='verify a bundle and print its contents')
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        output = args.output or os.path.join(args.model_dir, BUNDLE_FILE)
+        version = build_from_model_dir(args.model_dir, output)
+        print(f"📦 Wrote {output} (version {version}, {os.path.getsize(output) / 1024:.1f} KB)")
+    else:
+        print(json.dumps(ModelBundle.read(args.path).info(), indent=2))
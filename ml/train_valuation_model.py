@@ -1,106 +1,119 @@
 """
 Train ML model on extracted deals
+Runs the cached, cross-validated pipeline in ml/training.py:
+
+    python ml/train_valuation_model.py [--config search.json] [--workers 8] [--no-cache]
+    python ml/train_valuation_model.py --refresh [--trees 10] [--max-trees 200]
 """
 
-import json
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-import joblib
+import argparse
 import os
+import sys
 
-# Load deals
-print("📊 Loading deals...")
-with open('extracted_deals.json', 'r') as f:
-    deals = json.load(f)
-df = pd.DataFrame(deals)
-print(f"✓ Loaded {len(df)} deals")
-
-# Sector multiples (from Njord patterns)
-sector_multiples = {
-    'Trading/Commodities': 0.3,
-    'Cannabis/Healthcare': 3.0,
-    'Construction/Real Estate': 0.7,
-    'Manufacturing': 1.0,
-    'Mining/Resources': 1.2,
-    'Technology': 4.5,
-    'Gaming/Entertainment': 5.0,
-    'Energy': 1.5
-}
-
-# Geography adjustments
-geo_adjustments = {
-    'North America': 1.2,
-    'Europe': 1.0,
-    'South America': 0.7,
-    'Africa': 0.7,
-    'Global': 1.0
-}
-
-# Calculate multiples
-df['base_multiple'] = df['sector'].map(sector_multiples).fillna(1.5)
-df['geo_adjustment'] = df['geography'].map(geo_adjustments).fillna(1.0)
-df['revenue_multiple'] = df['base_multiple'] * df['geo_adjustment']
-
-# Add some realistic variation
-np.random.seed(42)
-df['revenue_multiple'] *= np.random.uniform(0.8, 1.2, len(df))
-
-print("\n📈 Sector Multiples:")
-print(df.groupby('sector')['revenue_multiple'].mean().round(2))
-
-# Prepare features
-le_sector = LabelEncoder()
-le_geography = LabelEncoder()
-
-df['sector_encoded'] = le_sector.fit_transform(df['sector'].fillna('Other'))
-df['geography_encoded'] = le_geography.fit_transform(df['geography'].fillna('Global'))
-df['revenue_clean'] = df['revenue_m'].fillna(50)
-
-# Train model
-X = df[['sector_encoded', 'geography_encoded', 'revenue_clean']]
-y = df['revenue_multiple']
-
-# With only 5 samples, use all for training
-model = RandomForestRegressor(
-    n_estimators=10,
-    max_depth=2,
-    random_state=42
-)
-
-print("\n🎓 Training model...")
-model.fit(X, y)
-print(f"✓ Model trained (R²: {model.score(X, y):.3f})")
+import numpy as np
 
-# Save everything
-os.makedirs('ml/models', exist_ok=True)
-joblib.dump(model, 'ml/models/revenue_multiple_model.pkl')
-joblib.dump(le_sector, 'ml/models/sector_encoder.pkl')
-joblib.dump(le_geography, 'ml/models/geography_encoder.pkl')
-print("✓ Models saved to ml/models/")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.category_encoder import UNKNOWN, CategoryEncoder
+from ml.model_bundle import BUNDLE_FILE
+from ml.training import (
+    CACHE_DIR,
+    DEAL_STORE,
+    DEALS_JSON,
+    DRIFT_THRESHOLD,
+    MAX_TREES,
+    MODEL_DIR,
+    REFRESH_TREES,
+    RUNS_DIR,
+    data_source,
+    load_config,
+    refresh,
+    run,
+)
 
-# Test predictions
-print("\n🔮 Test Predictions:")
-test_cases = [
+TEST_CASES = [
     ("Technology", "North America", 50),
     ("Mining/Resources", "Africa", 30),
     ("Trading/Commodities", "Europe", 500),
 ]
 
-for sector, geo, revenue in test_cases:
-    try:
-        s_enc = le_sector.transform([sector])[0]
-    except:
-        s_enc = 0
-    try:
-        g_enc = le_geography.transform([geo])[0]
-    except:
-        g_enc = 0
-    
-    pred = model.predict([[s_enc, g_enc, revenue]])[0]
-    print(f"\n{sector} in {geo} (€{revenue}M)")
-    print(f"  Multiple: {pred:.2f}x → Valuation: €{pred*revenue:.0f}M")
-
-print("\n✅ Training complete!")
\ No newline at end of file
+
+def print_test_predictions(model_dir=MODEL_DIR):
+    import joblib
+    import pandas as pd
+
+    model = joblib.load(os.path.join(model_dir, 'revenue_multiple_model.pkl'))
+    sector_encoder = CategoryEncoder.load(os.path.join(model_dir, 'sector_category_encoder.json'))
+    geography_encoder = CategoryEncoder.load(os.path.join(model_dir, 'geography_category_encoder.json'))
+
+    print("\n🔮 Test Predictions:")
+    sectors, geos, revenues = zip(*TEST_CASES)
+    s_enc = sector_encoder.encode(sectors)
+    g_enc = geography_encoder.encode(geos)
+    known = (s_enc != UNKNOWN) & (g_enc != UNKNOWN)
+    preds = np.full(len(TEST_CASES), np.nan)
+    if known.any():
+        X_test = pd.DataFrame({'sector_encoded': s_enc, 'geography_encoded': g_enc, 'revenue_clean': revenues})
+        preds[known] = model.predict(X_test[known])
+
+    for (sector, geo, revenue), s_code, g_code, pred in zip(TEST_CASES, s_enc, g_enc, preds):
+        print(f"\n{sector} in {geo} (€{revenue}M)")
+        if s_code == UNKNOWN:
+            print(f"  Unknown sector '{sector_encoder.family(sector)}' (not in training data)")
+        elif g_code == UNKNOWN:
+            print(f"  Unknown geography '{geography_encoder.family(geo)}' (not in training data)")
+        else:
+            print(f"  Multiple: {pred:.2f}x → Valuation: €{pred*revenue:.0f}M")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the revenue-multiple model')
+    parser.add_argument('--config', help='JSON overriding folds/seed/grid of the search')
+    parser.add_argument('--folds', type=int, help='cross-validation folds')
+    parser.add_argument('--workers', type=int, help='processes for the search (default: all cores)')
+    parser.add_argument('--store', default=DEAL_STORE, help='deal store, used when it exists')
+    parser.add_argument('--input', default=DEALS_JSON, help='extracted deals JSON otherwise')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--runs-dir', default=RUNS_DIR)
+    parser.add_argument('--no-cache', action='store_true', help='rebuild features and rerun the search')
+    parser.add_argument('--force', action='store_true', help='rewrite the model even if it is up to date')
+    incremental = parser.add_argument_group('incremental refresh')
+    incremental.add_argument('--refresh', action='store_true',
+                             help='add trees fitted on deals appended since the current version')
+    incremental.add_argument('--trees', type=int, default=REFRESH_TREES, help='trees added per refresh')
+    incremental.add_argument('--max-trees', type=int, default=MAX_TREES, help='oldest trees retired above this')
+    incremental.add_argument('--drift-threshold', type=float, default=DRIFT_THRESHOLD)
+    incremental.add_argument('--no-drift', action='store_true', help='skip the comparison with a full retrain')
+    args = parser.parse_args()
+
+    if args.refresh:
+        print("📊 Loading deals...")
+        try:
+            metrics = refresh(data_source(args.store, args.input), args.model_dir, args.cache_dir,
+                              args.trees, args.max_trees, not args.no_drift, args.drift_threshold,
+                              use_cache=not args.no_cache)
+        except ValueError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        if metrics['refreshed']:
+            print_test_predictions(args.model_dir)
+            print(f"\n✓ Wrote {os.path.join(args.model_dir, BUNDLE_FILE)}; a running API hot-swaps it in")
+        sys.exit(0)
+
+    config = load_config(args.config)
+    if args.folds:
+        config['folds'] = args.folds
+
+    print("📊 Loading deals...")
+    metrics = run(data_source(args.store, args.input), config, args.model_dir, args.cache_dir, args.runs_dir,
+                  workers=args.workers, use_cache=not args.no_cache, force=args.force)
+    cv = metrics['cv']
+    r2 = f", R² {cv['r2_mean']:.3f}" if cv['r2_mean'] is not None else ''
+    print(f"✓ Model: {metrics['params']} (CV RMSE {cv['rmse_mean']:.4f}, MAE {cv['mae_mean']:.4f}{r2})")
+
+    print_test_predictions(args.model_dir)
+
+    print("\n✅ Training complete!")
+    if not metrics['cache_hit']:
+        print(f"✓ Wrote {os.path.join(args.model_dir, BUNDLE_FILE)}; a running API hot-swaps it in")
@@ -0,0 +1,573 @@
+"""
+Training pipeline for the revenue-multiple model
+The feature matrix is cached under a hash of the input deals, hyperparameters
+are picked by k-fold cross-validation with the fits spread over a process
+pool, and the winning model is saved to ml/models with its metrics. Search
+results and the refit winner are cached as well, so a rerun with unchanged
+data and config does no training at all.
+
+refresh() is the incremental path: it grows the current forest with trees
+fitted on the deals appended since the last version, retires the oldest
+trees over a cap and reports drift against a full retrain.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+
+from ml.category_encoder import CategoryEncoder
+from ml.deal_store import DealStore
+from ml.flat_forest import FlatForest
+from ml.model_bundle import BUNDLE_FILE, ModelBundle, metadata_from_metrics
+
+DEAL_STORE = os.environ.get('DEAL_STORE', 'deal_store')
+DEALS_JSON = 'extracted_deals.json'
+MODEL_DIR = os.path.join('ml', 'models')
+CACHE_DIR = os.environ.get('TRAIN_CACHE_DIR', os.path.join('ml', 'cache'))
+RUNS_DIR = os.environ.get('TRAIN_RUNS_DIR', os.path.join('ml', 'runs'))
+MODEL_FILE = 'revenue_multiple_model.pkl'
+METRICS_FILE = 'revenue_multiple_metrics.json'
+VERSIONS_DIR = 'versions'
+
+# Bump when build_features changes, so cached matrices are not reused
+FEATURE_VERSION = 1
+FEATURE_COLUMNS = ['sector_encoded', 'geography_encoded', 'revenue_clean']
+
+# Sector multiples (from Njord patterns)
+SECTOR_MULTIPLES = {
+    'Trading/Commodities': 0.3,
+    'Cannabis/Healthcare': 3.0,
+    'Construction/Real Estate': 0.7,
+    'Manufacturing': 1.0,
+    'Mining/Resources': 1.2,
+    'Technology': 4.5,
+    'Gaming/Entertainment': 5.0,
+    'Energy': 1.5
+}
+
+# Geography adjustments
+GEO_ADJUSTMENTS = {
+    'North America': 1.2,
+    'Europe': 1.0,
+    'South America': 0.7,
+    'Africa': 0.7,
+    'Global': 1.0
+}
+
+# Revenue used for deals without one
+DEFAULT_REVENUE = 50
+
+# Incremental refresh: trees added per refresh, forest size cap, and the
+# relative RMSE gap to a full retrain above which a rebuild is recommended
+REFRESH_TREES = int(os.environ.get('REFRESH_TREES', 10))
+MAX_TREES = int(os.environ.get('REFRESH_MAX_TREES', 200))
+DRIFT_THRESHOLD = float(os.environ.get('REFRESH_DRIFT_THRESHOLD', 0.1))
+
+DEFAULT_CONFIG = {
+    'folds': 5,
+    'seed': 42,
+    'grid': {
+        'n_estimators': [10, 50, 100],
+        'max_depth': [2, 4, 8, None],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': [1.0, 'sqrt']
+    }
+}
+
+
+def load_config(path=None):
+    """DEFAULT_CONFIG, with the keys of a JSON config file layered on top"""
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path, encoding='utf-8') as f:
+            overrides = json.load(f)
+        config.update({key: value for key, value in overrides.items() if key != 'grid'})
+        config['grid'].update(overrides.get('grid', {}))
+    return config
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def data_source(store_path=DEAL_STORE, json_path=DEALS_JSON):
+    """('store', path) when a deal store exists, else ('json', path)"""
+    if os.path.exists(os.path.join(store_path, 'meta.json')):
+        return 'store', store_path
+    return 'json', json_path
+
+
+def data_hash(source):
+    """
+    Hash of the deal data training reads, without parsing it into pandas
+
+    For the store this covers the committed sector/geography/revenue
+    columns only, so appending other fields doesn't invalidate the cache.
+    """
+    kind, path = source
+    digest = hashlib.sha256()
+    if kind == 'store':
+        store = DealStore(path)
+        digest.update(json.dumps(store.meta['categories'], sort_keys=True).encode('utf-8'))
+        for name in ('sector', 'geography'):
+            digest.update(np.ascontiguousarray(store.codes(name)).tobytes())
+        digest.update(np.ascontiguousarray(store.column('revenue_m')).tobytes())
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return f"{kind}:{digest.hexdigest()}"
+
+
+def load_frame(source):
+    """sector/geography/revenue_m DataFrame of the deals"""
+    import pandas as pd
+
+    kind, path = source
+    if kind == 'store':
+        return DealStore(path).frame(['sector', 'geography', 'revenue_m'])
+    with open(path, 'r', encoding='utf-8') as f:
+        return pd.DataFrame(json.load(f))
+
+
+def build_features(df):
+    """
+    Feature matrix, targets and encoder classes from a deals DataFrame
+
+    Targets are the sector multiple times the geography adjustment, with
+    seeded +/-20% variation.
+    """
+    base_multiple = df['sector'].map(SECTOR_MULTIPLES).fillna(1.5)
+    geo_adjustment = df['geography'].map(GEO_ADJUSTMENTS).fillna(1.0)
+    revenue_multiple = base_multiple * geo_adjustment
+    revenue_multiple *= np.random.RandomState(42).uniform(0.8, 1.2, len(df))
+
+    le_sector = LabelEncoder()
+    le_geography = LabelEncoder()
+    X = np.column_stack([
+        le_sector.fit_transform(df['sector'].fillna('Other')),
+        le_geography.fit_transform(df['geography'].fillna('Global')),
+        df['revenue_m'].fillna(DEFAULT_REVENUE).to_numpy(dtype=np.float64)
+    ]).astype(np.float64)
+    return {
+        'X': X,
+        'y': revenue_multiple.to_numpy(dtype=np.float64),
+        'sector_classes': list(le_sector.classes_),
+        'geography_classes': list(le_geography.classes_)
+    }
+
+
+def load_features(source, cache_dir=CACHE_DIR, use_cache=True):
+    """(features, data hash, cache hit); rebuilds only when the data hash changes"""
+    hashed = data_hash(source)
+    key = _digest({'data': hashed, 'features': FEATURE_VERSION})
+    path = os.path.join(cache_dir, f'features-{key[:16]}.npz')
+    if use_cache and os.path.exists(path):
+        with np.load(path, allow_pickle=False) as cached:
+            return {
+                'X': cached['X'],
+                'y': cached['y'],
+                'sector_classes': cached['sector_classes'].tolist(),
+                'geography_classes': cached['geography_classes'].tolist()
+            }, hashed, True
+
+    features = build_features(load_frame(source))
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{path}.tmp-{os.getpid()}.npz'
+        np.savez(tmp, X=features['X'], y=features['y'],
+                 sector_classes=np.array(features['sector_classes'], dtype=str),
+                 geography_classes=np.array(features['geography_classes'], dtype=str))
+        os.replace(tmp, path)
+    return features, hashed, False
+
+
+def param_grid(grid):
+    """Every combination of the grid's values, in a stable order"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def kfold_indices(n, folds, seed):
+    """[(train, test)] index arrays of a shuffled k-fold split"""
+    order = np.random.RandomState(seed).permutation(n)
+    return [(np.concatenate([part for j, part in enumerate(parts) if j != i]), test)
+            for parts in [np.array_split(order, folds)]
+            for i, test in enumerate(parts)]
+
+
+def fold_metrics(y_true, y_pred):
+    error = y_pred - y_true
+    variance = float(np.var(y_true)) * len(y_true)
+    return {
+        'rmse': float(np.sqrt(np.mean(error ** 2))),
+        'mae': float(np.mean(np.abs(error))),
+        # Undefined on single-row or constant folds
+        'r2': 1 - float(np.sum(error ** 2)) / variance if len(y_true) > 1 and variance > 0 else None
+    }
+
+
+_X = _y = None
+
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def _fit_fold(trial, fold, params, train, test, seed):
+    started = time.perf_counter()
+    model = RandomForestRegressor(**params, random_state=seed)
+    model.fit(_X[train], _y[train])
+    metrics = fold_metrics(_y[test], model.predict(_X[test]))
+    metrics['seconds'] = time.perf_counter() - started
+    return trial, fold, metrics
+
+
+def _summarize(trial, params, folds):
+    summary = {'trial': trial, 'params': params, 'folds': folds}
+    for name in ('rmse', 'mae', 'r2'):
+        values = [fold[name] for fold in folds if fold[name] is not None]
+        summary[f'{name}_mean'] = float(np.mean(values)) if values else None
+        summary[f'{name}_std'] = float(np.std(values)) if values else None
+    summary['fit_seconds'] = sum(fold['seconds'] for fold in folds)
+    return summary
+
+
+def cross_validate(features, config, workers=None, log=None):
+    """
+    Score every grid point by k-fold CV; returns trial summaries, best first
+
+    Each (trial, fold) fit is a separate task on a pool of `workers`
+    processes (default: all cores), which get X/y once at start-up.
+    log(summary) is called as each trial finishes.
+    """
+    X, y = features['X'], features['y']
+    folds = min(config['folds'], len(y))
+    if folds < 2:
+        raise ValueError(f"Cross-validation needs at least 2 deals, got {len(y)}")
+    splits = kfold_indices(len(y), folds, config['seed'])
+    trials = param_grid(config['grid'])
+    workers = workers or os.cpu_count() or 1
+
+    pending = {trial: [None] * folds for trial in range(len(trials))}
+    summaries = []
+
+    def finish(trial, fold, metrics):
+        pending[trial][fold] = metrics
+        if all(pending[trial]):
+            summary = _summarize(trial, trials[trial], pending.pop(trial))
+            summaries.append(summary)
+            if log:
+                log(summary)
+
+    tasks = [(trial, fold, params, train, test, config['seed'])
+             for trial, params in enumerate(trials)
+             for fold, (train, test) in enumerate(splits)]
+    if workers == 1:
+        _init_worker(X, y)
+        for task in tasks:
+            finish(*_fit_fold(*task))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(X, y)) as pool:
+            for future in as_completed([pool.submit(_fit_fold, *task) for task in tasks]):
+                finish(*future.result())
+
+    return sorted(summaries, key=lambda s: (s['rmse_mean'], s['trial']))
+
+
+def _frame(X):
+    import pandas as pd
+
+    return pd.DataFrame(X, columns=FEATURE_COLUMNS)
+
+
+def fit_final(features, params, seed):
+    """The winning configuration refit on every deal"""
+    model = RandomForestRegressor(**params, random_state=seed)
+    model.fit(_frame(features['X']), features['y'])
+    return model
+
+
+def _write_json(path, payload):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def rows_hash(X, y):
+    """Fingerprint of the training rows, to check a refresh only appends"""
+    digest = hashlib.sha256(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def current_metrics(model_dir=MODEL_DIR):
+    """Metrics of the model in model_dir, or None"""
+    path = os.path.join(model_dir, METRICS_FILE)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(model_dir, MODEL_FILE)):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_artifacts(model, features, metrics, model_dir=MODEL_DIR):
+    """
+    Model, encoders, metrics and the single-file bundle api/ml_engine.py
+    hot-swaps, plus a copy under versions/v<version> when metrics has a version
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(model_dir, MODEL_FILE))
+    for field in ('sector', 'geography'):
+        classes = features[f'{field}_classes']
+        encoder = LabelEncoder()
+        encoder.classes_ = np.array(classes, dtype=object)
+        joblib.dump(encoder, os.path.join(model_dir, f'{field}_encoder.pkl'))
+        # Same codes as the LabelEncoders, plus alias normalization and an unknown code
+        CategoryEncoder(field, classes).save(os.path.join(model_dir, f'{field}_category_encoder.json'))
+    _write_json(os.path.join(model_dir, METRICS_FILE), metrics)
+    # Written last: a running API picks the new version up as soon as it lands
+    ModelBundle.write(os.path.join(model_dir, BUNDLE_FILE), FlatForest.from_sklearn(model),
+                      features['sector_classes'], features['geography_classes'],
+                      metadata=metadata_from_metrics(metrics))
+    if metrics.get('version'):
+        version_dir = os.path.join(model_dir, VERSIONS_DIR, f"v{metrics['version']:04d}")
+        os.makedirs(version_dir, exist_ok=True)
+        for name in (MODEL_FILE, METRICS_FILE, BUNDLE_FILE,
+                     'sector_category_encoder.json', 'geography_category_encoder.json'):
+            shutil.copy2(os.path.join(model_dir, name), os.path.join(version_dir, name))
+
+
+def run(source=None, config=None, model_dir=MODEL_DIR, cache_dir=CACHE_DIR, runs_dir=RUNS_DIR,
+        workers=None, use_cache=True, force=False, echo=print):
+    """
+    Train and save the model; returns its metrics dict
+
+    Cached per (data hash, config, sklearn version): the CV search results
+    and the refit winner. With a full hit and matching artifacts already in
+    model_dir nothing is written (unless force).
+    """
+    started = time.perf_counter()
+    source = source or data_source()
+    config = config or load_config()
+    features, hashed, features_hit = load_features(source, cache_dir, use_cache)
+    echo(f"✓ {len(features['y'])} deals from {source[1]} "
+         f"({'feature cache hit' if features_hit else 'features built'})")
+
+    search_key = _digest({'data': hashed, 'features': FEATURE_VERSION, 'config': config,
+                          'sklearn': sklearn.__version__})[:16]
+    search_path = os.path.join(cache_dir, f'search-{search_key}.json')
+    model_path = os.path.join(cache_dir, f'model-{search_key}.pkl')
+
+    current = current_metrics(model_dir) if use_cache and not force else None
+    if current and current.get('search_key') == search_key:
+        echo(f"✓ Cache hit: {model_dir} already holds the model for this data and config")
+        return {**current, 'cache_hit': True}
+
+    if use_cache and os.path.exists(search_path) and os.path.exists(model_path):
+        with open(search_path, encoding='utf-8') as f:
+            metrics = json.load(f)
+        model = joblib.load(model_path)
+        echo(f"✓ Search cache hit ({metrics['trials']} trials)")
+    else:
+        run_dir = os.path.join(runs_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{search_key[:8]}")
+        os.makedirs(run_dir, exist_ok=True)
+        trials_path = os.path.join(run_dir, 'trials.jsonl')
+        n_trials = len(param_grid(config['grid']))
+        echo(f"\n🔎 {n_trials} trials x {min(config['folds'], len(features['y']))} folds "
+             f"on {workers or os.cpu_count() or 1} worker(s), logging to {trials_path}")
+
+        with open(trials_path, 'w', encoding='utf-8') as trial_log:
+            def log(summary):
+                trial_log.write(json.dumps(summary) + '\n')
+                trial_log.flush()
+                echo(f"   trial {summary['trial']:>3}: RMSE {summary['rmse_mean']:.4f} "
+                     f"± {summary['rmse_std']:.4f}  {json.dumps(summary['params'])}")
+
+            search_started = time.perf_counter()
+            summaries = cross_validate(features, config, workers, log)
+            search_seconds = time.perf_counter() - search_started
+
+        best = summaries[0]
+        model = fit_final(features, best['params'], config['seed'])
+        train_error = fold_metrics(features['y'], model.predict(_frame(features['X'])))
+        metrics = {
+            'search_key': search_key,
+            'data_hash': hashed,
+            'samples': int(len(features['y'])),
+            'config': config,
+            'trials': len(summaries),
+            'params': best['params'],
+            'cv': {name: best[name] for name in ('rmse_mean', 'rmse_std', 'mae_mean', 'mae_std',
+                                                 'r2_mean', 'r2_std')},
+            'train': train_error,
+            'search_seconds': round(search_seconds, 3),
+            'sklearn': sklearn.__version__,
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'run_dir': run_dir
+        }
+        _write_json(os.path.join(run_dir, 'summary.json'), {**metrics, 'ranking': [
+            {key: s[key] for key in ('trial', 'params', 'rmse_mean', 'mae_mean', 'r2_mean')} for s in summaries
+        ]})
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            joblib.dump(model, f'{model_path}.tmp')
+            os.replace(f'{model_path}.tmp', model_path)
+            _write_json(search_path, metrics)
+        echo(f"\n🏆 Trial {best['trial']}: {json.dumps(best['params'])} "
+             f"(CV RMSE {best['rmse_mean']:.4f}, {search_seconds:.1f}s search)")
+
+    previous = current_metrics(model_dir) or {}
+    metrics = {
+        **metrics,
+        'version': previous.get('version', 0) + 1,
+        'base_version': previous.get('version', 0) + 1,
+        'rows': int(len(features['y'])),
+        'rows_hash': rows_hash(features['X'], features['y']),
+        'refreshed_trees': 0,
+        'pending_unknown': 0
+    }
+    save_artifacts(model, features, metrics, model_dir)
+    echo(f"✓ Model v{metrics['version']} and metrics saved to {model_dir}/ "
+         f"({time.perf_counter() - started:.1f}s)")
+    return {**metrics, 'cache_hit': False}
+
+
+def _model_codes(features, sector_classes, geography_classes):
+    """features['X'] re-encoded with a model's classes; -1 where unseen"""
+    X = features['X'].copy()
+    for column, field, classes in ((0, 'sector', sector_classes), (1, 'geography', geography_classes)):
+        index = {label: code for code, label in enumerate(classes)}
+        remap = np.array([index.get(label, -1) for label in features[f'{field}_classes']], dtype=np.float64)
+        X[:, column] = remap[X[:, column].astype(np.intp)]
+    return X
+
+
+def drift_report(model, params, seed, X, y, threshold=DRIFT_THRESHOLD):
+    """
+    Compare a refreshed model against a full retrain with the same params
+
+    rmse_drift is the refreshed model's RMSE over the full retrain's, minus
+    one, both measured on every deal.
+    """
+    started = time.perf_counter()
+    reference = RandomForestRegressor(**params, random_state=seed).fit(_frame(X), y)
+    reference_seconds = time.perf_counter() - started
+    refreshed_pred = model.predict(_frame(X))
+    reference_pred = reference.predict(_frame(X))
+    refreshed, full = fold_metrics(y, refreshed_pred), fold_metrics(y, reference_pred)
+    rmse_drift = refreshed['rmse'] / max(full['rmse'], 1e-9) - 1
+    return {
+        'refreshed': refreshed,
+        'full_retrain': full,
+        'rmse_drift': rmse_drift,
+        'mean_prediction_gap': float(np.mean(np.abs(refreshed_pred - reference_pred))),
+        'threshold': threshold,
+        'rebuild_recommended': rmse_drift > threshold,
+        'full_retrain_seconds': round(reference_seconds, 3)
+    }
+
+
+def refresh(source=None, model_dir=MODEL_DIR, cache_dir=CACHE_DIR, trees=REFRESH_TREES, max_trees=MAX_TREES,
+            drift=True, drift_threshold=DRIFT_THRESHOLD, use_cache=True, echo=print):
+    """
+    Grow the current model with trees fitted on the deals appended since it
+    was trained, and save the result as the next version
+
+    The oldest trees are retired once the forest exceeds max_trees. New
+    deals with a sector/geography the model has no code for are skipped
+    (counted as pending_unknown) until the next full training. The drift
+    report is computed after the new version is saved.
+    """
+    started = time.perf_counter()
+    source = source or data_source()
+    current = current_metrics(model_dir)
+    if not current or 'rows_hash' not in current:
+        raise ValueError(f"No versioned model in {model_dir}; run a full training first")
+    classes = {f'{field}_classes': CategoryEncoder.load(
+        os.path.join(model_dir, f'{field}_category_encoder.json')).classes for field in ('sector', 'geography')}
+
+    features, hashed, _ = load_features(source, cache_dir, use_cache)
+    X = _model_codes(features, classes['sector_classes'], classes['geography_classes'])
+    y = features['y']
+    rows = current['rows']
+    if len(y) < rows or rows_hash(X[:rows], y[:rows]) != current['rows_hash']:
+        raise ValueError(f"The {rows} deals behind v{current['version']} have changed; "
+                         f"run a full training instead of a refresh")
+    known = (X[:, :2] >= 0).all(axis=1)
+    new_known = known[rows:]
+    X_new, y_new = X[rows:][new_known], y[rows:][new_known]
+    skipped = int((~new_known).sum())
+    echo(f"✓ {len(y) - rows} new deals since v{current['version']} "
+         f"({skipped} with unseen categories, left for a full training)")
+    if not len(y_new):
+        return {**current, 'refreshed': False}
+
+    model = joblib.load(os.path.join(model_dir, MODEL_FILE))
+    previous_on_new = fold_metrics(y_new, model.predict(_frame(X_new)))
+    version = current['version'] + 1
+    fit_started = time.perf_counter()
+    # A per-version seed keeps new trees from repeating retired ones' draws
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + trees,
+                     random_state=current['config']['seed'] + version)
+    model.fit(_frame(X_new), y_new)
+    retired = max(0, len(model.estimators_) - max_trees)
+    del model.estimators_[:retired]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+    fit_seconds = time.perf_counter() - fit_started
+
+    metrics = {
+        **current,
+        'search_key': None,
+        'data_hash': hashed,
+        'samples': int(len(y)),
+        'version': version,
+        'rows': int(len(y)),
+        'rows_hash': rows_hash(X, y),
+        'refreshed_trees': min(current.get('refreshed_trees', 0) + trees, len(model.estimators_)),
+        'pending_unknown': current.get('pending_unknown', 0) + skipped,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'refresh': {
+            'parent_version': current['version'],
+            'new_rows': int(len(y_new)),
+            'skipped_unknown': skipped,
+            'trees_added': trees,
+            'trees_retired': retired,
+            'trees': len(model.estimators_),
+            'previous_on_new': previous_on_new,
+            'refreshed_on_new': fold_metrics(y_new, model.predict(_frame(X_new))),
+            'fit_seconds': round(fit_seconds, 3)
+        }
+    }
+    metrics.pop('drift', None)
+    save_artifacts(model, classes, metrics, model_dir)
+    echo(f"✓ Model v{version} saved to {model_dir}/: +{trees} trees on {len(y_new)} deals, "
+         f"{retired} retired, {len(model.estimators_)} total ({time.perf_counter() - started:.2f}s)")
+
+    if drift:
+        report = drift_report(model, current['params'], current['config']['seed'],
+                              X[known], y[known], drift_threshold)
+        reasons = [f"RMSE {report['rmse_drift']:+.1%} vs full retrain"] if report['rebuild_recommended'] else []
+        if metrics['pending_unknown']:
+            reasons.append(f"{metrics['pending_unknown']} deals with unseen categories")
+        report.update({'rebuild_recommended': bool(reasons), 'rebuild_reasons': reasons})
+        metrics['drift'] = report
+        _write_json(os.path.join(model_dir, METRICS_FILE), metrics)
+        _write_json(os.path.join(model_dir, VERSIONS_DIR, f'v{version:04d}', METRICS_FILE), metrics)
+        echo(f"📉 Drift vs full retrain: RMSE {report['refreshed']['rmse']:.4f} vs "
+             f"{report['full_retrain']['rmse']:.4f} ({report['rmse_drift']:+.1%}), "
+             f"mean prediction gap {report['mean_prediction_gap']:.4f}")
+        if report['rebuild_recommended']:
+            echo(f"⚠️  Full rebuild recommended ({'; '.join(reasons)}): python ml/train_valuation_model.py")
+    return {**metrics, 'refreshed': True}
@@ -0,0 +1,230 @@
+"""
+Offline batch scorer for JSONL/CSV files
+Scores rows with the same valuation functions as the API, fanning chunks out
+across a process pool and writing results in input order.
+
+    python scripts/batch_score.py deals.jsonl -o scored.jsonl --workers 8
+    cat deals.csv | python scripts/batch_score.py - --format csv -o scored.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import ml_engine
+from api.valuation import predict_batch
+
+CSV_COLUMNS = [
+    'row', 'sector', 'geography', 'revenue_m', 'engine', 'revenue_multiple',
+    'multiple_low', 'multiple_high', 'enterprise_value_m', 'ev_low', 'ev_high',
+    'confidence', 'fallback', 'error'
+]
+
+
+def detect_format(path, explicit):
+    if explicit:
+        return explicit
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_chunks(stream, fmt, chunk_size, skip_rows=0):
+    """Yield (first_row_number, rows) chunks; rows are raw lines (jsonl) or dicts (csv)"""
+    if fmt == 'csv':
+        rows = csv.DictReader(stream)
+    else:
+        rows = (line for line in stream if line.strip())
+    for _ in islice(rows, skip_rows):
+        pass
+    start = skip_rows
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _parse_row(row):
+    """Return (sector, geography, revenue, error) for a raw JSONL line or CSV dict"""
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError as e:
+            return None, None, None, str(e)
+        if not isinstance(row, dict):
+            return None, None, None, 'Each line must be a JSON object'
+    if not row:
+        return None, None, None, 'No JSON data provided'
+    return row.get('sector', 'Other'), row.get('geography', 'Global'), row.get('revenue', 0), None
+
+
+def score_chunk(args):
+    """Worker: score one chunk and return it serialized in the output format"""
+    start, rows, engine, out_fmt = args
+    parsed = [_parse_row(row) for row in rows]
+    ok = [i for i, p in enumerate(parsed) if p[3] is None]
+    sectors = [parsed[i][0] for i in ok]
+    geographies = [parsed[i][1] for i in ok]
+    revenues = [parsed[i][2] for i in ok]
+    if engine == 'ml' and ml_engine.ENGINE is not None:
+        scored = ml_engine.ENGINE.predict_batch(sectors, geographies, revenues)
+    else:
+        scored = predict_batch(sectors, geographies, revenues)
+
+    results = [{'success': False, 'error': p[3]} for p in parsed]
+    for i, result in zip(ok, scored):
+        results[i] = result
+
+    if out_fmt == 'jsonl':
+        return len(rows), ''.join(
+            json.dumps({'row': start + i, **result}) + '\n' for i, result in enumerate(results)
+        ).encode('utf-8')
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, result in enumerate(results):
+        if not result['success']:
+            writer.writerow([start + i] + [''] * (len(CSV_COLUMNS) - 2) + [result['error']])
+            continue
+        inputs, predictions = result['inputs'], result['predictions']
+        writer.writerow([
+            start + i, inputs['sector'], inputs['geography'], inputs['revenue_m'], result['engine'],
+            predictions['revenue_multiple'], predictions['multiple_range']['low'],
+            predictions['multiple_range']['high'], predictions['enterprise_value_m'],
+            predictions['ev_range']['low'], predictions['ev_range']['high'],
+            predictions['confidence'], result.get('fallback', ''), ''
+        ])
+    return len(rows), buffer.getvalue().encode('utf-8')
+
+
+def ordered_results(pool, tasks, window):
+    """Run tasks on the pool in input order, keeping at most `window` chunks in flight"""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(score_chunk, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def input_identity(path, engine, out_fmt):
+    """
+    What a checkpoint was taken against, so --resume can refuse a
+    different or edited input (stdin can only be matched by name)
+    """
+    identity = {'input': path, 'engine': engine, 'output_format': out_fmt}
+    if path != '-':
+        stat = os.stat(path)
+        identity.update(input=os.path.abspath(path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    return identity
+
+
+def save_checkpoint(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score JSONL/CSV deals offline with the valuation rules or model')
+    parser.add_argument('input', help="input file, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output file, or '-' for stdout (default)")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='input format (default: from extension)')
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'), help='output format (default: from extension)')
+    parser.add_argument('--engine', choices=('rules', 'ml'), default='rules')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <output>.ckpt when writing to a file)')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint')
+    parser.add_argument('--quiet', action='store_true', help='no progress output')
+    args = parser.parse_args(argv)
+
+    in_fmt = detect_format(args.input, args.format)
+    out_fmt = detect_format(args.output, args.output_format)
+    checkpoint = args.checkpoint or (args.output + '.ckpt' if args.output != '-' else None)
+    if args.resume and (args.output == '-' or not checkpoint):
+        parser.error('--resume needs an output file')
+
+    skip_rows, offset = 0, 0
+    identity = input_identity(args.input, args.engine, out_fmt)
+    state = load_checkpoint(checkpoint) if args.resume else None
+    if state:
+        if state.get('identity') != identity:
+            parser.error(f"{args.input} or --engine/--output-format changed since {checkpoint} was written; "
+                         f"rerun without --resume")
+        skip_rows, offset = state['rows'], state['output_bytes']
+
+    # Load once before the pool forks so workers share the model
+    if args.engine == 'ml' and ml_engine.load_engine() is None:
+        print(f"⚠️ ML model not loaded, scoring with rules: {ml_engine.BOOT_STATS.get('error')}", file=sys.stderr)
+
+    source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    if args.output == '-':
+        sink = sys.stdout.buffer
+    else:
+        # Drop anything written after the last checkpoint
+        sink = open(args.output, 'r+b' if state else 'wb')
+        sink.seek(offset)
+        sink.truncate()
+    if out_fmt == 'csv' and not state:
+        sink.write((','.join(CSV_COLUMNS) + '\r\n').encode('utf-8'))
+
+    tasks = ((start, rows, args.engine, out_fmt)
+             for start, rows in read_chunks(source, in_fmt, args.chunk_size, skip_rows))
+    pool = multiprocessing.Pool(args.workers) if args.workers > 1 else None
+    # Bounded window instead of imap, which would read the whole input ahead
+    results = ordered_results(pool, tasks, args.workers * 2) if pool else map(score_chunk, tasks)
+
+    done, started, last_report = skip_rows, time.perf_counter(), 0.0
+    try:
+        for n, data in results:
+            sink.write(data)
+            done += n
+            if checkpoint and args.output != '-':
+                sink.flush()
+                save_checkpoint(checkpoint, {'rows': done, 'output_bytes': sink.tell(), 'identity': identity})
+            elapsed = time.perf_counter() - started
+            if not args.quiet and elapsed - last_report >= 1:
+                last_report = elapsed
+                print(f"  {done:,} rows  {(done - skip_rows) / elapsed:,.0f} rows/s", file=sys.stderr)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if sink is not sys.stdout.buffer:
+            sink.close()
+        else:
+            sink.flush()
+        if source is not sys.stdin:
+            source.close()
+
+    elapsed = time.perf_counter() - started
+    if not args.quiet:
+        scored = done - skip_rows
+        print(f"✓ Scored {scored:,} rows in {elapsed:.2f}s "
+              f"({scored / elapsed if elapsed else 0:,.0f} rows/s, {args.workers} workers)", file=sys.stderr)
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+if __name__ == '__main__':
+    main()
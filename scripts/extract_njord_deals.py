@@ -2,35 +2,49 @@
 Extract structured deal data from Njord notes PDF
 """
 
-import PyPDF2
-import re
+import argparse
+import hashlib
+import itertools
 import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import textwrap
+import time
+from collections import deque
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # ============================================
 # CONFIGURATION - UPDATE THESE VALUES
 # ============================================
-SUPABASE_URL = "YOUR_SUPABASE_URL_HERE"
-SUPABASE_KEY = "YOUR_SUPABASE_SERVICE_KEY_HERE"
+SUPABASE_URL = os.environ.get('SUPABASE_URL', "YOUR_SUPABASE_URL_HERE")
+SUPABASE_KEY = os.environ.get('SUPABASE_KEY', "YOUR_SUPABASE_SERVICE_KEY_HERE")
+SUPABASE_ORG_ID = os.environ.get('SUPABASE_ORG_ID', "YOUR_ORG_ID_HERE")
 PDF_PATH = r"C:\Users\Univisionz Win5\Desktop\Company Projects\Extra Files\Aria\Machine learning based on notes\test_deals.txt"
 
-# ============================================
-# TRY TO IMPORT SUPABASE (optional for now)
-# ============================================
-try:
-    from supabase import create_client, Client
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    SUPABASE_ENABLED = True
-except Exception as e:
-    print(f"⚠️ Supabase not connected: {e}")
-    print("Will save to JSON file instead.\n")
-    SUPABASE_ENABLED = False
+# Rows go through scripts/supabase_loader.py (batched PostgREST upserts), so
+# the only requirement is a real project URL
+SUPABASE_ENABLED = SUPABASE_URL.startswith('http')
 
 # ============================================
 # EXTRACTION FUNCTIONS
 # ============================================
 
 
+PAGE_MARKER = re.compile(r'--- PAGE \d+ ---')
+
+def _pdf_page_texts(pdf_path: str):
+    """Yield the text of each PDF page (possibly empty), one page at a time"""
+    # Imported here so parse_deals works without PyPDF2
+    import PyPDF2
+    with open(pdf_path, 'rb') as file:
+        for page in PyPDF2.PdfReader(file).pages:
+            yield page.extract_text()
+
 def extract_pdf_text(pdf_path: str) -> str:
     """Extract text from file (PDF or TXT)"""
     try:
@@ -40,58 +54,122 @@ def extract_pdf_text(pdf_path: str) -> str:
                 return file.read()
         
         # Otherwise try PDF
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for i, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"\n--- PAGE {i+1} ---\n"
-                    text += page_text
-            return text
+        return ''.join(
+            f"\n--- PAGE {i+1} ---\n{page_text}"
+            for i, page_text in enumerate(_pdf_page_texts(pdf_path)) if page_text
+        )
     except FileNotFoundError:
         print(f"❌ File not found at: {pdf_path}")
         return ""
 
-def detect_sector(text: str) -> str:
-    """Detect sector from keywords"""
-    text_lower = text.lower()
+def iter_pages(pdf_path: str):
+    """
+    Yield (page_num, section) one page at a time, numbered like parse_deals
     
-    if re.search(r'\b(?:steel|metal|commodity|trading)\b', text_lower):
-        return 'Trading/Commodities'
-    elif re.search(r'\b(?:cannabis|pharma|medical|healthcare|cbd)\b', text_lower):
-        return 'Cannabis/Healthcare'
-    elif re.search(r'\b(?:construction|contractor|real estate|housing|property|cntnr)\b', text_lower):
-        return 'Construction/Real Estate'
-    elif re.search(r'\b(?:energy|oil|gas|lng|power|renewable|solar)\b', text_lower):
-        return 'Energy'
-    elif re.search(r'\b(?:mining|gold|ore|processing|extraction|inca)\b', text_lower):
-        return 'Mining/Resources'
-    elif re.search(r'\b(?:tech|software|ai|computer|data|fintech|saas)\b', text_lower):
-        return 'Technology'
-    elif re.search(r'\b(?:gaming|esports|entertainment)\b', text_lower):
-        return 'Gaming/Entertainment'
-    elif re.search(r'\b(?:manufacturing|industrial|production|paper)\b', text_lower):
-        return 'Manufacturing'
-    else:
-        return 'Other'
+    Equivalent to re-splitting extract_pdf_text() on the page markers, but
+    only the current page is ever held in memory.
+    """
+    if not pdf_path.endswith('.txt'):
+        yield 0, ''
+        page_texts = (page_text for page_text in _pdf_page_texts(pdf_path) if page_text)
+        for page_num, page_text in enumerate(page_texts, start=1):
+            yield page_num, page_text
+        return
+    
+    with open(pdf_path, 'r', encoding='utf-8') as file:
+        page_num, current = 0, []
+        for line in file:
+            # Markers never span lines, so splitting each line matches re.split on the whole text
+            parts = PAGE_MARKER.split(line)
+            current.append(parts[0])
+            for part in parts[1:]:
+                yield page_num, ''.join(current)
+                page_num, current = page_num + 1, [part]
+        yield page_num, ''.join(current)
 
-def detect_geography(text: str) -> str:
-    """Detect primary geography"""
+# Keyword categories in priority order: the first category with a hit wins
+SECTOR_KEYWORDS = [
+    ('Trading/Commodities', ['steel', 'metal', 'commodity', 'trading']),
+    ('Cannabis/Healthcare', ['cannabis', 'pharma', 'medical', 'healthcare', 'cbd']),
+    ('Construction/Real Estate', ['construction', 'contractor', 'real estate', 'housing', 'property', 'cntnr']),
+    ('Energy', ['energy', 'oil', 'gas', 'lng', 'power', 'renewable', 'solar']),
+    ('Mining/Resources', ['mining', 'gold', 'ore', 'processing', 'extraction', 'inca']),
+    ('Technology', ['tech', 'software', 'ai', 'computer', 'data', 'fintech', 'saas']),
+    ('Gaming/Entertainment', ['gaming', 'esports', 'entertainment']),
+    ('Manufacturing', ['manufacturing', 'industrial', 'production', 'paper']),
+]
+
+GEOGRAPHY_KEYWORDS = [
+    ('Europe', ['sweden', 'norway', 'denmark', 'portugal', 'france', 'uk', 'spain', 'germany', 'europe']),
+    ('North America', ['usa', 'canada', 'united states', 'american', 'nasdaq']),
+    ('South America', ['brazil', 'peru', 'colombia', 'chile', 'latin']),
+    ('Africa', ['ghana', 'nigeria', 'angola', 'mozambique', 'south africa', 'africa']),
+    ('Middle East', ['dubai', 'saudi', 'uae', 'middle east']),
+]
+
+def _index_keywords(fields):
+    """Single-word keywords by word, plus a pattern for the multi-word ones"""
+    words, phrases, first_words = {}, {}, set()
+    for field, categories in fields:
+        for label, keywords in categories:
+            for keyword in keywords:
+                if ' ' in keyword:
+                    phrases.setdefault(keyword, []).append((field, label))
+                    first_words.add(keyword.split(' ')[0])
+                else:
+                    words.setdefault(keyword, []).append((field, label))
+    phrase_pattern = re.compile(r'\b(?:' + '|'.join(re.escape(k) for k in phrases) + r')\b')
+    return words, phrases, first_words, phrase_pattern
+
+# \w+ tokens sit exactly between the \b boundaries the original searches used
+WORD = re.compile(r'\w+')
+KEYWORD_WORDS, KEYWORD_PHRASES, PHRASE_FIRST_WORDS, PHRASE_SCANNER = _index_keywords(
+    [('sector', SECTOR_KEYWORDS), ('geography', GEOGRAPHY_KEYWORDS)]
+)
+
+def scan_keywords(text: str) -> dict:
+    """
+    Keyword hit counts per sector and geography category, in one pass
+    
+    Every keyword occurrence counts, including one inside a multi-word
+    keyword ("south africa" is two Africa hits).
+    """
+    hits = {'sector': {}, 'geography': {}}
     text_lower = text.lower()
+    tokens = WORD.findall(text_lower)
+    for token in tokens:
+        for field, label in KEYWORD_WORDS.get(token, ()):
+            hits[field][label] = hits[field].get(label, 0) + 1
+    if not PHRASE_FIRST_WORDS.isdisjoint(tokens):
+        for match in PHRASE_SCANNER.finditer(text_lower):
+            for field, label in KEYWORD_PHRASES[match.group(0)]:
+                hits[field][label] = hits[field].get(label, 0) + 1
+    return hits
+
+def pick_label(hits: dict, categories: list, default: str, dominant: bool = False) -> str:
+    """
+    Label from scan_keywords() counts
     
-    if re.search(r'\b(?:sweden|norway|denmark|portugal|france|uk|spain|germany|europe)\b', text_lower):
-        return 'Europe'
-    elif re.search(r'\b(?:usa|canada|united states|american|nasdaq)\b', text_lower):
-        return 'North America'
-    elif re.search(r'\b(?:brazil|peru|colombia|chile|latin)\b', text_lower):
-        return 'South America'
-    elif re.search(r'\b(?:ghana|nigeria|angola|mozambique|south africa|africa)\b', text_lower):
-        return 'Africa'
-    elif re.search(r'\b(?:dubai|saudi|uae|middle east)\b', text_lower):
-        return 'Middle East'
-    else:
-        return 'Global'
+    By default the first category in priority order with any hit wins (the
+    original rule); dominant=True picks the category with the most hits,
+    ties going to the higher-priority one.
+    """
+    best, best_hits = default, 0
+    for label, _ in categories:
+        count = hits.get(label, 0)
+        if count > best_hits:
+            best, best_hits = label, count
+            if not dominant:
+                break
+    return best
+
+def detect_sector(text: str, dominant: bool = False) -> str:
+    """Detect sector from keywords"""
+    return pick_label(scan_keywords(text)['sector'], SECTOR_KEYWORDS, 'Other', dominant)
+
+def detect_geography(text: str, dominant: bool = False) -> str:
+    """Detect primary geography"""
+    return pick_label(scan_keywords(text)['geography'], GEOGRAPHY_KEYWORDS, 'Global', dominant)
 
 def bucket_revenue(revenue_m):
     """Convert revenue to bucket for privacy"""
@@ -120,83 +198,344 @@ def bucket_revenue(revenue_m):
     else:
         return '>€500M'
 
+COMPANY_PATTERNS = [re.compile(pattern) for pattern in (
+    r'^([A-Z][A-Za-z0-9\s&\.\-]+?)(?:\s{2,}|\n)',
+    r'(?:Company|Client|Deal):\s*([A-Za-z0-9\s&\.\-]+)',
+    r'(?:Call with|Meeting with|Re:)\s*([A-Za-z0-9\s&\.\-]+)',
+)]
+
+# Numeric fields and their patterns in priority order (case-insensitive)
+FIELD_PATTERNS = [
+    ('revenue_m', [
+        r'(?:Revenue|Turnover|Annual|Sales)[:\s]*[\$€]?(\d+(?:\.\d+)?)\s*(?:M|Million|MM)',
+        r'[\$€](\d+(?:\.\d+)?)\s*(?:M|Million)\s*(?:revenue|turnover)',
+        r'(\d+(?:\.\d+)?)\s*(?:M|Million)\s*(?:in revenue|annual)',
+    ]),
+    ('funding_need_m', [
+        r'(?:Looking for|Need|Seeking|Raise|Raising)[:\s]*[\$€]?(\d+(?:-\d+)?)\s*(?:M|Million)',
+        r'[\$€](\d+(?:-\d+)?)\s*(?:M|Million)\s*(?:funding|raise|loan|debt)',
+    ]),
+    ('ebitda_info', [
+        r'EBIT?DA[:\s]*(\d+(?:\.\d+)?)[%M]',
+    ]),
+]
+
+def _compile_fields(fields):
+    groups, branches = {}, []
+    for field, patterns in fields:
+        for priority, pattern in enumerate(patterns):
+            name = f"{field}_{priority}"
+            groups[name] = (field, priority)
+            branches.append(f"(?P<{name}>{pattern})")
+    # Every pattern starts with one of these characters; checking them up
+    # front lets the engine skip other positions without trying each branch
+    return re.compile(r'(?=[rtaslne$€\d])(?:' + '|'.join(branches) + ')', re.IGNORECASE), groups
+
+FIELD_SCANNER, FIELD_GROUPS = _compile_fields(FIELD_PATTERNS)
+
+def scan_fields(section: str) -> dict:
+    """
+    (matched text, captured value) per numeric field found in the section
+    
+    Same result as trying each field's patterns in order with re.search.
+    The combined pattern is searched from one past each match start, so
+    overlapping matches of different patterns are all seen in one pass.
+    """
+    first = {}
+    pos = 0
+    while True:
+        match = FIELD_SCANNER.search(section, pos)
+        if match is None:
+            break
+        first.setdefault(FIELD_GROUPS[match.lastgroup], match)
+        pos = match.start() + 1
+    
+    fields = {}
+    for field, patterns in FIELD_PATTERNS:
+        for priority in range(len(patterns)):
+            match = first.get((field, priority))
+            if match is not None:
+                name = f"{field}_{priority}"
+                fields[field] = (match.group(name), match.group(FIELD_SCANNER.groupindex[name] + 1))
+                break
+    return fields
+
+def parse_page(page_num: int, section: str):
+    """Parse one page of Njord notes into a deal, or None if it has nothing useful"""
+    section = section.strip()
+    if len(section) < 50:
+        return None
+    
+    deal = {
+        'page': page_num,
+        'company_name': None,
+        'revenue_m': None,
+        'funding_need_m': None,
+        'sector': None,
+        'geography': None,
+        'ebitda_info': None,
+        'notes_snippet': section[:500]
+    }
+    
+    # Extract company name (look for capitalized words at start or after common patterns)
+    head = section[:300]
+    for pattern in COMPANY_PATTERNS:
+        match = pattern.search(head)
+        if match:
+            name = match.group(1).strip()
+            if len(name) > 2 and len(name) < 50:
+                deal['company_name'] = name
+                break
+    
+    # Extract revenue, funding need and EBITDA in one scan
+    fields = scan_fields(section)
+    if 'revenue_m' in fields:
+        deal['revenue_m'] = float(fields['revenue_m'][1])
+    if 'funding_need_m' in fields:
+        deal['funding_need_m'] = fields['funding_need_m'][1]
+    if 'ebitda_info' in fields:
+        deal['ebitda_info'] = fields['ebitda_info'][0]
+    
+    # Detect sector and geography
+    hits = scan_keywords(section)
+    deal['sector'] = pick_label(hits['sector'], SECTOR_KEYWORDS, 'Other')
+    deal['geography'] = pick_label(hits['geography'], GEOGRAPHY_KEYWORDS, 'Global')
+    
+    # Only keep deals with some useful info
+    if deal['company_name'] or deal['revenue_m'] or deal['funding_need_m']:
+        return deal
+    return None
+
 def parse_deals(text: str) -> list:
     """Parse deals from Njord notes"""
-    deals = []
-    
     # Split by page markers
     pages = re.split(r'--- PAGE \d+ ---', text)
     
-    for page_num, section in enumerate(pages):
-        section = section.strip()
-        if len(section) < 50:
-            continue
-        
-        deal = {
-            'page': page_num,
-            'company_name': None,
-            'revenue_m': None,
-            'funding_need_m': None,
-            'sector': None,
-            'geography': None,
-            'ebitda_info': None,
-            'notes_snippet': section[:500]
-        }
-        
-        # Extract company name (look for capitalized words at start or after common patterns)
-        company_patterns = [
-            r'^([A-Z][A-Za-z0-9\s&\.\-]+?)(?:\s{2,}|\n)',
-            r'(?:Company|Client|Deal):\s*([A-Za-z0-9\s&\.\-]+)',
-            r'(?:Call with|Meeting with|Re:)\s*([A-Za-z0-9\s&\.\-]+)',
-        ]
-        
-        for pattern in company_patterns:
-            match = re.search(pattern, section[:300])
-            if match:
-                name = match.group(1).strip()
-                if len(name) > 2 and len(name) < 50:
-                    deal['company_name'] = name
-                    break
-        
-        # Extract revenue
-        revenue_patterns = [
-            r'(?:Revenue|Turnover|Annual|Sales)[:\s]*[\$€]?(\d+(?:\.\d+)?)\s*(?:M|Million|MM)',
-            r'[\$€](\d+(?:\.\d+)?)\s*(?:M|Million)\s*(?:revenue|turnover)',
-            r'(\d+(?:\.\d+)?)\s*(?:M|Million)\s*(?:in revenue|annual)',
-        ]
-        
-        for pattern in revenue_patterns:
-            match = re.search(pattern, section, re.IGNORECASE)
-            if match:
-                deal['revenue_m'] = float(match.group(1))
-                break
-        
-        # Extract funding need
-        funding_patterns = [
-            r'(?:Looking for|Need|Seeking|Raise|Raising)[:\s]*[\$€]?(\d+(?:-\d+)?)\s*(?:M|Million)',
-            r'[\$€](\d+(?:-\d+)?)\s*(?:M|Million)\s*(?:funding|raise|loan|debt)',
-        ]
-        
-        for pattern in funding_patterns:
-            match = re.search(pattern, section, re.IGNORECASE)
-            if match:
-                deal['funding_need_m'] = match.group(1)
-                break
-        
-        # Extract EBITDA
-        ebitda_match = re.search(r'EBIT?DA[:\s]*(\d+(?:\.\d+)?)[%M]', section, re.IGNORECASE)
-        if ebitda_match:
-            deal['ebitda_info'] = ebitda_match.group(0)
-        
-        # Detect sector and geography
-        deal['sector'] = detect_sector(section)
-        deal['geography'] = detect_geography(section)
-        
-        # Only keep deals with some useful info
-        if deal['company_name'] or deal['revenue_m'] or deal['funding_need_m']:
-            deals.append(deal)
+    deals = (parse_page(page_num, section) for page_num, section in enumerate(pages))
+    return [deal for deal in deals if deal]
+
+def _parse_chunk(chunk):
+    """Worker: parse a chunk of (page_num, section) pages; returns (pages, deals)"""
+    return len(chunk), [deal for deal in (parse_page(page_num, section) for page_num, section in chunk) if deal]
+
+_PDF_FILE = None
+_PDF_READER = None
+
+def _open_pdf(pdf_path):
+    """Worker initializer: each worker reads pages straight from the PDF"""
+    global _PDF_FILE, _PDF_READER
+    import PyPDF2
+    _PDF_FILE = open(pdf_path, 'rb')
+    _PDF_READER = PyPDF2.PdfReader(_PDF_FILE)
+
+def _extract_pdf_chunk(indices):
+    """Worker: extract and parse PDF pages; returns (had_text, deal) per page"""
+    results = []
+    for index in indices:
+        page_text = _PDF_READER.pages[index].extract_text()
+        results.append((bool(page_text), parse_page(0, page_text) if page_text else None))
+    return results
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _ordered(pool, fn, tasks, window):
+    """Map fn over tasks on the pool in order, with at most `window` tasks in flight"""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(fn, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def extract_deals(pdf_path: str, workers: int = None, chunk_pages: int = 32, stats: dict = None):
+    """
+    Stream deals from a PDF or TXT file in page order
+    
+    Text extraction (PDF) and per-page parsing run on a pool of `workers`
+    processes, `chunk_pages` pages per task, with a bounded number of
+    chunks in flight. Yields the same deals as
+    parse_deals(extract_pdf_text(pdf_path)). `stats['pages']` counts the
+    pages read so far.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = stats if stats is not None else {}
+    stats['pages'] = 0
+    is_pdf = not pdf_path.endswith('.txt')
+    
+    if workers == 1:
+        pool = None
+        if is_pdf:
+            chunks = ([(bool(page_text), parse_page(0, page_text) if page_text else None)]
+                      for page_text in _pdf_page_texts(pdf_path))
+        else:
+            chunks = (_parse_chunk([page]) for page in iter_pages(pdf_path))
+    elif is_pdf:
+        import PyPDF2
+        with open(pdf_path, 'rb') as file:
+            # /Count avoids flattening the whole page tree in this process
+            n_pages = int(PyPDF2.PdfReader(file).trailer['/Root']['/Pages']['/Count'])
+        pool = multiprocessing.Pool(workers, initializer=_open_pdf, initargs=(pdf_path,))
+        chunks = _ordered(pool, _extract_pdf_chunk, _batched(range(n_pages), chunk_pages), workers * 2)
+    else:
+        pool = multiprocessing.Pool(workers)
+        chunks = _ordered(pool, _parse_chunk, _batched(iter_pages(pdf_path), chunk_pages), workers * 2)
+    
+    try:
+        # PDF pages are numbered by their position among pages with text
+        page_num = 0
+        for chunk in chunks:
+            if not is_pdf:
+                n_pages, deals = chunk
+                stats['pages'] += n_pages
+                yield from deals
+                continue
+            for had_text, deal in chunk:
+                stats['pages'] += 1
+                page_num += had_text
+                if deal:
+                    deal['page'] = page_num
+                    yield deal
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+# Bump when parse_page changes in ways the pattern tables below don't capture
+PARSER_REVISION = 1
+PARSER_VERSION = f"{PARSER_REVISION}-" + hashlib.sha1(json.dumps([
+    SECTOR_KEYWORDS, GEOGRAPHY_KEYWORDS, FIELD_PATTERNS, [p.pattern for p in COMPANY_PATTERNS]
+]).encode('utf-8')).hexdigest()[:12]
+
+def page_key(content: bytes) -> str:
+    """Content hash identifying a page in the manifest"""
+    return hashlib.sha1(content).hexdigest()
+
+def _pdf_page_keys(pdf_path: str) -> list:
+    """Hash each PDF page's raw content stream, without extracting its text"""
+    import PyPDF2
+    keys = []
+    with open(pdf_path, 'rb') as file:
+        for page in PyPDF2.PdfReader(file).pages:
+            contents = page.get('/Contents')
+            contents = contents.get_object() if contents is not None else None
+            if contents is None:
+                data = b''
+            elif isinstance(contents, list):
+                data = b''.join(stream.get_object().get_data() for stream in contents)
+            else:
+                data = contents.get_data()
+            keys.append(page_key(data))
+    return keys
+
+def _txt_page_keys(pdf_path: str) -> list:
+    return [page_key(section.encode('utf-8')) for _, section in iter_pages(pdf_path)]
+
+def _parse_chunk_entries(chunk):
+    """Worker: (has_text, deal) per (page_num, section) page, like _extract_pdf_chunk"""
+    return [(True, parse_page(page_num, section)) for page_num, section in chunk]
+
+def load_manifest(manifest_path: str) -> dict:
+    """Cached page entries by page key, or {} if missing or from another parser version"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get('parser_version') != PARSER_VERSION:
+        return {}
+    return manifest.get('pages', {})
+
+def save_manifest(manifest_path: str, source: str, pages: dict):
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'parser_version': PARSER_VERSION, 'source': source, 'pages': pages}, f, ensure_ascii=False)
+    os.replace(tmp, manifest_path)
+
+def extract_deals_incremental(pdf_path: str, manifest_path: str, workers: int = None,
+                              chunk_pages: int = 32, stats: dict = None, use_cache: bool = True):
+    """
+    Stream deals for the whole document in page order, re-parsing only new
+    or changed pages
+    
+    The manifest maps each page's content hash to its parse result
+    (whether it had text, and its deal without the page number). Pages
+    whose hash is in the manifest are reused; the rest go through the same
+    worker pool as extract_deals and are merged back in as they arrive.
+    Page numbers are assigned from the current document, and once the
+    generator is exhausted the manifest is rewritten to hold exactly its
+    pages.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = stats if stats is not None else {}
+    is_pdf = not pdf_path.endswith('.txt')
+    cached = load_manifest(manifest_path) if use_cache else {}
     
-    return deals
+    keys = _pdf_page_keys(pdf_path) if is_pdf else _txt_page_keys(pdf_path)
+    missing, seen = [], set()
+    for i, key in enumerate(keys):
+        if key not in cached and key not in seen:
+            missing.append(i)
+            seen.add(key)
+    stats.update(pages=len(keys), cached=len(keys) - len(missing), parsed=len(missing))
+    
+    if is_pdf:
+        fn, tasks = _extract_pdf_chunk, _batched(missing, chunk_pages)
+    else:
+        wanted = set(missing)
+        fn = _parse_chunk_entries
+        tasks = _batched((page for page in iter_pages(pdf_path) if page[0] in wanted), chunk_pages)
+    
+    pool = None
+    results = iter(())
+    if missing:
+        if workers > 1:
+            if is_pdf:
+                pool = multiprocessing.Pool(workers, initializer=_open_pdf, initargs=(pdf_path,))
+            else:
+                pool = multiprocessing.Pool(workers)
+            results = _ordered(pool, fn, tasks, workers * 2)
+        else:
+            if is_pdf:
+                _open_pdf(pdf_path)
+            results = map(fn, tasks)
+    # Fresh parse results arrive in page order, one per missing page
+    fresh = (entry for chunk in results for entry in chunk)
+    
+    try:
+        entries = {}
+        page_num = 0
+        for i, key in enumerate(keys):
+            entry = entries.get(key) or cached.get(key)
+            if entry is None:
+                has_text, deal = next(fresh)
+                if deal:
+                    del deal['page']
+                entry = [has_text, deal]
+            entries[key] = entry
+            has_text, deal = entry
+            # PDF pages are numbered by their position among pages with text
+            page_num = page_num + has_text if is_pdf else i
+            if deal:
+                yield {'page': page_num, **deal}
+        save_manifest(manifest_path, pdf_path, entries)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+        elif missing and is_pdf:
+            _PDF_FILE.close()
+
+def peak_rss_mb():
+    """Peak RSS of this process and of the largest worker, in MB"""
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
 
 def save_to_json(deals: list, filename: str = "extracted_deals.json"):
     """Save deals to JSON file"""
@@ -204,64 +543,117 @@ def save_to_json(deals: list, filename: str = "extracted_deals.json"):
         json.dump(deals, f, indent=2, ensure_ascii=False)
     print(f"✓ Saved {len(deals)} deals to {filename}")
 
-def insert_into_supabase(deals: list):
-    """Insert parsed deals into Supabase"""
+def tee_to_json(deals, filename: str = "extracted_deals.json"):
+    """
+    Pass deals through while writing them to a JSON array file, so a
+    stream can be saved without holding it in memory
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i, deal in enumerate(deals):
+            f.write(',\n' if i else '\n')
+            f.write(textwrap.indent(json.dumps(deal, indent=2, ensure_ascii=False), '  '))
+            yield deal
+        f.write('\n]' if f.tell() > 1 else ']')
+
+def save_to_store(deals, path: str = "deal_store"):
+    """Rewrite the columnar deal store (ml/deal_store.py) from any iterable of deals"""
+    from ml.deal_store import DealStore
+    
+    written = DealStore.write(path, deals)
+    print(f"✓ Saved {written} deals to {path}/")
+    return written
+
+def deal_outcome_row(deal: dict, org_id: str) -> dict:
+    """deal_outcomes row for a parsed deal, keyed so re-loads upsert instead of duplicating"""
+    identity = [org_id, deal.get('company_name'), deal.get('revenue_m'), deal.get('funding_need_m'),
+                deal.get('notes_snippet')]
+    return {
+        'deal_key': hashlib.sha1(json.dumps(identity, ensure_ascii=False).encode('utf-8')).hexdigest(),
+        'organization_id': org_id,
+        'sector': deal.get('sector', 'Other'),
+        'target_geography': deal.get('geography', 'Global'),
+        'deal_type': 'acquisition',
+        'first_contact_date': '2020-01-01',
+        'target_revenue_range': bucket_revenue(deal.get('revenue_m')),
+        'deal_outcome': 'prospect',
+        'what_went_well': f"Company: {deal.get('company_name', 'Unknown')}",
+        'is_anonymous': True,
+        'shared_with_network': False
+    }
+
+def insert_into_supabase(deals: list, org_id: str = SUPABASE_ORG_ID, **loader_options):
+    """Upsert parsed deals into Supabase in concurrent, retried batches"""
     if not SUPABASE_ENABLED:
         print("Supabase not enabled, skipping...")
-        return
+        return None
     
-    org_id = "YOUR_ORG_ID_HERE"  # TODO: Replace
-    
-    for deal in deals:
-        outcome_data = {
-            'organization_id': org_id,
-            'sector': deal.get('sector', 'Other'),
-            'target_geography': deal.get('geography', 'Global'),
-            'deal_type': 'acquisition',
-            'first_contact_date': '2020-01-01',
-            'target_revenue_range': bucket_revenue(deal.get('revenue_m')),
-            'deal_outcome': 'prospect',
-            'what_went_well': f"Company: {deal.get('company_name', 'Unknown')}",
-            'is_anonymous': True,
-            'shared_with_network': False
-        }
-        
-        try:
-            result = supabase.table('deal_outcomes').insert(outcome_data).execute()
-            print(f"✓ Inserted: {deal.get('company_name', 'Unknown')}")
-        except Exception as e:
-            print(f"✗ Error: {e}")
+    from scripts.supabase_loader import BulkLoader
+    
+    loader = BulkLoader(SUPABASE_URL, SUPABASE_KEY, 'deal_outcomes', **loader_options)
+    stats = loader.load(deal_outcome_row(deal, org_id) for deal in deals)
+    print(f"✓ Upserted {stats['loaded_rows']}/{stats['rows']} deals in {stats['batches']} batches "
+          f"({stats['rows_per_s']:,.0f} rows/s, {stats['retries']} retries)")
+    if stats['failed_batches']:
+        print(f"✗ {stats['failed_rows']} deals failed, written to {loader.dead_letter}")
+    return stats
 
 # ============================================
 # MAIN EXECUTION
 # ============================================
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract deals from Njord notes (PDF or TXT)')
+    parser.add_argument('path', nargs='?', default=PDF_PATH)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-pages', type=int, default=32, help='pages per worker task')
+    parser.add_argument('--output', default='extracted_deals.json')
+    parser.add_argument('--manifest', help='page cache (default: <output>.manifest.json)')
+    parser.add_argument('--full', action='store_true', help='ignore the page cache and re-parse every page')
+    parser.add_argument('--store', default='deal_store', help='columnar deal store for training and the API')
+    args = parser.parse_args()
+    manifest = args.manifest or os.path.splitext(args.output)[0] + '.manifest.json'
+    
     print("=" * 50)
     print("🔍 NJORD DEAL EXTRACTOR")
     print("=" * 50)
     
-    # Extract text
-    print(f"\n📄 Reading PDF: {PDF_PATH}")
-    text = extract_pdf_text(PDF_PATH)
+    # Extract and parse page by page
+    print(f"\n📄 Reading PDF: {args.path}")
+    print(f"🔍 Parsing deals with {args.workers} worker(s)...")
+    stats = {}
+    preview = []
     
-    if not text:
-        print("\n❌ Could not read PDF. Check the path.")
-        exit(1)
+    def progress(deals):
+        """Keep the first deals for the preview and count the rest"""
+        for deal in deals:
+            if len(preview) < 10:
+                preview.append(deal)
+            yield deal
     
-    print(f"✓ Extracted {len(text):,} characters from PDF")
+    # One pass: parse, save to JSON and to the deal store as deals stream by
+    started = time.perf_counter()
+    try:
+        deals = extract_deals_incremental(args.path, manifest, args.workers, args.chunk_pages, stats,
+                                          use_cache=not args.full)
+        found = save_to_store(progress(tee_to_json(deals, args.output)), args.store)
+    except FileNotFoundError:
+        print(f"\n❌ File not found at: {args.path}")
+        exit(1)
+    elapsed = time.perf_counter() - started
     
-    # Parse deals
-    print("\n🔍 Parsing deals...")
-    deals = parse_deals(text)
-    print(f"✓ Found {len(deals)} potential deals")
+    main_rss, worker_rss = peak_rss_mb()
+    print(f"✓ Read {stats['pages']:,} pages in {elapsed:.2f}s ({stats['pages'] / elapsed:,.0f} pages/s)")
+    print(f"✓ Parsed {stats['parsed']:,} new or changed pages, reused {stats['cached']:,} from {manifest}")
+    print(f"✓ Peak RSS: {main_rss:.1f} MB main, {worker_rss:.1f} MB largest worker")
+    print(f"✓ Found {found} potential deals, saved to {args.output}")
     
     # Preview
     print("\n" + "=" * 50)
     print("📊 EXTRACTED DEALS:")
     print("=" * 50)
     
-    for i, deal in enumerate(deals[:10]):  # Show first 10
+    for i, deal in enumerate(preview):  # Show first 10
         print(f"\n{i+1}. {deal.get('company_name') or 'Unknown Company'}")
         print(f"   Page: {deal['page']}")
         print(f"   Sector: {deal['sector']}")
@@ -273,24 +665,21 @@ if __name__ == '__main__':
         if deal['ebitda_info']:
             print(f"   EBITDA: {deal['ebitda_info']}")
     
-    if len(deals) > 10:
-        print(f"\n... and {len(deals) - 10} more deals")
-    
-    # Save to JSON
-    print("\n" + "=" * 50)
-    print("💾 SAVING DATA")
-    print("=" * 50)
-    save_to_json(deals)
+    if found > 10:
+        print(f"\n... and {found - 10} more deals")
     
     # Insert to Supabase if enabled
     if SUPABASE_ENABLED:
         print("\n📤 Inserting into Supabase...")
-        insert_into_supabase(deals)
+        from ml.deal_store import DealStore
+        insert_into_supabase(DealStore(args.store).records())
+    else:
+        print("\n⚠️ Supabase not configured (set SUPABASE_URL and SUPABASE_KEY), JSON only")
     
     print("\n" + "=" * 50)
     print("✅ COMPLETE!")
     print("=" * 50)
     print("\nNext steps:")
-    print("1. Review extracted_deals.json")
+    print("1. Review extracted_deals.json (deal_store/ holds the same deals for training)")
     print("2. Update Supabase credentials if needed")
     print("3. Run train_valuation_model.py")
\ No newline at end of file
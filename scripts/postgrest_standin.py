@@ -0,0 +1,157 @@
+"""
+Local stand-in for Supabase's PostgREST upsert endpoint
+Accepts POST /rest/v1/<table>?on_conflict=<column> with a JSON array of rows
+and stores them in memory, upserting on the conflict column. Latency and
+failures are simulated so the bulk loader can be exercised offline.
+
+    python scripts/postgrest_standin.py --port 54321 --latency-ms 50 --failure-rate 0.2
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StandinServer(ThreadingHTTPServer):
+    """
+    In-memory tables plus failure injection
+
+    A failing request either returns 503 before writing anything, returns
+    503 after writing (so a retry sends rows that are already stored), or
+    drops the connection without a response.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=20.0, failure_rate=0.1, seed=None):
+        super().__init__(address, StandinHandler)
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.rows_received = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'injected_failures': self.failures,
+                'rows_received': self.rows_received,
+                'rows_stored': {table: len(rows) for table, rows in self.tables.items()}
+            }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _table(self):
+        url = urlsplit(self.path)
+        if not url.path.startswith('/rest/v1/'):
+            return None, None
+        return url.path[len('/rest/v1/'):], parse_qs(url.query)
+
+    def do_GET(self):
+        table, _ = self._table()
+        if table is None:
+            return self._reply(404, {'message': 'Not found'})
+        with self.server.lock:
+            rows = list(self.server.tables.get(table, {}).values())
+        self._reply(200, rows)
+
+    def do_POST(self):
+        server = self.server
+        table, query = self._table()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if table is None:
+            return self._reply(404, {'message': 'Not found'})
+        if not self.headers.get('apikey'):
+            return self._reply(401, {'message': 'No API key found in request'})
+        try:
+            rows = json.loads(body)
+        except ValueError as e:
+            return self._reply(400, {'message': f'Invalid JSON: {e}'})
+        if isinstance(rows, dict):
+            rows = [rows]
+        conflict = query.get('on_conflict', [None])[0]
+        if conflict and any(conflict not in row for row in rows):
+            return self._reply(400, {'message': f'Rows must include the on_conflict column "{conflict}"'})
+        if conflict and len({json.dumps(row[conflict]) for row in rows}) < len(rows):
+            # What Postgres answers when one INSERT ... ON CONFLICT hits a row twice
+            return self._reply(400, {
+                'code': '21000',
+                'message': 'ON CONFLICT DO UPDATE command cannot affect row a second time'
+            })
+
+        with server.lock:
+            server.requests += 1
+            server.rows_received += len(rows)
+            roll = server.random.random()
+            latency = server.latency * server.random.uniform(0.5, 1.5)
+        time.sleep(latency)
+
+        failing = roll < server.failure_rate
+        mode = roll / server.failure_rate if failing else None
+        if failing:
+            with server.lock:
+                server.failures += 1
+        if failing and mode < 0.2:
+            # Drop the connection without answering
+            self.close_connection = True
+            self.connection.close()
+            return
+        if failing and mode < 0.6:
+            return self._reply(503, {'message': 'Service unavailable (injected)'}, {'Retry-After': '0'})
+
+        with server.lock:
+            stored = server.tables.setdefault(table, {})
+            for row in rows:
+                key = row[conflict] if conflict else len(stored)
+                stored[key] = {**stored.get(key, {}), **row}
+        if failing:
+            # Written, but the client is told otherwise and will retry
+            return self._reply(503, {'message': 'Service unavailable after commit (injected)'})
+        self._reply(201)
+
+
+def start_standin(port=0, latency_ms=20.0, failure_rate=0.1, seed=None):
+    """Start a stand-in on 127.0.0.1 in a background thread; port 0 picks a free one"""
+    server = StandinServer(('127.0.0.1', port), latency_ms, failure_rate, seed)
+    threading.Thread(target=server.serve_forever, name='postgrest-standin', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local PostgREST stand-in with simulated latency and failures')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--failure-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = StandinServer(('127.0.0.1', args.port), args.latency_ms, args.failure_rate, args.seed)
+    print(f"🧪 PostgREST stand-in on http://127.0.0.1:{args.port} "
+          f"(latency {args.latency_ms}ms, failure rate {args.failure_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{json.dumps(server.stats())}")
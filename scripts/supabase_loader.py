@@ -0,0 +1,233 @@
+"""
+Bulk loader for Supabase (PostgREST) tables
+Upserts rows in batches over a bounded pool of concurrent requests, retrying
+transient failures with exponential backoff and writing batches that still
+fail to a dead-letter JSONL file.
+
+Upserts are idempotent on `on_conflict` (deal_key for deal_outcomes), which
+needs a unique column in the table:
+
+    alter table deal_outcomes add column deal_key text unique;
+
+    python scripts/supabase_loader.py extracted_deals.json --url $SUPABASE_URL --key $SUPABASE_KEY
+    python scripts/supabase_loader.py extracted_deals.json --standin --failure-rate 0.2
+    python scripts/supabase_loader.py --replay deal_outcomes.deadletter.jsonl --url ... --key ...
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# HTTP statuses worth retrying; other 4xx mean the batch itself is bad
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class BatchError(Exception):
+    def __init__(self, message, retryable, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class BulkLoader:
+    """Batched, concurrent, retrying upserts into one PostgREST table"""
+
+    def __init__(self, url, key, table, on_conflict='deal_key', batch_size=500, workers=4,
+                 max_retries=5, backoff_base=0.5, backoff_max=30.0, timeout=30.0, dead_letter=None):
+        self.endpoint = f"{url.rstrip('/')}/rest/v1/{table}?on_conflict={on_conflict}"
+        self.headers = {
+            'apikey': key,
+            'Authorization': f'Bearer {key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates,return=minimal'
+        }
+        self.table = table
+        self.on_conflict = on_conflict
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.dead_letter = dead_letter or f'{table}.deadletter.jsonl'
+        self._lock = threading.Lock()
+
+    def _post(self, body):
+        request = urllib.request.Request(self.endpoint, data=body, headers=self.headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            detail = e.read()[:500].decode('utf-8', 'replace')
+            retry_after = e.headers.get('Retry-After')
+            raise BatchError(f"HTTP {e.code}: {detail}", e.code in RETRY_STATUSES,
+                             float(retry_after) if retry_after and retry_after.isdigit() else None)
+        except (OSError, http.client.HTTPException) as e:
+            # URLError, timeouts, resets, SSL errors and truncated or garbled responses
+            raise BatchError(str(getattr(e, 'reason', e)) or type(e).__name__, True)
+
+    def send_batch(self, index, rows):
+        """
+        Upsert one batch; returns (index, rows, retries, error or None)
+
+        Never raises: an unexpected error fails the batch so it is
+        dead-lettered instead of aborting the whole load.
+        """
+        retries = 0
+        try:
+            body = json.dumps(rows).encode('utf-8')
+            while True:
+                try:
+                    self._post(body)
+                    return index, rows, retries, None
+                except BatchError as e:
+                    if not e.retryable or retries >= self.max_retries:
+                        return index, rows, retries, str(e)
+                    # Full jitter keeps retrying workers from stampeding together
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** retries)
+                    time.sleep(max(e.retry_after or 0, random.uniform(0, delay)))
+                    retries += 1
+        except Exception as e:
+            return index, rows, retries, f"{type(e).__name__}: {e}"
+
+    def _write_dead_letter(self, index, rows, error):
+        with self._lock, open(self.dead_letter, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'table': self.table, 'batch': index, 'error': error, 'rows': rows},
+                               ensure_ascii=False) + '\n')
+
+    def load(self, rows, progress=None):
+        """
+        Upsert rows (any iterable) and return load statistics
+
+        At most 2 * workers batches are in flight, so rows are read
+        lazily. progress(stats) is called after every finished batch.
+        Within a batch only the last row per on_conflict key is sent:
+        Postgres rejects an upsert that touches the same row twice.
+        """
+        stats = {'rows': 0, 'duplicate_rows': 0, 'batches': 0, 'loaded_rows': 0, 'failed_rows': 0,
+                 'failed_batches': 0, 'retries': 0, 'seconds': 0.0, 'rows_per_s': 0.0}
+        started = time.perf_counter()
+
+        def finish(future):
+            index, batch, retries, error = future.result()
+            stats['batches'] += 1
+            stats['retries'] += retries
+            if error is None:
+                stats['loaded_rows'] += len(batch)
+            else:
+                stats['failed_batches'] += 1
+                stats['failed_rows'] += len(batch)
+                self._write_dead_letter(index, batch, error)
+            stats['seconds'] = time.perf_counter() - started
+            stats['rows_per_s'] = stats['loaded_rows'] / stats['seconds'] if stats['seconds'] else 0.0
+            if progress:
+                progress(stats)
+
+        pending = deque()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='bulk-loader') as pool:
+            # Conflict key -> row; a repeated key keeps its slot but takes the later row
+            batch = {}
+            batches = 0
+            for index, row in enumerate(rows):
+                key = row.get(self.on_conflict, index) if isinstance(row, dict) else index
+                if key in batch:
+                    stats['duplicate_rows'] += 1
+                batch[key] = row
+                stats['rows'] += 1
+                if len(batch) >= self.batch_size:
+                    pending.append(pool.submit(self.send_batch, batches, list(batch.values())))
+                    batch = {}
+                    batches += 1
+                    if len(pending) >= self.workers * 2:
+                        finish(pending.popleft())
+            if batch:
+                pending.append(pool.submit(self.send_batch, batches, list(batch.values())))
+            while pending:
+                finish(pending.popleft())
+
+        stats['seconds'] = time.perf_counter() - started
+        stats['rows_per_s'] = stats['loaded_rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        return stats
+
+
+def read_dead_letters(path):
+    """Rows from a dead-letter file, for --replay"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield from json.loads(line)['rows']
+
+
+def repeat_row(row, n):
+    """Copy n of a row for --repeat, under its own deal_key so each copy is a distinct upsert"""
+    return row if n == 0 else {**row, 'deal_key': f"{row['deal_key']}-r{n}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load extracted deals into Supabase deal_outcomes')
+    parser.add_argument('input', nargs='?', default='extracted_deals.json', help='extracted deals JSON')
+    parser.add_argument('--replay', help='re-send the rows of a dead-letter file instead')
+    parser.add_argument('--url', default=os.environ.get('SUPABASE_URL'))
+    parser.add_argument('--key', default=os.environ.get('SUPABASE_KEY'))
+    parser.add_argument('--org-id', default=os.environ.get('SUPABASE_ORG_ID', 'YOUR_ORG_ID_HERE'))
+    parser.add_argument('--table', default='deal_outcomes')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-retries', type=int, default=5)
+    parser.add_argument('--dead-letter', help='failed batches file (default: <table>.deadletter.jsonl)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='send the input N times under distinct deal_keys (load testing)')
+    standin = parser.add_argument_group('local stand-in server')
+    standin.add_argument('--standin', action='store_true', help='load into a local stand-in instead of --url')
+    standin.add_argument('--latency-ms', type=float, default=20.0)
+    standin.add_argument('--failure-rate', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    from scripts.extract_njord_deals import deal_outcome_row
+
+    server = None
+    if args.standin:
+        from scripts.postgrest_standin import start_standin
+        server = start_standin(latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+        args.url, args.key = f'http://127.0.0.1:{server.server_port}', 'standin'
+    elif not args.url or not args.key:
+        parser.error('--url and --key (or SUPABASE_URL/SUPABASE_KEY) are required without --standin')
+
+    if args.replay:
+        rows = read_dead_letters(args.replay)
+        print(f"📤 Replaying {args.replay} into {args.table}")
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            deals = json.load(f)
+        rows = (repeat_row(deal_outcome_row(deal, args.org_id), n) for n in range(args.repeat) for deal in deals)
+        print(f"📤 Loading {len(deals) * args.repeat:,} rows into {args.table}")
+
+    loader = BulkLoader(args.url, args.key, args.table, batch_size=args.batch_size, workers=args.workers,
+                        max_retries=args.max_retries, dead_letter=args.dead_letter)
+    stats = loader.load(rows)
+    print(f"✓ Loaded {stats['loaded_rows']:,}/{stats['rows']:,} rows in {stats['batches']} batches, "
+          f"{stats['seconds']:.2f}s ({stats['rows_per_s']:,.0f} rows/s, {stats['retries']} retries)")
+    if stats['duplicate_rows']:
+        print(f"   {stats['duplicate_rows']:,} rows repeated a deal_key within their batch (last one kept)")
+    if stats['failed_batches']:
+        print(f"✗ {stats['failed_batches']} batch(es), {stats['failed_rows']:,} rows, written to {loader.dead_letter}")
+
+    if server:
+        print(f"   Stand-in: {json.dumps(server.stats())}")
+        server.shutdown()
+    return 1 if stats['failed_batches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
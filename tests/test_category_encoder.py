@@ -0,0 +1,86 @@
+"""
+Tests for ml/category_encoder.py: unseen values, alias resolution, batch vs
+single encoding, LabelEncoder compatibility and encoding speed
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.category_encoder import UNKNOWN, CategoryEncoder
+
+SECTORS = ['Cannabis/Healthcare', 'Construction/Real Estate', 'Manufacturing',
+           'Mining/Resources', 'Trading/Commodities']
+GEOGRAPHIES = ['Europe', 'Global', 'North America']
+
+
+@pytest.fixture
+def sectors():
+    return CategoryEncoder('sector', SECTORS)
+
+
+@pytest.fixture
+def geographies():
+    return CategoryEncoder('geography', GEOGRAPHIES)
+
+
+def test_unseen_values_encode_to_unknown(sectors, geographies):
+    assert UNKNOWN == -1
+    assert sectors.encode_one('Underwater basket weaving') == UNKNOWN
+    assert sectors.encode_one('Technology') == UNKNOWN
+    assert geographies.encode_one('Ghana') == UNKNOWN
+    # Unrecognized places resolve to 'Global', which the model was trained on
+    assert geographies.encode_one('Mars') == GEOGRAPHIES.index('Global')
+    assert list(sectors.encode(['Technology', 'Manufacturing'])) == [UNKNOWN, SECTORS.index('Manufacturing')]
+
+
+def test_aliases_and_free_text_resolve_to_trained_codes(sectors, geographies):
+    mining = SECTORS.index('Mining/Resources')
+    assert sectors.encode_one('Mining/Resources') == mining
+    assert sectors.encode_one('  mining/resources ') == mining
+    assert sectors.encode_one('Gold mining') == mining
+    assert geographies.encode_one('USA') == GEOGRAPHIES.index('North America')
+    assert geographies.encode_one('Germany') == GEOGRAPHIES.index('Europe')
+
+
+def test_encode_matches_encode_one(sectors):
+    values = ['Gold mining', 'Manufacturing', None, 42, 3.5, ['unhashable'], {'a': 1},
+              'Technology', 'Gold mining', '', 'Cannabis producer']
+    expected = [sectors.encode_one(value) for value in values]
+    assert sectors.encode(values).tolist() == expected
+    assert sectors.encode(values).dtype == np.int32
+    # Second call takes the memoized fast path where it can
+    assert sectors.encode(values).tolist() == expected
+
+    strings = np.array(['Gold mining', 'Trading/Commodities', 'Mars rover'], dtype=object)
+    assert sectors.encode(strings).tolist() == [sectors.encode_one(value) for value in strings]
+
+
+def test_fit_codes_match_label_encoder():
+    from sklearn.preprocessing import LabelEncoder
+
+    values = ['Mining/Resources', 'Manufacturing', 'Cannabis/Healthcare', 'Mining/Resources',
+              'Trading/Commodities', 'Manufacturing']
+    encoder = CategoryEncoder.fit('sector', values)
+    labels = LabelEncoder().fit(values)
+    assert encoder.classes == list(labels.classes_)
+    assert encoder.encode(values).tolist() == labels.transform(values).tolist()
+
+
+def test_encodes_100k_values_quickly(sectors):
+    rng = np.random.default_rng(0)
+    pool = SECTORS + ['Gold mining', 'Oil trading', 'Technology', 'Real-Estate', 'fintech']
+    values = [pool[i] for i in rng.integers(0, len(pool), 100000)]
+    sectors.encode(values[:100])  # populate the memo
+
+    started = time.perf_counter()
+    codes = sectors.encode(values)
+    elapsed = time.perf_counter() - started
+
+    assert len(codes) == 100000
+    assert elapsed < 1.0, f"encoding 100k values took {elapsed:.3f}s"